@@ -0,0 +1,246 @@
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import contract_kpi as kpi
+from contract_kpi import parse_money_columns
+from contract_kpi.synthetic import write_contracts
+
+# Money parsing with n rows:            `python benchmark.py 400000`
+# KPI pipeline on synthetic exports:    `python benchmark.py pipeline 10000 100000 1000000 5000000`
+# KPI sections, pandas, DuckDB, Polars: `python benchmark.py sql 100000 1000000`
+# (the arguments are only read when run as a script, so the tests can import it)
+args = sys.argv[1:] if __name__ == '__main__' else []
+suite = args[0] if args and args[0] in ('pipeline', 'sql') else 'money'
+sizes = [int(arg) for arg in args[1:]] if suite != 'money' else []
+n_rows = int(args[0]) if suite == 'money' and args else 100000
+
+
+# Row-wise parser used by load_data before the vectorized money parsing
+def extract_numeric_value(value):
+    if pd.isna(value):
+        return np.nan
+
+    if isinstance(value, (int, float)):
+        return value
+
+    try:
+        currency_match = re.search(r'([A-Z]{3})', str(value))
+        currency = currency_match.group(1) if currency_match else 'USD'
+
+        numeric_str = re.sub(r'[^0-9.]', '', str(value))
+        numeric_value = float(numeric_str) if numeric_str else np.nan
+
+        return numeric_value, currency
+    except:
+        return np.nan, 'USD'
+
+
+def legacy_parse_annual_sales(df):
+    df['AnnualSalesValue_Numeric'] = np.nan
+    df['AnnualSalesValue_Currency'] = 'USD'
+    for idx, value in df['Annual Sales Value'].items():
+        try:
+            result = extract_numeric_value(value)
+            if isinstance(result, tuple):
+                df.at[idx, 'AnnualSalesValue_Numeric'] = result[0]
+                df.at[idx, 'AnnualSalesValue_Currency'] = result[1]
+            else:
+                df.at[idx, 'AnnualSalesValue_Numeric'] = result
+        except:
+            pass
+    return df
+
+
+def make_money_frame(n):
+    rng = np.random.default_rng(42)
+    currencies = rng.choice(['EUR', 'USD', 'GBP', 'CHF', 'DKK', 'NOK', 'SEK'], n)
+    amounts = rng.integers(1000, 5000000, n)
+    values = pd.Series([f"{c} {a:,.2f}" for c, a in zip(currencies, amounts)], dtype=object)
+    values[rng.random(n) < 0.2] = np.nan
+    return pd.DataFrame({'Annual Sales Value': values})
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed:8.3f}s  {n_rows / elapsed:14,.0f} rows/s")
+    return result
+
+
+# Run every stage of the dashboard pipeline on a synthetic export at path
+def run_pipeline(path, n, recorder):
+    today = datetime.now().date()
+
+    with recorder.stage('load_data', rows=n):
+        df = kpi.load_contracts(path)
+
+    with recorder.stage('currency conversion', rows=n):
+        df['AnnualSalesValue_Converted'] = kpi.convert_sales_values(df, 'USD')
+
+    kpi_columns = ['Status', 'Contract Start Date', 'Contract End Date', 'Annual Sales Value',
+                   'Price Increase Opportunity Date', 'Consignment Value', 'Capital Value',
+                   'Total Procedure Commitments', 'SAP Deal Number']
+    with recorder.stage('missing_values_summary', rows=n):
+        kpi.missing_values_summary(df, kpi_columns)
+    with recorder.stage('missing_data_matrix x3', rows=n):
+        matrices = {column: kpi.missing_data_matrix(df, column, kpi_columns) for column in
+                    ['Contract Region', 'Contract Country', 'BUs included in Contract']}
+    with recorder.stage('missing_data_long', rows=n):
+        kpi.missing_data_long(matrices['Contract Region'], df, 'Contract Region')
+
+    # The windows need parsed dates, whatever load_contracts did with these columns
+    for column in ['Contract End Date', 'Price Increase Opportunity Date']:
+        if not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+
+    with recorder.stage('expiry windows', rows=n):
+        kpi.expiry_windows(df, today)
+    with recorder.stage('price increase windows', rows=n):
+        kpi.price_increase_windows(df, today)
+
+    with recorder.stage('band audit', rows=n):
+        kpi.band_audit(df)
+
+    for export_format in kpi.export_formats:
+        with recorder.stage(f'{export_format} export', rows=n):
+            kpi.export_contracts(df, export_format)
+
+
+# Time the pipeline on a synthetic export of n rows, then run it again with memory
+# tracing for the peak Python heap growth of every stage (tracing slows the stages
+# down, so the two are measured separately). The Arrow pool high-water mark is
+# process wide, so it only grows from one stage and one size to the next.
+def benchmark_pipeline(n, directory):
+    path = Path(directory) / f'contracts-{n}.csv'
+    write_contracts(path, n)
+
+    reports = []
+    try:
+        for trace_memory in [False, True]:
+            recorder = kpi.PerfRecorder(trace_memory=trace_memory, rows=n).start()
+            try:
+                run_pipeline(path, n, recorder)
+            finally:
+                recorder.stop()
+            reports.append(recorder.report())
+    finally:
+        path.unlink(missing_ok=True)
+
+    report = reports[0].drop(columns='peak_mb').assign(peak_mb=reports[1]['peak_mb'])
+    report['rows_per_second'] = (report['rows'] / report['seconds']).round()
+    return report
+
+
+# Filter selections the engines are compared on
+sql_filters = {
+    'no filters': {},
+    'active': {'statuses': ['Active']},
+    'two clusters': {'regions': ['DACH', 'Nordics']},
+    'volume agreements': {'volume_agreement': ['Yes']},
+}
+
+
+# Whether two section results have the same keys, values and row order
+def same_results(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(same_results(a[key], b[key]) for key in a)
+    if isinstance(a, pd.Series):
+        a = a[a > 0]
+        return list(map(str, a.index)) == list(map(str, b.index)) and np.allclose(a.astype(float), b.astype(float))
+    if isinstance(a, pd.DataFrame):
+        if list(a.columns) != list(b.columns) or len(a) != len(b):
+            return False
+        for column in a.columns:
+            x, y = a[column].reset_index(drop=True), b[column].reset_index(drop=True)
+            if pd.api.types.is_numeric_dtype(x) and pd.api.types.is_numeric_dtype(y):
+                if not np.allclose(x.astype(float), y.astype(float), equal_nan=True):
+                    return False
+            elif x.astype(object).where(x.notna(), None).tolist() != y.astype(object).where(y.notna(), None).tolist():
+                return False
+        return True
+    return a == b or bool(np.isclose(a, b))
+
+
+# Time the Data Quality and KPI Analysis sections per filter selection on the pandas
+# frame (filters applied with the filter index), in DuckDB and with Polars, checking
+# they agree. DuckDB and Polars are set up from the loaded frame, as the dashboard does.
+def benchmark_sql(n, directory):
+    path = Path(directory) / f'contracts-{n}.csv'
+    write_contracts(path, n)
+    start = time.perf_counter()
+    df = kpi.load_contracts(path)
+    df['AnnualSalesValue_Converted'] = kpi.convert_sales_values(df, 'USD')
+    load_seconds = time.perf_counter() - start
+
+    inputs = {
+        'kpi_columns': ['Status', 'Contract Start Date', 'Contract End Date', 'Annual Sales Value',
+                        'Price Increase Opportunity Date', 'Consignment Value', 'Capital Value',
+                        'Total Procedure Commitments', 'SAP Deal Number'],
+        'target_currency': 'USD', 'n': 20, 'today': datetime.now().date(),
+    }
+
+    start = time.perf_counter()
+    index = kpi.build_filter_index(df)
+    pandas_setup = time.perf_counter() - start
+    start = time.perf_counter()
+    database = kpi.KPIDatabase(df)
+    sql_setup = time.perf_counter() - start
+    start = time.perf_counter()
+    lazy_frame = kpi.KPILazyFrame(df)
+    lazy_setup = time.perf_counter() - start
+    print(f"{'load':<45} {load_seconds:8.3f}s {'':>9} {'':>9}")
+    print(f"{'setup (filter index / registration / frame)':<45} {pandas_setup:8.3f}s {sql_setup:8.3f}s {lazy_setup:8.3f}s")
+
+    for label, filters in sql_filters.items():
+        for section in sorted(kpi.sql_sections):
+            start = time.perf_counter()
+            positions = kpi.selected_positions(index, **filters)
+            expected = kpi.compute_section(section, df if positions is None else df.take(positions), **inputs)
+            pandas_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result = database.compute_section(section, filters, **inputs)
+            sql_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            lazy_result = lazy_frame.compute_section(section, filters, **inputs)
+            lazy_seconds = time.perf_counter() - start
+
+            match = 'same' if same_results(expected, result) and same_results(expected, lazy_result) else 'DIFFERENT'
+            print(f"{section + ', ' + label:<45} {pandas_seconds:8.3f}s {sql_seconds:8.3f}s {lazy_seconds:8.3f}s  {match}")
+    path.unlink(missing_ok=True)
+
+
+if __name__ == '__main__' and suite == 'sql':
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes or [100000]:
+            print(f"KPI sections, {n:,} rows{'pandas':>27} {'DuckDB':>9} {'Polars':>9}")
+            benchmark_sql(n, directory)
+            print()
+
+elif __name__ == '__main__' and suite == 'pipeline':
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes or [10000, 100000]:
+            report = benchmark_pipeline(n, directory)
+            print(f"KPI pipeline, {n:,} rows")
+            for row in report.itertuples(index=False):
+                print(f"{'  ' * row.depth + row.stage:<40} {row.seconds:8.3f}s  {row.rows_per_second:14,.0f} rows/s  {row.peak_mb:10,.1f} MB heap  {row.arrow_peak_mb:10,.1f} MB Arrow")
+            print()
+
+elif __name__ == '__main__':
+    base = make_money_frame(n_rows)
+    print(f"Money parsing, {n_rows:,} rows")
+
+    legacy = timed("per-row extract_numeric_value loop", legacy_parse_annual_sales, base.copy())
+    vectorized = timed("vectorized parse_money_columns", parse_money_columns, base.copy())
+
+    pd.testing.assert_series_equal(legacy['AnnualSalesValue_Numeric'], vectorized['AnnualSalesValue_Numeric'])
+    assert (legacy['AnnualSalesValue_Currency'] == vectorized['AnnualSalesValue_Currency']).all()
@@ -1,11 +1,12 @@
+import hashlib
+
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import calendar
-import re
+from datetime import datetime
+import math
+
+import contract_kpi as kpi
 
 st.set_page_config(page_title="Contract Data Analysis", layout="wide")
 
@@ -13,335 +14,67 @@ st.title("Contract Data Analysis Dashboard")
 
 # Move file uploader to sidebar
 st.sidebar.header("Upload Data")
-uploaded_file = st.sidebar.file_uploader("Upload Contract Data CSV", type=["csv"])
-
-api_key_to_field_mapping = {
-"Id": "Contract ID",
-"AccountId": "Account Name",
-"Sold_To_Account_ID__c": "Sold To Account ID",
-"BUs_included_in_Contract_copy__c": "BUs included in Contract copy",
-"Buying_Group__c": "Buying Group",
-"Sold_To_Id__c": "Sold To Id",
-"ContractNumber": "Contract Number",
-"Name": "Contract Name",
-"EMEA_Type_of_contract__c": "Type of Contract",
-"MainBU__c": "MainBU",
-"AdditionalBu__c": "AdditionalBu",
-"BUSinglePicklistValue__c": "BUSinglePicklistValue",
-"BUs_included_in_Contract__c": "BUs included in Contract",
-"Sub_BUs__c": "Sub BUs",
-"ContractRegion__c": "Contract Region",
-"ContractCountry__c": "Contract Country",
-"Old_contract_number__c": "Old contract number",
-"SAP_Deal_Number__c": "SAP Deal Number",
-"Parent_contract__c": "Parent Contract",
-"Contract_Description__c": "Contract Description",
-"Document_Link__c": "Document Link",
-"Billing_City__c": "Billing City",
-"EMEA_Bonus_contract__c": "Bonus Contract",
-"Band__c": "Band",
-"EMEA_Condition_type__c": "Condition Type",
-"Price_Conditions__c": "Price Conditions",
-"Terms_of_Payment__c": "Terms of Payment",
-"CustomerSignedDate": "Customer Signed Date",
-"Status": "Status",
-"Canceled_Date__c": "Canceled Date",
-"EMEA_Notification_Date__c": "Notification Date",
-"StartDate": "Contract Start Date",
-"Contract_End_Date__c": "Contract End Date",
-"Contract_Original_End_Date__c": "Contract Original End Date",
-"Automatic_extension__c": "Automatic Extension",
-"Zeitpunkt_der_Erinnerung__c": "Internal Notice Period",
-"Erinnerung_senden_an__c": "Person in Charge",
-"CustomerSignedId": "Customer Signed By",
-"Price_Increase_Opportunity_Date__c": "Price Increase Opportunity Date",
-"Price_Regulations_Notes__c": "Price Regulations Notes",
-"Notice_Period__c": "Notice Period",
-"EMEA_Bonus_type__c": "Bonus Type",
-"EMEA_Expected_Sales__c": "Expected Sales",
-"ExpectedPayoutPercentage__c": "Expected Payout Percentage",
-"EMEA_Payout_period__c": "Payout Period",
-"EMEA_Bonus_beneficiary__c": "Bonus Beneficiary",
-"EMEA_Bonus_conditions__c": "Bonus Description",
-"EMEA_Booking_Type__c": "Booking Type",
-"Rebate_Conditions__c": "Rebate Conditions",
-"SpecificServiceLevels__c": "Specific Service Levels",
-"CapitalValue__c": "Capital Value",
-"CapitalValueDescription__c": "Capital Value Description",
-"ConsignmentValue__c": "Consignment Value",
-"ConsignmentValueDescription__c": "Consignment Value Description",
-"AnnualSalesValue__c": "Annual Sales Value",
-"MarketShare__c": "Market Share %",
-"TotalProcedureCommitments__c": "Total Procedure Commitments",
-"QuantityAgreed__c": "Quantity Agreed",
-"HipProceduresCommitment__c": "Hip Procedures Commitment",
-"KneeProceduresCommitment__c": "Knee Procedures Commitment",
-"Kits__c": "Kits",
-"Canister__c": "Canister",
-"EMEA_Volume_annually__c": "Volume annually",
-"Inkludierte_Gerte__c": "Inkludierte Geräte",
-"Ambulante_Erstattung__c": "Ambulante Erstattung",
-"Therapy_days__c": "Therapy days",
-"Costs_per_Therapy_day__c": "Costs per Therapy day",
-"Flat_rate_month__c": "Flat rate (month)",
-"More_included_items__c": "More included items",
-# System Information
-"ActivatedById": "Activated By",
-"CreatedById": "Created By",
-"CurrencyIsoCode": "Contract Currency",
-"ActivatedDate": "Activated Date",
-"LastModifiedById": "Last Modified By",
-"OwnerId": "Contract Owner"
-
-} 
-
-def rename_columns(df, mapping):
-# Create a new dictionary for renaming columns
-    rename_dict = {col: mapping.get(col, col) for col in df.columns}
-
-# Rename the columns using the dictionary
-    df.rename(columns=rename_dict, inplace=True)
-
-def rename_kpi_columns(kpi_columns, mapping):
-# Rename the KPI columns using the mapping
-    renamed_kpi_columns = [mapping.get(col, col) for col in kpi_columns]
-    return renamed_kpi_columns
-
-# Currency conversion function with hardcoded exchange rates
-def convert_currency(value, from_currency, to_currency):
-    # Define exchange rates (hardcoded)
-    exchange_rates = {
-        'USD': 1.0,  # Base currency
-        'EUR': 0.92,  # 1 USD = 0.92 EUR
-        'GBP': 0.77,  # 1 USD = 0.77 GBP
-        'CHF': 0.87,  # 1 USD = 0.87 CHF
-        'DKK': 6.75,  # 1 USD = 6.75 DKK
-        'NOK': 10.18, # 1 USD = 10.18 NOK
-        'SEK': 10.06, # 1 USD = 10.06 SEK
-    }
-    
-    # First convert to USD if not already
-    if from_currency != 'USD':
-        usd_value = value / exchange_rates[from_currency]
-    else:
-        usd_value = value
-    
-    # Then convert USD to target currency
-    if to_currency != 'USD':
-        return usd_value * exchange_rates[to_currency]
-    else:
-        return usd_value
-
-# Function to clean currency string and extract numeric value
-def extract_numeric_value(value):
-    if pd.isna(value):
-        return np.nan
-    
-    if isinstance(value, (int, float)):
-        return value
-    
-    # Extract currency code and numeric value
-    try:
-        # Extract currency code
-        currency_match = re.search(r'([A-Z]{3})', str(value))
-        currency = currency_match.group(1) if currency_match else 'USD'
-        
-        # Extract numeric value, removing commas and other non-numeric characters
-        numeric_str = re.sub(r'[^0-9.]', '', str(value))
-        numeric_value = float(numeric_str) if numeric_str else np.nan
-        
-        return numeric_value, currency
-    except:
-        return np.nan, 'USD'
-
-if uploaded_file is not None:
-    # Load data
-    @st.cache_data
-    def load_data(file):
-        df = pd.read_csv(file)
-        # Convert date columns to datetime
-        date_columns = ['CustomerSignedDate', 'Canceled_Date__c', 'Notification Date', 
-                       'StartDate', 'Contract_End_Date__c', 'Contract_Original_End_Date__c',
-                       'Price Increase Opportunity Date', 'LastEvaluationDate__c', 
-                       'Activated Date']
-        
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-
-        # Rename the columns in the DataFrame
-        rename_columns(df, api_key_to_field_mapping)
-
-        # Process AnnualSalesValue__c to extract numeric values and currency
-        if 'Annual Sales Value' in df.columns:
-            try:
-                # Create new columns for numeric value and currency
-                df['AnnualSalesValue_Numeric'] = np.nan
-                df['AnnualSalesValue_Currency'] = 'USD'
-                
-                # Process each row
-                for idx, value in df['Annual Sales Value'].items():
-                    try:
-                        result = extract_numeric_value(value)
-                        if isinstance(result, tuple):
-                            df.at[idx, 'AnnualSalesValue_Numeric'] = result[0]
-                            df.at[idx, 'AnnualSalesValue_Currency'] = result[1]
-                        else:
-                            df.at[idx, 'AnnualSalesValue_Numeric'] = result
-                    except:
-                        pass
-            except:
-                df['AnnualSalesValue_Numeric'] = df['Annual Sales Value']
-                if 'Annual Sales Value Currency' in df.columns:
-                    df['AnnualSalesValue_Currency'] = df['Annual Sales Value Currency']
-                else:
-                    df['AnnualSalesValue_Currency'] = 'USD'
-        return df
-    
-    df = load_data(uploaded_file)
-    
-    # Sidebar for currency selection
-    st.sidebar.header("Settings")
-    target_currency = st.sidebar.selectbox(
-        "Select Display Currency",
-        options=['USD', 'EUR', 'GBP', 'CHF', 'DKK', 'NOK', 'SEK'],
-        index=0  # Default to USD
+uploaded_files = st.sidebar.file_uploader("Upload Contract Data CSV", type=["csv"], accept_multiple_files=True,
+                                          help="Several exports (e.g. one per region) are parsed in parallel and combined, keeping one row per Contract ID.")
+
+# A single export, or the list of exports to combine
+uploaded_file = (uploaded_files[0] if len(uploaded_files) == 1 else uploaded_files) if uploaded_files else None
+
+# Settings bounding the size of the missing data heatmaps
+def heatmap_settings(container=st.sidebar):
+    mode = container.radio(
+        "Missing Data Heatmap Groups",
+        options=["Worst groups + Other", "Pages"],
+        help="Heatmaps show a limited number of groups so that their size does not grow with the number of countries or BUs."
     )
-    
-    # Convert all sales values to selected currency
-    df['AnnualSalesValue_Converted'] = df.apply(
-        lambda x: convert_currency(
-            x['AnnualSalesValue_Numeric'],
-            x['AnnualSalesValue_Currency'],
-            target_currency
-        ) if pd.notna(x['AnnualSalesValue_Numeric']) else np.nan,
-        axis=1
-    )
-    
-    # Sidebar for filters
-    st.sidebar.header("Filters")
-    
-    # Create filters for the specified columns
-    try:
-        contract_types = st.sidebar.multiselect(
-            "Select Contract Types",
-            options=df['Type of Contract'].dropna().unique(),
-            default=[]
-        )
-    except:
-        contract_types = []
-
-    try:
-        bus_included = st.sidebar.multiselect(
-            "Select BUs included in Contract",
-            options=df['BUs included in Contract'].dropna().unique(),
-            default=[]
-        )
-    except:
-        bus_included = []
-
-    try:
-        regions = st.sidebar.multiselect(
-            "Select Contract Clusters",
-            options=df['Contract Region'].dropna().unique(),
-            default=[]
-        )
-    except:
-        regions = [] 
-
-    try:   
-        countries = st.sidebar.multiselect(
-            "Select Contract Countries",
-            options=df['Contract Country'].dropna().unique(),
-            default=[]
-        )
-    except:
-        countries = []
-
-    try:
-        statuses = st.sidebar.multiselect(
-            "Select Contract Status",
-            options=df['Status'].dropna().unique(),
-            default=[]
-        )
-    except:
-        statuses = []
+    groups = container.number_input("Groups per Heatmap", min_value=5, max_value=200, value=30, step=5)
+    return mode, groups
+
+# Heatmap of a missing data matrix limited to a bounded number of groups, either the
+# worst ones plus an "Other" bucket or one page of groups at a time
+def missing_heatmap(matrix, group_sizes, title, settings, groups_on_x=True):
+    mode, groups = settings
+    if mode == "Pages" and len(matrix) > groups:
+        pages = math.ceil(len(matrix) / groups)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"page {title}")
+        matrix = kpi.page_groups(matrix, page - 1, groups)
+    else:
+        matrix = kpi.worst_groups(matrix, group_sizes, groups)
 
-    volume_agreement = st.sidebar.multiselect(
-        "Volume Based Agreement - Active",
-        options=['Yes','No'],
-        default=['No']
-    )
-    # KPI relevant columns
-    kpi_columns_default = ['Status', 'Contract Start Date', 'Contract End Date', 'Annual Sales Value', 
-                   'Price Increase Opportunity Date', 
-                  'Consignment Value','Capital Value', 'Total Procedure Commitments','SAP Deal Number'
-                  ]
-    
-    try:
-        kpi_columns = st.sidebar.multiselect(
-            "Select KPI columns",
-            options=df.columns,
-            default=kpi_columns_default
+    group_label = matrix.index.name
+    if groups_on_x:
+        return px.imshow(
+            matrix.T,
+            labels=dict(x=group_label, y="Column", color="Missing Percentage"),
+            color_continuous_scale='YlOrRd',
+            title=title,
+            height=max(400, 30 * matrix.shape[1] + 250)
         )
-    except:
-        kpi_columns = st.sidebar.multiselect(
-        "Select KPI columns",
-        options=df.columns,
-        default=df.columns
+    return px.imshow(
+        matrix,
+        labels=dict(x="Column", y=group_label, color="Missing Percentage"),
+        color_continuous_scale='YlOrRd',
+        title=title,
+        height=max(400, 30 * len(matrix) + 250)
     )
-    
-            # Rename the KPI columns
-    kpi_columns = rename_kpi_columns(kpi_columns, api_key_to_field_mapping)
 
-    # Apply filters
-    filtered_df = df.copy()
-    
-    if contract_types:
-        filtered_df = filtered_df[filtered_df['Type of Contract'].isin(contract_types)]
-    
-    if bus_included:
-        filtered_df = filtered_df[filtered_df['BUs included in Contract'].isin(bus_included)]
-    
-    if regions:
-        filtered_df = filtered_df[filtered_df['Contract Region'].isin(regions)]
-    
-    if countries:
-        filtered_df = filtered_df[filtered_df['Contract Country'].isin(countries)]
-    
-    if statuses:
-        filtered_df = filtered_df[filtered_df['Status'].isin(statuses)]
-    try:
-        if 'Yes' in volume_agreement:
-            filtered_df = filtered_df[(filtered_df['Status'].isin(['Active'])) & (filtered_df['Type of Contract'].isin(['Usage agreement'])) ]
-            kpi_columns = [ 'Annual Sales Value',  'Capital Value', 'Capital Value Description', 'Consignment Value', 'Consignment Value Description'
-                    , 'Total Procedure Commitments','Quantity Agreed', 'Hip Procedures Commitment', 'Knee Procedures Commitment']
-    except:
-        pass
-    
-    # Data Quality Analysis
+# Data quality section; the heatmap settings only rerun this section
+@st.fragment
+def data_quality_section(quality):
     st.header("Data Quality Analysis")
+    heatmap = heatmap_settings(st.container())
+
+    missing_values = quality['summary']
 
-    # Calculate missing values percentage
-    missing_values = pd.DataFrame({
-        'Column': filtered_df.columns,
-        'Missing Values': filtered_df.isna().sum(),
-        'Missing Percentage': (filtered_df.isna().sum() / len(filtered_df) * 100).round(2)
-    }).sort_values('Missing Percentage', ascending=False)
-    
-    # Highlight KPI relevant columns
-    missing_values['KPI Relevant'] = missing_values['Column'].isin(kpi_columns)
-    
     # Show missing values for KPI relevant columns
     kpi_missing = missing_values[missing_values['KPI Relevant']]
-    
 
     col1, col2 = st.columns(2)
-    
+
     with col1:
         st.subheader("Missing Values in KPI Relevant Columns")
         st.dataframe(kpi_missing)
-    
+
     with col2:
         # Create a bar chart for missing values in KPI relevant columns
         fig = px.bar(
@@ -355,44 +88,18 @@ if uploaded_file is not None:
         st.plotly_chart(fig)
 
     try:
-        # Calculate missing values by BU
+        # Missing values by Cluster
         st.subheader("Missing Data by Clusters")
 
-        # Create a function to calculate missing percentage for each KPI column by BU
-        def calculate_missing_by_reg(dataframe, column_list):
-            # Get all regions
-            regions = dataframe['Contract Region'].dropna().unique()
-            
-            # Create empty dictionary to store results
-            result_data = []
-            
-            # Loop through each BU and calculate missing values for each KPI column
-            for r in regions:
-                reg_df = dataframe[dataframe['Contract Region'] == r]
-                region_total = len(reg_df)
-                
-                if region_total > 0:  # Avoid division by zero
-                    for col in column_list:
-                        if col in reg_df.columns:
-                            missing_count = reg_df[col].isna().sum()
-                            missing_pct = (missing_count / region_total * 100).round(2)
-                            
-                            result_data.append({
-                                'Region': r,
-                                'Column': col,
-                                'Missing Percentage': missing_pct,
-                                'Total Contracts': region_total
-                            })
-            
-            return pd.DataFrame(result_data)
-
-    # Calculate missing values by BU for KPI columns
-        missing_by_reg = calculate_missing_by_reg(filtered_df, kpi_columns)
+        missing_by_reg = quality['matrices']['Contract Region']
 
     # Create a heatmap of missing values by region
         if not missing_by_reg.empty:
+            # Long format for the faceted bar chart and the detail table
+            missing_by_reg_long = quality['region_long']
+
             fig = px.bar(
-                missing_by_reg,
+                missing_by_reg_long,
                 x='Column',
                 y='Missing Percentage',
                 color='Missing Percentage',
@@ -404,168 +111,99 @@ if uploaded_file is not None:
                 height=800  # Adjust based on number of BUs
             )
             st.plotly_chart(fig)
-            
+
             # Alternative view: heatmap
-            fig2 = px.imshow(
-                missing_by_reg.pivot(index='Region', columns='Column', values='Missing Percentage'),
-                labels=dict(x="Column", y="Region", color="Missing Percentage"),
-                color_continuous_scale='YlOrRd',
-                title='Missing Data Heatmap by Cluster'
+            fig2 = missing_heatmap(
+                missing_by_reg,
+                quality['group_sizes']['Contract Region'],
+                'Missing Data Heatmap by Cluster',
+                heatmap,
+                groups_on_x=False
             )
             st.plotly_chart(fig2)
-            
+
 
             # Show table of missing values by BU
             with st.expander("View Detailed Missing Data by Cluster"):
-                st.dataframe(missing_by_reg.sort_values(['Region', 'Missing Percentage'], ascending=[True, False]))
+                st.dataframe(missing_by_reg_long.sort_values(['Region', 'Missing Percentage'], ascending=[True, False]))
         else:
             st.warning("No region information available to analyze missing data by BU.")
     except:
         pass
 
     try:
-            
-        # Calculate missing values by Country
+
+        # Missing values by Country
         st.subheader("Missing Data by Countries")
 
-        def calculate_missing_by_country(dataframe, column_list):
-            # Get all regions
-            countries = dataframe['Contract Country'].dropna().unique()
-            
-            # Create empty dictionary to store results
-            result_data = []
-            
-            # Loop through each BU and calculate missing values for each KPI column
-            for c in countries:
-                country_df = dataframe[dataframe['Contract Country'] == c]
-                country_total = len(country_df)
-                
-                if country_total > 0:  # Avoid division by zero
-                    for col in column_list:
-                        if col in country_df.columns:
-                            missing_count = country_df[col].isna().sum()
-                            missing_pct = (missing_count / country_total * 100).round(2)
-                            
-                            result_data.append({
-                                'Country': c,
-                                'Column': col,
-                                'Missing Percentage': missing_pct,
-                                'Total Contracts': country_total
-                            })
-            
-            return pd.DataFrame(result_data)
-
-        # Calculate missing values by BU for KPI columns
-        missing_by_country = calculate_missing_by_country(filtered_df, kpi_columns)
+        missing_by_country = quality['matrices']['Contract Country']
         if not missing_by_country.empty:
 
-            fig3 = px.imshow(
-                missing_by_country.pivot(index='Column', columns='Country', values='Missing Percentage'),
-                labels=dict(x="Country", y="Column", color="Missing Percentage"),
-                color_continuous_scale='YlOrRd',
-                title='Missing Data Heatmap by Country'
+            fig3 = missing_heatmap(
+                missing_by_country,
+                quality['group_sizes']['Contract Country'],
+                'Missing Data Heatmap by Country',
+                heatmap
             )
             st.plotly_chart(fig3)
     except:
         pass
 
-        # Calculate missing values by Country
+    # Missing values by BU
     st.subheader("Missing Data by Business Unit")
 
-    def calculate_missing_by_bu(dataframe, column_list):
-        # Get all regions
-        bus = dataframe['BUs included in Contract'].dropna().unique()
-        
-        # Create empty dictionary to store results
-        result_data = []
-        
-        # Loop through each BU and calculate missing values for each KPI column
-        for bu in bus:
-            bu_df = dataframe[dataframe['BUs included in Contract'] == bu]
-            bu_total = len(bu_df)
-            
-            if bu_total > 0:  # Avoid division by zero
-                for col in column_list:
-                    if col in bu_df.columns:
-                        missing_count = bu_df[col].isna().sum()
-                        missing_pct = (missing_count / bu_total * 100).round(2)
-                        
-                        result_data.append({
-                            'BU': bu,
-                            'Column': col,
-                            'Missing Percentage': missing_pct,
-                            'Total Contracts': bu_total
-                        })
-        
-        return pd.DataFrame(result_data)
-
-    # Calculate missing values by BU for KPI columns
-    missing_by_bu = calculate_missing_by_bu(filtered_df, kpi_columns)
+    missing_by_bu = quality['matrices']['BUs included in Contract']
     if not missing_by_bu.empty:
 
-        fig4 = px.imshow(
-            missing_by_bu.pivot(index='Column', columns='BU', values='Missing Percentage'),
-            labels=dict(x="BU", y="Column", color="Missing Percentage"),
-            color_continuous_scale='YlOrRd',
-            title='Missing Data Heatmap by Business Unit',
-            width=100000,
-            height=800
+        fig4 = missing_heatmap(
+            missing_by_bu,
+            quality['group_sizes']['BUs included in Contract'],
+            'Missing Data Heatmap by Business Unit',
+            heatmap
         )
         st.plotly_chart(fig4)
 
     # Show overall data statistics
     with st.expander("Show Full Data Quality Statistics"):
         st.dataframe(missing_values)
-    
-    # Define active contracts 
-    active_contracts = filtered_df[filtered_df['Status'] == 'Active']
-    
+
+# KPI section, with the top top_n_count contracts in the top contract charts
+def kpi_section(analysis, top_n_count):
+    target_currency = analysis['target_currency']
+    value_labels = {'Contract Description': 'Contract Name', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'}
+
     # KPI 1: How many active contracts
     st.header("KPI Analysis")
-    
+
     col1, col2, col3 = st.columns(3)
-    
+
     with col1:
-        st.metric("Total Contracts", len(filtered_df))
-    
+        st.metric("Total Contracts", analysis['total'])
+
     with col2:
-        st.metric("Active Contracts", len(active_contracts))
-    
+        st.metric("Active Contracts", analysis['active'])
+
     with col3:
-        active_percentage = round((len(active_contracts) / len(filtered_df)) * 100, 2) if len(filtered_df) > 0 else 0
+        active_percentage = kpi.percentage(analysis['active'], analysis['total'])
         st.metric("Active Contract Percentage", f"{active_percentage}%")
-    
+
     try:
-            
-        # KPI 2: Top 20 contracts per annual sales value
-        
-        # Sort by annual sales value and get top 20
-        top_contracts = filtered_df.dropna(subset=['AnnualSalesValue_Converted']).sort_values('AnnualSalesValue_Converted', ascending=False).head(20)
-        
-        # Create a horizontal bar chart for top contracts
+
+        # KPI 2: Top contracts per annual sales value
         fig = px.bar(
-            top_contracts,
-            x='Contract Description', 
+            analysis['top'],
+            x='Contract Description',
             y='AnnualSalesValue_Converted',
-            title=f'Top 20 Contracts by Annual Sales Value ({target_currency})',
-            labels={'Contract Description': 'Contract Name', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'},
+            title=f'Top {top_n_count} Contracts by Annual Sales Value ({target_currency})',
+            labels=value_labels,
             hover_data=['Contract Number', 'Contract Country', 'Type of Contract']
         )
         st.plotly_chart(fig)
 
-        # Filter contracts with activation date
-        contracts_with_activation = filtered_df.dropna(subset=['Activated Date'])        
-        if len(contracts_with_activation)>0:
-
-            # KPI 3: Contracts activated per month
-            
-            # Extract year and month from activation date
-            contracts_with_activation['ActivationMonth'] = contracts_with_activation['Activated Date'].dt.to_period('M')
-            
-            # Count contracts activated per month
-            activations_per_month = contracts_with_activation.groupby('ActivationMonth').size().reset_index(name='Count')
-            activations_per_month['ActivationMonth'] = activations_per_month['ActivationMonth'].astype(str)
-            
+        # KPI 3: Contracts activated per month
+        activations_per_month = analysis['activations']
+        if len(activations_per_month)>0:
+
             # Create a line chart for activations per month
             fig = px.line(
                 activations_per_month,
@@ -575,89 +213,50 @@ if uploaded_file is not None:
                 markers=True
             )
             st.plotly_chart(fig)
-        
-        # Top 20 activated contracts per annual sales value
-        st.subheader(f"Top 20 Activated Contracts per Annual Sales Value ({target_currency})")
-        
-        top_activated = active_contracts.sort_values('AnnualSalesValue_Converted', ascending=False).head(20)#contracts_with_activation.dropna(subset=['AnnualSalesValue_Converted']).sort_values('AnnualSalesValue_Converted', ascending=False).head(20)
-        
+
+        # Top activated contracts per annual sales value
+        st.subheader(f"Top {top_n_count} Activated Contracts per Annual Sales Value ({target_currency})")
+
         fig = px.bar(
-            top_activated,
-            x='Contract Description', 
+            analysis['top_active'],
+            x='Contract Description',
             y='AnnualSalesValue_Converted',
-            title=f'Top 20 Activated Contracts by Annual Sales Value ({target_currency})',
-            labels={'Contract Description': 'Contract Name', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'},
+            title=f'Top {top_n_count} Activated Contracts by Annual Sales Value ({target_currency})',
+            labels=value_labels,
             hover_data=['Contract Number', 'Contract Country', 'Type of Contract', 'Activated Date']
         )
         st.plotly_chart(fig)
-        
+
         # KPI 4: Contracts sent out but not activated
+        # (notification date but not active)
         st.subheader("Contracts Sent Out but Not Activated")
-        
-        # Find contracts with notification date but no activation date or with status not activated
-        sent_not_activated = filtered_df[
-            (filtered_df['Notification Date'].notna()) & 
-            ( (filtered_df['Status'] != 'Active'))
-        ]
-        
+
         col1, col2 = st.columns(2)
-        
+
         with col1:
-            st.metric("Contracts Sent Not Activated", len(sent_not_activated))
-        
+            st.metric("Contracts Sent Not Activated", analysis['sent_not_activated'])
+
         with col2:
-            sent_percentage = round((len(sent_not_activated) / len(filtered_df)) * 100, 2) if len(filtered_df) > 0 else 0
+            sent_percentage = kpi.percentage(analysis['sent_not_activated'], analysis['total'])
             st.metric("Percentage of Total", f"{sent_percentage}%")
-        
-        # Top 20 sent but not activated contracts per annual sales value
-        top_sent_not_activated = sent_not_activated.dropna(subset=['AnnualSalesValue_Converted']).sort_values('AnnualSalesValue_Converted', ascending=False).head(20)
-        
+
         fig = px.bar(
-            top_sent_not_activated,
-            x='Contract Description',  
+            analysis['top_sent_not_activated'],
+            x='Contract Description',
             y='AnnualSalesValue_Converted',
-            title=f'Top 20 Contracts Sent but Not Activated by Annual Sales Value ({target_currency})',
-            labels={'Contract Description': 'Contract Name', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'},
+            title=f'Top {top_n_count} Contracts Sent but Not Activated by Annual Sales Value ({target_currency})',
+            labels=value_labels,
             hover_data=['Contract Number', 'Contract Country', 'Type of Contract', 'Notification Date']
         )
         st.plotly_chart(fig)
-        
+
         # KPI 5: Expiring contracts
         st.subheader("Expiring Contracts Analysis")
-        
-        # Get current date
-        today = datetime.now().date()
-        
-        # Calculate expiration dates
-        expiring_this_year = filtered_df[
-            (filtered_df['Contract End Date'].dt.year == today.year) & 
-            (filtered_df['Contract End Date'].dt.date >= today)
-        ]
-        
-        three_months = today + timedelta(days=90)
-        expiring_next_3months = filtered_df[
-            (filtered_df['Contract End Date'].dt.date >= today) & 
-            (filtered_df['Contract End Date'].dt.date <= three_months)
-        ]
-        
-        six_months = today + timedelta(days=180)
-        expiring_next_6months = filtered_df[
-            (filtered_df['Contract End Date'].dt.date >= today) & 
-            (filtered_df['Contract End Date'].dt.date <= six_months)
-        ]
-        
-        # Define "not followed up" as those without notification date
-        not_followed_year = expiring_this_year[expiring_this_year['Notification Date'].isna()]
-        not_followed_3m = expiring_next_3months[expiring_next_3months['Notification Date'].isna()]
-        not_followed_6m = expiring_next_6months[expiring_next_6months['Notification Date'].isna()]
-        
-        # Create a dataframe for visualization
-        expiry_data = pd.DataFrame({
-            'Time Frame': ['This Year', 'Next 3 Months', 'Next 6 Months'],
-            'Total Expiring': [len(expiring_this_year), len(expiring_next_3months), len(expiring_next_6months)],
-            'Not Followed Up': [len(not_followed_year), len(not_followed_3m), len(not_followed_6m)]
-        })
-        
+
+        # Count and value of contracts expiring in each time frame;
+        # "not followed up" are those without notification date
+        expiry_data = analysis['expiry']
+
         # Create a bar chart for expiring contracts
         fig = px.bar(
             expiry_data,
@@ -667,69 +266,41 @@ if uploaded_file is not None:
             barmode='group'
         )
         st.plotly_chart(fig)
-        
-        # Calculate total value of expiring contracts
-        total_value_year = expiring_this_year['AnnualSalesValue_Converted'].sum()
-        total_value_3m = expiring_next_3months['AnnualSalesValue_Converted'].sum()
-        total_value_6m = expiring_next_6months['AnnualSalesValue_Converted'].sum()
-        
+
+        # Total value of expiring contracts
+        total_value_year, total_value_3m, total_value_6m = expiry_data['Total Value']
+
         col1, col2, col3 = st.columns(3)
-        
+
         with col1:
             st.metric(f"Total Value Expiring This Year ({target_currency})", f"{total_value_year:,.2f}")
-        
+
         with col2:
             st.metric(f"Total Value Expiring Next 3 Months ({target_currency})", f"{total_value_3m:,.2f}")
-        
+
         with col3:
             st.metric(f"Total Value Expiring Next 6 Months ({target_currency})", f"{total_value_6m:,.2f}")
-        
+
         # Top contracts expiring
-        # with st.expander(f"Top Contracts Expiring This Year ({target_currency})"):
-        top_expiring_year = expiring_this_year.dropna(subset=['AnnualSalesValue_Converted']).sort_values('AnnualSalesValue_Converted', ascending=False).head(20)
-        
         fig = px.bar(
-            top_expiring_year,
-            x='Contract Description', 
+            analysis['top_expiring'],
+            x='Contract Description',
             y='AnnualSalesValue_Converted',
-            title=f'Top 20 Contracts Expiring This Year by Annual Sales Value ({target_currency})',
-            labels={'Contract Description': 'Contract Name', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'},
+            title=f'Top {top_n_count} Contracts Expiring This Year by Annual Sales Value ({target_currency})',
+            labels=value_labels,
             hover_data=['Contract Number', 'Contract Country', 'Contract End Date']
         )
         st.plotly_chart(fig)
-        
+
         # KPI 6: Price Increase Opportunity
         st.subheader("Price Increase Opportunities")
 
         try:
-            # Price increase opportunities in different time frames
-            price_increase_year = filtered_df[
-                (filtered_df['Price Increase Opportunity Date'].dt.year == today.year) & 
-                (filtered_df['Price Increase Opportunity Date'].dt.date >= today)
-            ]
-            
-            price_increase_3m = filtered_df[
-                (filtered_df['Price Increase Opportunity Date'].dt.date >= today) & 
-                (filtered_df['Price Increase Opportunity Date'].dt.date <= three_months)
-            ]
-            
-            price_increase_6m = filtered_df[
-                (filtered_df['Price Increase Opportunity Date'].dt.date >= today) & 
-                (filtered_df['Price Increase Opportunity Date'].dt.date <= six_months)
-            ]
-            
-            # Calculate sum of annual sales value for each time frame
-            pi_value_year = price_increase_year['AnnualSalesValue_Converted'].sum()
-            pi_value_3m = price_increase_3m['AnnualSalesValue_Converted'].sum()
-            pi_value_6m = price_increase_6m['AnnualSalesValue_Converted'].sum()
-            
-            # Create a dataframe for visualization
-            price_increase_data = pd.DataFrame({
-                'Time Frame': ['This Year', 'Next 3 Months', 'Next 6 Months'],
-                'Total Value': [pi_value_year, pi_value_3m, pi_value_6m],
-                'Count': [len(price_increase_year), len(price_increase_3m), len(price_increase_6m)]
-            })
-            
+            # Price increase opportunities in different time frames,
+            # with the sum of annual sales value for each time frame
+            price_increase_data = analysis['price_increase']
+            pi_value_year, pi_value_3m, pi_value_6m = price_increase_data['Total Value']
+
             # Create a bar chart for price increase opportunities (showing value instead of count)
             fig = px.bar(
                 price_increase_data,
@@ -747,114 +318,639 @@ if uploaded_file is not None:
         try:
 
             col1, col2, col3 = st.columns(3)
-            
+
             with col1:
                 st.metric(f"Value Eligible for Price Increase This Year ({target_currency})", f"{pi_value_year:,.2f}")
-            
+
             with col2:
                 st.metric(f"Value Eligible for Price Increase Next 3 Months ({target_currency})", f"{pi_value_3m:,.2f}")
-            
+
             with col3:
                 st.metric(f"Value Eligible for Price Increase Next 6 Months ({target_currency})", f"{pi_value_6m:,.2f}")
-            
+
             # Top contracts with price increase opportunities
-            # with st.expander(f"Top Contracts with Price Increase Opportunities This Year ({target_currency})"):
-            top_pi_year = price_increase_year.dropna(subset=['AnnualSalesValue_Converted']).sort_values('AnnualSalesValue_Converted', ascending=False).head(20)
-            
             fig = px.bar(
-                top_pi_year,
-                x='Contract Description', 
+                analysis['top_price_increase'],
+                x='Contract Description',
                 y='AnnualSalesValue_Converted',
-                title=f'Top 20 Contracts with Price Increase Opportunities This Year ({target_currency})',
-                labels={'Contract Description': 'Contract Name', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'},
+                title=f'Top {top_n_count} Contracts with Price Increase Opportunities This Year ({target_currency})',
+                labels=value_labels,
                 hover_data=['Contract Number', 'Contract Country', 'Price Increase Opportunity Date']
             )
             st.plotly_chart(fig)
-            
-            # KPI 7: Annual Sales Value Distribution
-            # st.subheader(f"Annual Sales Value Distribution ({target_currency})")
-            
-            # # Create histogram of annual sales values
-            # fig = px.histogram(
-            #     filtered_df.dropna(subset=['AnnualSalesValue_Converted']),
-            #     x='AnnualSalesValue_Converted',
-            #     nbins=50,
-            #     title=f'Distribution of Annual Sales Values ({target_currency})',
-            #     labels={'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'},
-            #     marginal='box'
-            # )
-            # st.plotly_chart(fig)
-            
+
             # Annual sales value by region
-            sales_by_region = filtered_df.groupby('Contract Region')['AnnualSalesValue_Converted'].sum().reset_index()
-            sales_by_region = sales_by_region.sort_values('AnnualSalesValue_Converted', ascending=False)
-            
             fig = px.pie(
-                sales_by_region,
+                analysis['sales by Contract Region'],
                 values='AnnualSalesValue_Converted',
                 names='Contract Region',
                 title=f'Annual Sales Value by Cluster ({target_currency})'
             )
             st.plotly_chart(fig)
-            
+
             # Annual sales value by contract type
-            sales_by_type = filtered_df.groupby('Type of Contract')['AnnualSalesValue_Converted'].sum().reset_index()
-            sales_by_type = sales_by_type.sort_values('AnnualSalesValue_Converted', ascending=False)
-            
             fig = px.bar(
-                sales_by_type,
+                analysis['sales by Type of Contract'],
                 y='AnnualSalesValue_Converted',
                 x='Type of Contract',  # Reversed axes for better readability
                 title=f'Annual Sales Value by Contract Type ({target_currency})',
                 labels={'Type of Contract': 'Contract Type', 'AnnualSalesValue_Converted': f'Annual Sales Value ({target_currency})'}
             )
             st.plotly_chart(fig)
-        
+
         except:
             st.subheader("Not enought data to display the analysis")
 
     except:
         pass
 
-    # Data table with key information
-    st.subheader("Contract Data Table")
-
-    # Select relevant columns for the data table
-    fixed_columns = ["Contract Id",'Contract Number', 'Contract Name', 'Contract Region', 'Contract Country']
-    table_columns = fixed_columns + kpi_columns
-    # "Id",'ContractNumber', 'Name', 'ContractRegion__c', 'ContractCountry__c' + KPI data
-#     table_columns = ['ContractNumber', 'Name', 'Status', 'StartDate', 'Contract_End_Date__c', 
-#                     'ContractRegion__c', 'ContractCountry__c', 'EMEA_Type_of_contract__c',
-#                     'AnnualSalesValue__c', 'AnnualSalesValue_Converted', 'Price_Increase_Opportunity_Date__c',
-#                             "Id", 'ConsignmentValue__c','CapitalValue__c', 'TotalProcedureCommitments__c', 
-#                             'SAP_Deal_Number__c'
-# ]
+# Opt-in timing and memory of every stage of the run, shown in the sidebar and
+# appended to a JSON lines log
+perf_mode = st.sidebar.checkbox(
+    "Performance instrumentation",
+    value=False,
+    help=f"Records wall time, rows and memory of each stage. Logged to {kpi.perf_log_path}."
+)
+trace_memory = perf_mode and st.sidebar.checkbox(
+    "Trace memory",
+    value=True,
+    help="Measures the peak Python heap growth of each stage with tracemalloc, which makes parsing stages several times slower. Memory allocated by Arrow is not on the Python heap; its high-water mark is recorded either way."
+)
+# Streaming mode reads the export in chunks and only keeps running aggregates in memory
+streaming_mode = st.sidebar.checkbox(
+    "Streaming mode (exports larger than memory)",
+    value=False,
+    help="Reads the CSV in chunks and renders the KPIs from running aggregates. The band audit, contract data table, CSV export and trends are not available in this mode, and contracts present in several uploaded files are counted once per file."
+)
+
+# A run interrupted by a rerun may have left its recorder active (and tracing memory)
+kpi.reset_recorder()
+if perf_mode:
+    recorder = kpi.PerfRecorder(trace_memory=trace_memory, streaming=streaming_mode).start()
+else:
+    recorder = None
+
+if uploaded_file is not None and streaming_mode:
+    fingerprint = kpi.file_fingerprint(uploaded_file)
+
+    # Filter options and column names, collected in one pass over the file
+    @st.cache_data
+    def stream_filter_options(_file, fingerprint):
+        return kpi.stream_filter_options(_file)
+
+    # KPI aggregates for one combination of settings, collected in one pass over the file
+    @st.cache_data
+    def stream_kpis(_file, fingerprint, kpi_columns, target_currency, filters, today, n):
+        return kpi.stream_kpis(_file, kpi_columns, target_currency, filters=filters, today=today, n=n)
+
+    with kpi.stage("Stream filter options"):
+        options, columns = stream_filter_options(uploaded_file, fingerprint)
+
+    # Sidebar for currency selection
+    st.sidebar.header("Settings")
+    target_currency = st.sidebar.selectbox(
+        "Select Display Currency",
+        options=['USD', 'EUR', 'GBP', 'CHF', 'DKK', 'NOK', 'SEK'],
+        index=0  # Default to USD
+    )
+    top_n_count = st.sidebar.number_input("Number of Top Contracts", min_value=5, max_value=100, value=20, step=5)
+
+    # Sidebar for filters
+    st.sidebar.header("Filters")
+    filters = {
+        'contract_types': st.sidebar.multiselect("Select Contract Types", options=options['Type of Contract'], default=[]),
+        'bus_included': st.sidebar.multiselect("Select BUs included in Contract", options=options['BUs included in Contract'], default=[]),
+        'regions': st.sidebar.multiselect("Select Contract Clusters", options=options['Contract Region'], default=[]),
+        'countries': st.sidebar.multiselect("Select Contract Countries", options=options['Contract Country'], default=[]),
+        'statuses': st.sidebar.multiselect("Select Contract Status", options=options['Status'], default=[]),
+        'volume_agreement': st.sidebar.multiselect("Volume Based Agreement - Active", options=['Yes','No'], default=['No']),
+    }
+    kpi_columns_default = ['Status', 'Contract Start Date', 'Contract End Date', 'Annual Sales Value', 
+                   'Price Increase Opportunity Date', 
+                  'Consignment Value','Capital Value', 'Total Procedure Commitments','SAP Deal Number'
+                  ]
+    kpi_columns = st.sidebar.multiselect(
+        "Select KPI columns",
+        options=columns,
+        default=[col for col in kpi_columns_default if col in columns]
+    )
+    if 'Yes' in filters['volume_agreement']:
+        kpi_columns = kpi.volume_agreement_kpi_columns
+
+    today = datetime.now().date()
+
+    # KPI aggregates of the current settings, shaped like the section results of the full mode
+    def streamed_section(section):
+        aggregates = stream_kpis(uploaded_file, fingerprint, kpi_columns, target_currency, filters, today, top_n_count)
+        return aggregates.data_quality() if section == 'Data Quality' else aggregates.kpi_analysis()
+
+    # Only the selected tab is computed and rendered, with the same sections as the full mode
+    data_tab, kpi_tab, band_tab, table_tab, trends_tab = st.tabs(
+        ["Data Quality", "KPI Analysis", "Band Audit", "Contract Data", "Trends"],
+        key="section",
+        on_change="rerun"
+    )
+
+    with data_tab:
+        if data_tab.open:
+            with kpi.stage("Data Quality (render)"):
+                data_quality_section(streamed_section('Data Quality'))
+
+    with kpi_tab:
+        if kpi_tab.open:
+            with kpi.stage("KPI Analysis (render)"):
+                kpi_section(streamed_section('KPI Analysis'), top_n_count)
+
+    # These need the rows of the whole export
+    for tab in [band_tab, table_tab, trends_tab]:
+        with tab:
+            if tab.open:
+                st.info("The band audit, the contract data table with its export and the trends are not available in streaming mode.")
+
+elif uploaded_file is not None:
+    # KPI relevant columns
+    kpi_columns_default = ['Status', 'Contract Start Date', 'Contract End Date', 'Annual Sales Value', 
+                   'Price Increase Opportunity Date', 
+                  'Consignment Value','Capital Value', 'Total Procedure Commitments','SAP Deal Number'
+                  ]
+
+    # Load data, reusing the parsed upload from the on-disk cache when the same file was seen before.
+    # Only the columns the page needs are read; the others are read when they are picked.
+    @st.cache_data
+    def load_data(file, columns):
+        return kpi.cached_load_contracts(file, columns=list(columns))
+
+    # Columns of the export, from its header
+    @st.cache_data
+    def export_columns(file):
+        return kpi.export_columns(file)
+
+    # Columns not read with the rest of the export, read on demand
+    @st.cache_data
+    def load_columns(file, columns):
+        return kpi.load_columns(file, list(columns))
+
+    # frame with the given columns of the export it does not have yet, joined by row
+    def with_columns(frame, columns):
+        columns = [col for col in columns if col in available_columns and col not in frame.columns]
+        if not columns:
+            return frame
+        with kpi.stage("Column read", rows=len(frame)):
+            extra = load_columns(uploaded_file, tuple(columns))
+        return frame.join(extra.drop(columns=[col for col in extra.columns if col in frame.columns]))
+    
+    # Incremental refresh: only contracts new or changed since the previous upload are
+    # parsed; the rows that left and entered bring the stored KPI aggregates up to date
+    @st.cache_data
+    def load_data_incremental(file, name):
+        return kpi.load_contracts_delta(file, name=name)
+
+    incremental_mode = st.sidebar.checkbox(
+        "Incremental refresh (compare with previous upload)",
+        value=False,
+        help="Keeps the previous upload and re-parses only contracts whose Id is new or whose LastModifiedDate changed."
+    )
+
+    if incremental_mode and isinstance(uploaded_file, list):
+        st.sidebar.warning("Incremental refresh works on a single export; the uploaded files are combined in full.")
+        incremental_mode = False
+
+    if incremental_mode:
+        snapshot_name = st.sidebar.text_input(
+            "Compare with the previous upload named",
+            value=uploaded_file.name,
+            help="Uploads under the same name share a baseline, e.g. a name for a recurring export whose file name changes."
+        )
+
+    with kpi.stage("Load") as record:
+        if incremental_mode:
+            df, changes, left, entered = load_data_incremental(uploaded_file, snapshot_name)
+        else:
+            df = load_data(uploaded_file, tuple(dict.fromkeys(kpi.core_columns + kpi_columns_default)))
+        record['rows'] = len(df)
+    fingerprint = kpi.file_fingerprint(uploaded_file)
+    # The two load modes give frames of the same file with different columns and dtypes
+    loaded = f"{fingerprint}:{'incremental' if incremental_mode else 'projected'}"
+    available_columns = export_columns(uploaded_file)
+
+    if incremental_mode:
+        with st.expander("Changes Since Previous Upload", expanded=True):
+            if changes['mode'] == 'full':
+                st.write("No comparable previous upload was found; the whole file was parsed.")
+            else:
+                st.caption(f"Compared with the upload of {changes['previous_upload']}")
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("New Contracts", len(changes['new']))
+                with col2:
+                    st.metric("Changed Contracts", len(changes['changed']))
+                with col3:
+                    st.metric("Removed Contracts", len(changes['removed']))
+                with col4:
+                    st.metric("Unchanged Contracts", changes['unchanged'])
+                st.dataframe(pd.DataFrame(
+                    [(contract_id, change) for change in ['new', 'changed', 'removed'] for contract_id in changes[change]],
+                    columns=['Contract ID', 'Change']
+                ))
+    
+    # Date the export was taken, from its latest LastModifiedDate
+    @st.cache_data
+    def snapshot_export_date(_df, fingerprint):
+        return kpi.snapshot_export_date(_df)
+
+    # Stores the upload and its KPI aggregates in the history, once per file
+    @st.cache_data
+    def save_snapshot(_df, fingerprint, export_date):
+        return kpi.save_snapshot(_df, fingerprint, export_date)
+
+    # Every upload is kept in the local history store, tagged with its export date,
+    # for the KPI trends across exports. An upload already stored keeps the export
+    # date it was stored with, so that it is counted once in the trends.
+    with st.sidebar.expander("History"):
+        save_history = st.checkbox(
+            "Save uploads to history",
+            value=True,
+            help=f"Stores the parsed contracts and their KPI aggregates under {kpi.history_dir}. Stored uploads are never overwritten."
+        )
+        stored_date = kpi.stored_export_date(fingerprint)
+        export_date = st.date_input(
+            "Export Date",
+            value=stored_date or snapshot_export_date(df, fingerprint),
+            disabled=stored_date is not None,
+            help="This upload is already stored under this export date." if stored_date is not None else None
+        )
+        if save_history:
+            try:
+                with kpi.stage("History snapshot", rows=len(df)):
+                    save_snapshot(df, fingerprint, export_date)
+            except OSError:
+                st.caption(f"Could not write the snapshot to {kpi.history_dir}.")
+        snapshots = kpi.list_snapshots()
+        st.metric("Stored Snapshots", len(snapshots))
+
+    # Sidebar for currency selection
+    st.sidebar.header("Settings")
+    target_currency = st.sidebar.selectbox(
+        "Select Display Currency",
+        options=['USD', 'EUR', 'GBP', 'CHF', 'DKK', 'NOK', 'SEK'],
+        index=0  # Default to USD
+    )
     
-    # Show the data table with the selected columns
+    # Number of contracts shown in the top contract charts
+    top_n_count = st.sidebar.number_input(
+        "Number of Top Contracts",
+        min_value=5,
+        max_value=100,
+        value=20,
+        step=5
+    )
+    
+    # Engine the Data Quality and KPI Analysis sections are computed with
+    query_engine = st.sidebar.selectbox(
+        "Query Engine",
+        options=kpi.query_engines,
+        help="DuckDB runs the filters, counts, date windows and top contract lists as SQL over the loaded data. "
+             "Polars runs them as lazy queries over a copy of the loaded data, spread over all cores. "
+             "Both give the same results as pandas."
+    )
+    
+    # Convert all sales values to selected currency, cached per currency
+    # (the frame itself is not hashed, the uploaded file's fingerprint and load mode identify it)
+    @st.cache_data
+    def convert_sales_values(_df, loaded, target_currency):
+        return kpi.convert_sales_values(_df, target_currency)
+
+    with kpi.stage("Currency conversion", rows=len(df)):
+        df['AnnualSalesValue_Converted'] = convert_sales_values(df, loaded, target_currency)
+    
+    # Sidebar for filters
+    st.sidebar.header("Filters")
+    
+    # Create filters for the specified columns
     try:
-        filtered_df = filtered_df[filtered_df[table_columns].isnull().any(axis=1)]
+        contract_types = st.sidebar.multiselect(
+            "Select Contract Types",
+            options=df['Type of Contract'].dropna().unique(),
+            default=[]
+        )
+    except:
+        contract_types = []
 
-        if 'StartDate' in table_columns:
-            
-            st.dataframe(filtered_df[table_columns].sort_values('StartDate', ascending=False))
-            filtered_df = filtered_df[table_columns].sort_values('StartDate', ascending=False)
-        else:
-            st.dataframe(filtered_df[table_columns].sort_values('Contract Number', ascending=False))
-            filtered_df = filtered_df[table_columns].sort_values('Contract Number', ascending=False)
+    try:
+        bus_included = st.sidebar.multiselect(
+            "Select BUs included in Contract",
+            options=df['BUs included in Contract'].dropna().unique(),
+            default=[]
+        )
+    except:
+        bus_included = []
+
+    try:
+        regions = st.sidebar.multiselect(
+            "Select Contract Clusters",
+            options=df['Contract Region'].dropna().unique(),
+            default=[]
+        )
+    except:
+        regions = [] 
+
+    try:   
+        countries = st.sidebar.multiselect(
+            "Select Contract Countries",
+            options=df['Contract Country'].dropna().unique(),
+            default=[]
+        )
+    except:
+        countries = []
 
+    try:
+        statuses = st.sidebar.multiselect(
+            "Select Contract Status",
+            options=df['Status'].dropna().unique(),
+            default=[]
+        )
     except:
-        st.dataframe(filtered_df.sort_values('Contract Number', ascending=False))
-        filtered_df = filtered_df.sort_values('Contract Number', ascending=False)
+        statuses = []
+
+    volume_agreement = st.sidebar.multiselect(
+        "Volume Based Agreement - Active",
+        options=['Yes','No'],
+        default=['No']
+    )
+    # Loaded columns first, then the columns of the export not read yet
+    kpi_column_options = list(dict.fromkeys([*df.columns, *available_columns]))
+
+    try:
+        kpi_columns = st.sidebar.multiselect(
+            "Select KPI columns",
+            options=kpi_column_options,
+            default=kpi_columns_default
+        )
+    except:
+        kpi_columns = st.sidebar.multiselect(
+        "Select KPI columns",
+        options=kpi_column_options,
+        default=kpi_column_options
+    )
+    
+            # Rename the KPI columns
+    kpi_columns = kpi.rename_kpi_columns(kpi_columns, kpi.api_key_to_field_mapping)
+    if 'Yes' in volume_agreement:
+        kpi_columns = kpi.volume_agreement_kpi_columns
+
+    # KPI columns that were not read up front are read now; the dataset key identifies
+    # the frame with them for the caches below by load mode and the columns it has
+    extra_columns = [col for col in kpi_columns if col in available_columns and col not in df.columns]
+    df = with_columns(df, extra_columns)
+    dataset = ':'.join([loaded, hashlib.sha1('\n'.join(df.columns).encode()).hexdigest()[:16]])
+
+    # Memory used per column, before and after the categorical conversion
+    @st.cache_data
+    def memory_usage_report(_df, dataset):
+        return kpi.memory_report(_df)
+
+    with st.sidebar.expander("Memory Usage"):
+        memory_usage = memory_usage_report(df, dataset)
+        st.metric("Total (MB)", f"{memory_usage['Bytes After'].sum() / 1024 ** 2:,.1f}",
+                  delta=f"{(memory_usage['Bytes After'].sum() - memory_usage['Bytes Before'].sum()) / 1024 ** 2:,.1f}",
+                  delta_color="inverse")
+        st.dataframe(memory_usage)
+
+    # Row positions per filter value, built once per loaded frame and shared between reruns
+    @st.cache_resource(max_entries=kpi.resource_max_entries, ttl=kpi.resource_ttl)
+    def filter_index(_df, loaded):
+        return kpi.build_filter_index(_df)
+
+    # Filter selections and settings the sections are computed from
+    filters = dict(
+        contract_types=contract_types,
+        bus_included=bus_included,
+        regions=regions,
+        countries=countries,
+        statuses=statuses,
+        volume_agreement=volume_agreement,
+    )
+    inputs = {'kpi_columns': kpi_columns, 'target_currency': target_currency, 'n': top_n_count, 'today': datetime.now().date()}
+
+    # Filtered row positions and section results of recent filter selections, shared
+    # between sessions so that going back to an earlier selection needs no recomputation
+    @st.cache_resource
+    def memo_cache():
+        return kpi.MemoCache()
+
+    memo = memo_cache()
+
+    # Apply filters
+    with kpi.stage("Filters", rows=len(df)):
+        positions = memo.get(
+            kpi.memo_key(loaded, 'positions', filters),
+            lambda: kpi.selected_positions(filter_index(df, loaded), **filters)
+        )
+        filtered_df = df if positions is None else df.take(positions)
+
+    # Counts, value sums and null counts per filter combination, built once per dataset
+    # and sliced by the filters instead of scanning the rows
+    @st.cache_resource(max_entries=kpi.resource_max_entries, ttl=kpi.resource_ttl)
+    def contract_cube(_df, dataset):
+        return kpi.ContractCube(_df)
+
+    # In-process DuckDB database over the loaded contracts, per dataset
+    @st.cache_resource(max_entries=kpi.resource_max_entries, ttl=kpi.resource_ttl)
+    def kpi_database(_df, dataset):
+        return kpi.KPIDatabase(_df)
+
+    # Polars lazy queries over the loaded contracts, converted once per dataset
+    @st.cache_resource(max_entries=kpi.resource_max_entries, ttl=kpi.resource_ttl)
+    def kpi_lazy_frame(_df, dataset):
+        return kpi.KPILazyFrame(_df)
+
+    # KPI aggregates of the whole export kept next to the incremental snapshot
+    @st.cache_data
+    def incremental_aggregates(_df, _changes, _left, _entered, fingerprint, kpi_columns, target_currency, n, today):
+        return kpi.refresh_aggregates(_df, _changes, _left, _entered, kpi_columns, target_currency, today=today, n=n)
+
+    # Section results per dataset, filters and the inputs the section declares (see kpi.section_inputs)
+    def section_data(section):
+        section_inputs = kpi.declared_inputs(section, inputs)
+        # Without filters the incremental aggregates cover the selected rows
+        if incremental_mode and positions is None and section in kpi.streaming_sections:
+            aggregates = incremental_aggregates(df, changes, left, entered, fingerprint, **inputs)
+            return aggregates.data_quality() if section == 'Data Quality' else aggregates.kpi_analysis()
+        if query_engine == 'DuckDB' and section in kpi.sql_sections:
+            return memo.get(
+                kpi.memo_key(dataset, f'{section} (DuckDB)', filters, section_inputs),
+                lambda: kpi_database(df, dataset).compute_section(section, filters, **section_inputs)
+            )
+        if query_engine == 'Polars' and section in kpi.lazy_sections:
+            return memo.get(
+                kpi.memo_key(dataset, f'{section} (Polars)', filters, section_inputs),
+                lambda: kpi_lazy_frame(df, dataset).compute_section(section, filters, **section_inputs)
+            )
+        return memo.get(
+            kpi.memo_key(dataset, section, filters, section_inputs),
+            lambda: kpi.compute_section(section, filtered_df, cube=contract_cube(df, dataset).slice(**filters), **section_inputs)
+        )
+
+    # Filled in once the sections below have used the cache
+    cache_panel = st.sidebar.expander("Cache")
+
+    # Band audit: band computed from the annual sales value against the band entered on the contract
+    def band_audit_section():
+        st.subheader("Band Audit")
+
+        try:
+            audit = section_data('Band Audit')
+
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                st.metric("Contracts with Computed Band", int(audit['Computed Band'].notna().sum()))
+
+            with col2:
+                st.metric("Band Mismatches", int(audit['Band Mismatch'].sum()))
+
+            with col3:
+                mismatch_percentage = kpi.percentage(audit['Band Mismatch'].sum(), audit['Computed Band'].notna().sum())
+                st.metric("Mismatch Percentage", f"{mismatch_percentage}%")
+
+            with st.expander(f"View Contracts with a Band Mismatch (bands in {kpi.band_currency})"):
+                audit_columns = [col for col in ['Contract Number', 'Contract Name', kpi.band_type_column, 'Annual Sales Value'] if col in filtered_df.columns]
+                st.dataframe(pd.concat([filtered_df[audit_columns], audit[['Band', 'Computed Band']]], axis=1)[audit['Band Mismatch']])
+        except:
+            st.info("Band audit needs the Annual Sales Value and BUs included in Contract columns.")
+
+    # Data table with key information
+    def data_table_section(filtered_df):
+        st.subheader("Contract Data Table")
+
+        # Columns of the export not loaded for the KPIs, read when added to the table
+        table_extra_columns = st.multiselect(
+            "Additional Columns",
+            options=[col for col in available_columns if col not in filtered_df.columns],
+            default=[]
+        )
+        filtered_df = with_columns(filtered_df, table_extra_columns)
+
+        # Select relevant columns for the data table
+        fixed_columns = ["Contract Id",'Contract Number', 'Contract Name', 'Contract Region', 'Contract Country']
+        table_columns = fixed_columns + kpi_columns
+        # "Id",'ContractNumber', 'Name', 'ContractRegion__c', 'ContractCountry__c' + KPI data
+    #     table_columns = ['ContractNumber', 'Name', 'Status', 'StartDate', 'Contract_End_Date__c', 
+    #                     'ContractRegion__c', 'ContractCountry__c', 'EMEA_Type_of_contract__c',
+    #                     'AnnualSalesValue__c', 'AnnualSalesValue_Converted', 'Price_Increase_Opportunity_Date__c',
+    #                             "Id", 'ConsignmentValue__c','CapitalValue__c', 'TotalProcedureCommitments__c', 
+    #                             'SAP_Deal_Number__c'
+    # ]
+
+        # Show the data table with the selected columns
+        try:
+            filtered_df = filtered_df[filtered_df[table_columns].isnull().any(axis=1)]
 
-    csv = filtered_df.to_csv(index=False, sep=';').encode('utf-8')
+            if 'StartDate' in table_columns:
 
-    # Download button for the custom CSV
-    st.download_button(
-        label="Download CSV (semicolon separated)",
-        data=csv,
-        file_name='contracts_missingdata_export.csv',
-        mime='text/csv'
+                st.dataframe(filtered_df[table_columns].sort_values('StartDate', ascending=False))
+                filtered_df = filtered_df[table_columns].sort_values('StartDate', ascending=False)
+            else:
+                st.dataframe(filtered_df[table_columns].sort_values('Contract Number', ascending=False))
+                filtered_df = filtered_df[table_columns].sort_values('Contract Number', ascending=False)
+
+        except:
+            st.dataframe(filtered_df.sort_values('Contract Number', ascending=False))
+            filtered_df = filtered_df.sort_values('Contract Number', ascending=False)
+
+        # The export is only written when the download button is clicked, in chunks
+        export_format = st.selectbox(
+            "Export Format",
+            options=list(kpi.export_formats),
+            help="CSV files are semicolon separated. Compressed and Parquet exports are much smaller for large extracts."
+        )
+        extension, mime = kpi.export_formats[export_format]
+
+        # Download button for the custom export
+        st.download_button(
+            label=f"Download {export_format}" + (" (semicolon separated)" if export_format == 'CSV' else ""),
+            data=lambda: kpi.export_contracts(filtered_df, export_format),
+            file_name=f'contracts_missingdata_export.{extension}',
+            mime=mime
+        )
+
+    # KPI values of every stored snapshot for the filters, read from the stored aggregates;
+    # snapshots identifies the store content
+    @st.cache_data
+    def history_trends(filters, kpi_columns, target_currency, snapshots):
+        return kpi.kpi_trends(filters, kpi_columns, target_currency)
+
+    # KPI trends across the uploads kept in the history
+    def trends_section():
+        st.subheader("KPI Trends")
+
+        trends = history_trends(filters, kpi_columns, target_currency, tuple(zip(snapshots['Export Date'], snapshots['Snapshot'])))
+        if len(trends) == 0:
+            st.info("No uploads are stored in the history yet.")
+            return
+
+        count_columns = [col for col in ['Total Contracts', 'Active Contracts', 'Contracts Sent Not Activated'] if col in trends.columns]
+        fig = px.line(trends, x='Export Date', y=count_columns, title='Contracts per Export', markers=True)
+        st.plotly_chart(fig)
+
+        value_column = f'Annual Sales Value ({target_currency})'
+        if value_column in trends.columns:
+            fig = px.line(trends, x='Export Date', y=value_column, title=f'Annual Sales Value per Export ({target_currency})', markers=True)
+            st.plotly_chart(fig)
+
+        missing_columns = [col for col in trends.columns if col.startswith('Missing % ')]
+        if missing_columns:
+            fig = px.line(trends, x='Export Date', y=missing_columns, title='Missing Data Percentage in KPI Relevant Columns per Export',
+                          labels={'value': 'Missing Percentage', 'variable': 'Column'}, markers=True)
+            st.plotly_chart(fig)
+
+        with st.expander("View KPI Values per Snapshot"):
+            st.dataframe(trends)
+
+    # Only the selected tab is computed and rendered
+    data_tab, kpi_tab, band_tab, table_tab, trends_tab = st.tabs(
+        ["Data Quality", "KPI Analysis", "Band Audit", "Contract Data", "Trends"],
+        key="section",
+        on_change="rerun"
     )
+
+    with data_tab:
+        if data_tab.open:
+            with kpi.stage("Data Quality (render)", rows=len(filtered_df)):
+                data_quality_section(section_data('Data Quality'))
+
+    with kpi_tab:
+        if kpi_tab.open:
+            with kpi.stage("KPI Analysis (render)", rows=len(filtered_df)):
+                kpi_section(section_data('KPI Analysis'), top_n_count)
+
+    with band_tab:
+        if band_tab.open:
+            with kpi.stage("Band Audit (render)", rows=len(filtered_df)):
+                band_audit_section()
+
+    with table_tab:
+        if table_tab.open:
+            with kpi.stage("Contract Data (render)", rows=len(filtered_df)):
+                data_table_section(filtered_df)
+
+    with trends_tab:
+        if trends_tab.open:
+            with kpi.stage("Trends (render)", rows=len(snapshots)):
+                trends_section()
+
+    with cache_panel:
+        stats = memo.stats()
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Hits", stats['hits'])
+            st.metric("Entries", stats['entries'])
+        with col2:
+            st.metric("Misses", stats['misses'])
+            st.metric("Size (MB)", f"{stats['bytes'] / 1024 ** 2:,.1f}")
+        st.caption(f"Hit rate {stats['hit_rate']}%, {stats['evictions']} evicted (at most {memo.max_entries} entries, {memo.max_bytes / 1024 ** 2:,.0f} MB)")
+        if st.button("Clear Cache"):
+            memo.clear()
 else:
     st.info("Please upload a CSV file to begin the analysis.")
     
@@ -872,4 +968,23 @@ else:
     
     # Display example structure
     example_df = pd.DataFrame(columns=example_columns)
-    st.dataframe(example_df)
\ No newline at end of file
+    st.dataframe(example_df)
+
+# Stage timings of this run
+if recorder is not None:
+    recorder.stop()
+    with st.sidebar.expander("Performance", expanded=True):
+        report = recorder.report()
+        if len(report):
+            st.metric("Total (s)", f"{report.loc[report['depth'] == 0, 'seconds'].sum():,.3f}")
+            report['stage'] = ['\u2003' * depth + name for depth, name in zip(report['depth'], report['stage'])]
+            st.dataframe(report.drop(columns='depth').rename(columns={
+                'peak_mb': 'Python heap peak growth (MB)',
+                'arrow_peak_mb': 'Arrow pool high-water mark (MB)',
+            }), hide_index=True)
+            try:
+                recorder.write()
+            except OSError:
+                st.caption(f"Could not write the log to {kpi.perf_log_path}.")
+        else:
+            st.write("No stages were run.")
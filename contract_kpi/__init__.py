@@ -0,0 +1,42 @@
+# Contract KPI computations independent of the Streamlit dashboard.
+# Every function takes a DataFrame plus parameters and returns frames or scalars.
+from .mapping import api_key_to_field_mapping, rename_columns, rename_kpi_columns
+from .currency import exchange_rates, convert_currency, convert_sales_values
+from .schema import (
+    date_columns, date_formats, date_time_suffix, money_columns, categorical_columns, text_columns, number_columns,
+    core_columns, column_types,
+)
+from .loading import (
+    categorical_max_unique_ratio, row_key_columns, file_fingerprint, export_columns,
+    parse_money_column, parse_money_columns, parse_dates, read_export, load_columns,
+    to_categoricals, memory_report, load_contracts, parse_contracts, deduplicate_contracts,
+    load_contracts_many,
+)
+from .filters import (
+    filter_columns, volume_agreement_kpi_columns, filter_options, build_filter_index,
+    filter_positions, selected_positions, apply_filters,
+)
+from .missing import missing_values_summary, missing_counts_summary, missing_data_matrix, missing_data_long, worst_groups, page_groups
+from .windows import (
+    time_frames, window_bounds, sort_dates, date_windows, window_rows, expiry_windows,
+    price_increase_windows,
+)
+from .topn import value_order, largest_positions, top_n
+from .kpis import (
+    active_mask, sent_not_activated_mask, active_contracts, sent_not_activated, percentage,
+    activations_per_month, sales_by,
+)
+from .cache import cache_dir, cache_max_bytes, cache_max_age, resource_max_entries, resource_ttl, evict_cache, cached_load_contracts
+from .bands import band_definitions_path, band_currency, band_type_column, load_band_definitions, assign_bands, audit_bands
+from .streaming import default_chunksize, streaming_sections, read_contract_chunks, stream_filter_options, StreamingKPIs, stream_kpis
+from .incremental import snapshot_dir, diff_exports, load_contracts_delta, load_contracts_incremental, update_aggregates, refresh_aggregates, incremental_refresh
+from .sections import query_engines, section_inputs, cube_sections, data_quality, kpi_analysis, band_audit, declared_inputs, compute_section
+from .memo import memo_max_entries, memo_max_bytes, value_nbytes, normalize_filters, normalize_inputs, memo_key, MemoCache
+from .cube import cube_value_column, cube_currency_column, cube_null_prefix, ContractCube, CubeSlice
+from .perf import perf_log_path, reset_recorder, PerfRecorder, stage, read_perf_log
+from .synthetic import synthetic_date_columns, synthetic_money_columns, synthetic_null_rates, generate_contracts, write_contracts
+from .export import export_chunksize, export_formats, write_csv, write_parquet, export_contracts
+from .history import history_dir, history_batch_size, snapshot_export_date, stored_export_date, save_snapshot, list_snapshots, read_snapshot, kpi_trends
+from .engines import engine_sections, SectionEngine
+from .sql import sql_sections, KPIDatabase
+from .lazy import lazy_sections, csv_null_values, scan_contracts, KPILazyFrame
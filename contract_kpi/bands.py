@@ -0,0 +1,66 @@
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Band table written by test.py, shipped next to the dashboard
+band_definitions_path = Path(__file__).resolve().parent.parent / 'band_definitions.csv'
+
+# Currency the band boundaries are expressed in
+band_currency = 'EUR'
+
+# Column holding the business unit a contract is banded by
+band_type_column = 'BUs included in Contract'
+
+
+# Band boundaries per type, sorted by their lower bound: {type: (lower bounds, band names)}.
+# A band runs from its lower bound up to the next band's lower bound, so amounts
+# with cents between one band's max and the next band's min are not left out.
+@lru_cache(maxsize=None)
+def load_band_definitions(path=band_definitions_path):
+    table = pd.read_csv(path)
+
+    bands = {}
+    for band_type, rows in table.groupby('type', sort=False):
+        rows = rows.sort_values('min value')
+        bands[band_type] = (
+            rows['min value'].to_numpy(dtype='float64'),
+            rows['Band number'].to_numpy(dtype=object),
+        )
+    return bands
+
+
+# Band of every contract from its annual value and type, by binary search in the
+# boundary array of its type. Contracts of other types or below the first band get NaN.
+def assign_bands(values, types, bands=None):
+    bands = load_band_definitions() if bands is None else bands
+    values = np.asarray(values, dtype='float64')
+    type_codes, type_names = pd.factorize(pd.Series(types))
+    type_names = list(type_names)
+
+    assigned = np.full(len(values), np.nan, dtype=object)
+    for band_type, (lower_bounds, names) in bands.items():
+        if band_type not in type_names:
+            continue
+        rows = np.flatnonzero(type_codes == type_names.index(band_type))
+
+        band_index = np.searchsorted(lower_bounds, values[rows], side='right') - 1
+        valid = (band_index >= 0) & ~np.isnan(values[rows])
+        assigned[rows[valid]] = names[band_index[valid]]
+    return assigned
+
+
+# Computed band next to the band entered on the contract, flagging the rows where
+# both are filled in and disagree
+def audit_bands(df, values, bands=None, type_column=None):
+    type_column = band_type_column if type_column is None else type_column
+
+    audit = pd.DataFrame(index=df.index)
+    audit['Band'] = df['Band'] if 'Band' in df.columns else np.nan
+    audit['Computed Band'] = assign_bands(values, df[type_column], bands)
+
+    entered = audit['Band'].astype('string').str.strip().str.casefold()
+    computed = audit['Computed Band'].astype('string').str.casefold()
+    audit['Band Mismatch'] = (entered.notna() & computed.notna() & (entered != computed)).fillna(False).astype(bool)
+    return audit
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+
+from .loading import file_fingerprint, load_contracts
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Bump whenever load_contracts changes the shape or types of what it returns,
+# so files written by an older version are not picked up
+cache_version = 3
+
+# Where parsed uploads are stored and how much of them to keep
+cache_dir = Path(os.environ.get('CONTRACT_KPI_CACHE_DIR', Path.home() / '.cache' / 'contract_kpi'))
+cache_max_bytes = 2 * 1024 ** 3
+cache_max_age = 7 * 24 * 3600  # seconds
+
+# Per-dataset structures the dashboard keeps in memory (filter index, cube, DuckDB
+# database, Polars frame), each holding a copy of the contracts: how many datasets
+# to keep, and for how long after they were built
+resource_max_entries = 4
+resource_ttl = 3600  # seconds
+
+
+def cache_path(key, directory=None):
+    return Path(directory or cache_dir) / f'contracts-v{cache_version}-{key}.arrow'
+
+
+# Write a parsed frame as an Arrow IPC file; written to a temporary file first so
+# other worker processes never see a partial file
+def write_cached(df, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        with pa.OSFile(str(tmp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+# Memory-map a cached Arrow file back into a DataFrame
+def read_cached(path):
+    with pa.memory_map(str(path), 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+# Remove cached files older than max_age seconds, then the least recently used
+# ones until the cache fits in max_bytes
+def evict_cache(directory=None, max_bytes=None, max_age=None):
+    directory = Path(directory or cache_dir)
+    max_bytes = cache_max_bytes if max_bytes is None else max_bytes
+    max_age = cache_max_age if max_age is None else max_age
+
+    if not directory.exists():
+        return []
+
+    now = time.time()
+    entries = []
+    removed = []
+    for path in directory.glob('contracts-*.arrow'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if now - stat.st_mtime > max_age:
+            path.unlink(missing_ok=True)
+            removed.append(path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        removed.append(path)
+        total -= size
+    return removed
+
+
+# load_contracts backed by the on-disk cache, keyed by a hash of the file contents
+# and of the columns read. Falls back to parsing the file when pyarrow is not installed.
+def cached_load_contracts(file, directory=None, columns=None):
+    if pa is None:
+        return load_contracts(file, columns)
+
+    key = file_fingerprint(file)
+    if columns is not None:
+        key += '-' + hashlib.sha1('\n'.join(sorted(columns)).encode()).hexdigest()[:16]
+    path = cache_path(key, directory)
+    if path.exists():
+        try:
+            df = read_cached(path)
+            # Refresh the modification time so eviction keeps recently used files
+            os.utime(path)
+            return df
+        except (OSError, pa.ArrowException):
+            path.unlink(missing_ok=True)
+
+    df = load_contracts(file, columns)
+    try:
+        write_cached(df, path)
+    except (OSError, pa.ArrowException):
+        pass
+    evict_cache(directory)
+    return df
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from .currency import exchange_rates
+from .filters import filter_columns
+from .missing import missing_counts_summary
+from .perf import stage
+from .streaming import missing_dimensions
+
+# Source amount and currency the cube keeps value sums of; sums are converted to the
+# display currency when the cube is read, so one cube serves every currency
+cube_value_column = 'AnnualSalesValue_Numeric'
+cube_currency_column = 'AnnualSalesValue_Currency'
+
+# Prefix of the null count columns when cells and null counts are stored as one frame
+cube_null_prefix = 'Missing: '
+
+
+# Counts, value sums and null counts per column for every combination of the filter
+# dimensions (and source currency) present in a dataset. Built once per dataset; the
+# sidebar filters are answered by slicing its cells instead of scanning the rows.
+class ContractCube:
+
+    def __init__(self, df):
+        with stage('Cube build', rows=len(df)):
+            self._build(df)
+
+    def _build(self, df):
+        self.dimensions = [column for column in filter_columns.values() if column in df.columns]
+        keys = self.dimensions + ([cube_currency_column] if cube_currency_column in df.columns else [])
+        groups = [df[key] for key in keys]
+
+        # One row per cell: its dimension values, number of contracts and measures
+        grouped = df.groupby(groups, observed=True, dropna=False, sort=False)
+        cells = grouped.size().rename('Count').to_frame()
+        if cube_value_column in df.columns:
+            cells['Value'] = grouped[cube_value_column].sum()
+        if 'Notification Date' in df.columns:
+            cells['Notified'] = grouped['Notification Date'].count()
+
+        # Null counts of every column per cell, in the column order of df
+        # (same keys and order as the cells)
+        nulls = df.isna().groupby(groups, observed=True, dropna=False, sort=False).sum()
+
+        self.cells = cells.reset_index()
+        self.nulls = nulls.reset_index(drop=True)
+        self.columns = list(df.columns)
+
+    def __len__(self):
+        return len(self.cells)
+
+    # Cells and their null counts as one frame, e.g. to store the cube
+    def to_frame(self):
+        return pd.concat([self.cells, self.nulls.add_prefix(cube_null_prefix)], axis=1)
+
+    # A cube from a frame written by to_frame (or several of them concatenated);
+    # columns other than the dimensions and measures are kept on the cells
+    @classmethod
+    def from_frame(cls, frame):
+        null_columns = [col for col in frame.columns if col.startswith(cube_null_prefix)]
+        cube = cls.__new__(cls)
+        cube.dimensions = [column for column in filter_columns.values() if column in frame.columns]
+        cube.cells = frame.drop(columns=null_columns).reset_index(drop=True)
+        cube.nulls = frame[null_columns].rename(columns=lambda col: col[len(cube_null_prefix):]).reset_index(drop=True)
+        cube.columns = list(cube.nulls.columns)
+        return cube
+
+    # Cells matching the sidebar filters, with the same semantics as apply_filters
+    def slice(self, contract_types=None, bus_included=None, regions=None,
+              countries=None, statuses=None, volume_agreement=None):
+        selections = {
+            filter_columns['contract_types']: contract_types,
+            filter_columns['bus_included']: bus_included,
+            filter_columns['regions']: regions,
+            filter_columns['countries']: countries,
+            filter_columns['statuses']: statuses,
+        }
+
+        mask = np.ones(len(self.cells), dtype=bool)
+        for column, values in selections.items():
+            if values:
+                mask &= self.cells[column].isin(list(values)).to_numpy()
+
+        if volume_agreement and 'Yes' in volume_agreement and {'Status', 'Type of Contract'} <= set(self.dimensions):
+            mask &= ((self.cells['Status'] == 'Active') & (self.cells['Type of Contract'] == 'Usage agreement')).to_numpy()
+        return CubeSlice(self, mask)
+
+
+# The cells of a ContractCube selected by one filter state, read like a filtered frame
+class CubeSlice:
+
+    def __init__(self, cube, mask):
+        self.cube = cube
+        self.cells = cube.cells[mask]
+        self.nulls = cube.nulls[mask]
+
+    @property
+    def total(self):
+        return int(self.cells['Count'].sum())
+
+    @property
+    def active(self):
+        return int(self.cells['Count'][(self.cells['Status'] == 'Active').to_numpy()].sum())
+
+    @property
+    def sent_not_activated(self):
+        return int(self.cells['Notified'][(self.cells['Status'] != 'Active').to_numpy()].sum())
+
+    # Number of contracts per value of group_column, like df[group_column].value_counts()
+    def group_sizes(self, group_column):
+        sizes = self.cells.groupby(group_column, observed=True)['Count'].sum()
+        return sizes[sizes > 0].sort_values(ascending=False, kind='stable')
+
+    # Missing count and percentage per column, like missing_values_summary
+    def missing_summary(self, kpi_columns):
+        return missing_counts_summary(self.nulls.sum(), self.total, kpi_columns)
+
+    # Group x column missing percentage matrix, like missing_data_matrix
+    def missing_matrix(self, group_column, column_list, name=None):
+        columns = [col for col in dict.fromkeys(column_list) if col in self.cube.columns]
+        groups = self.cells[group_column]
+
+        missing = self.nulls[columns].groupby(groups, observed=True).sum()
+        sizes = self.cells['Count'].groupby(groups, observed=True).sum()
+        missing_pct = (missing[sizes > 0].div(sizes[sizes > 0], axis=0) * 100).round(2)
+
+        missing_pct = missing_pct.sort_index().sort_index(axis=1)
+        missing_pct.index.name = name or missing_dimensions.get(group_column, group_column)
+        missing_pct.columns.name = 'Column'
+        return missing_pct
+
+    # Total annual sales value in target_currency per value of column, like sales_by
+    def sales_by(self, column, target_currency='USD', value_column='AnnualSalesValue_Converted'):
+        rates = self.cells[cube_currency_column].map(exchange_rates).astype('float64')
+        values = self.cells['Value'] / rates * exchange_rates[target_currency]
+
+        sales = values.groupby(self.cells[column], observed=True).sum().rename(value_column).reset_index()
+        return sales.sort_values(value_column, ascending=False)
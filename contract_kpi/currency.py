@@ -0,0 +1,32 @@
+import pandas as pd
+
+# Define exchange rates (hardcoded)
+exchange_rates = {
+    'USD': 1.0,  # Base currency
+    'EUR': 0.92,  # 1 USD = 0.92 EUR
+    'GBP': 0.77,  # 1 USD = 0.77 GBP
+    'CHF': 0.87,  # 1 USD = 0.87 CHF
+    'DKK': 6.75,  # 1 USD = 6.75 DKK
+    'NOK': 10.18, # 1 USD = 10.18 NOK
+    'SEK': 10.06, # 1 USD = 10.06 SEK
+}
+
+# Currency conversion function with hardcoded exchange rates.
+# Accepts scalars or whole columns: for columns the source currencies are
+# mapped to a rate vector so the conversion is a single multiply.
+def convert_currency(value, from_currency, to_currency):
+    if isinstance(from_currency, pd.Series):
+        from_rate = from_currency.map(exchange_rates).astype('float64')
+    else:
+        from_rate = exchange_rates[from_currency]
+
+    # Convert to USD first, then USD to the target currency
+    return value / from_rate * exchange_rates[to_currency]
+
+# Annual sales values of the whole frame in the target currency
+def convert_sales_values(df, target_currency):
+    return convert_currency(
+        df['AnnualSalesValue_Numeric'],
+        df['AnnualSalesValue_Currency'],
+        target_currency
+    )
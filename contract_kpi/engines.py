@@ -0,0 +1,79 @@
+import pandas as pd
+
+from .missing import missing_counts_summary, missing_data_long
+from .perf import stage
+from .sections import declared_inputs
+from .streaming import missing_dimensions
+
+# Sections the query engines (KPIDatabase, KPILazyFrame) compute; the others only run
+# on the pandas frame
+engine_sections = {'Data Quality', 'KPI Analysis'}
+
+value_column = 'AnnualSalesValue_Converted'
+
+
+def timestamp(value):
+    return pd.Timestamp(value).to_pydatetime()
+
+
+# Result of sections.data_quality from the counts of an engine: null count per column
+# and total over the selected contracts, and per dimension the rows of its groups
+# (group, size, null count of every column of columns), largest group first
+def data_quality_result(missing_count, total, kpi_columns, columns, groups):
+    result = {'summary': missing_counts_summary(missing_count, total, kpi_columns), 'matrices': {}, 'group_sizes': {}}
+
+    for group_column, rows in groups.items():
+        index = pd.Index([row[0] for row in rows], name=group_column)
+        sizes = pd.Series([row[1] for row in rows], index=index, dtype='int64', name='count')
+        missing = pd.DataFrame([row[2:] for row in rows], index=index, columns=columns, dtype='int64')
+
+        matrix = (missing.div(sizes, axis=0) * 100).round(2).sort_index().sort_index(axis=1)
+        matrix.index.name = missing_dimensions[group_column]
+        matrix.columns.name = 'Column'
+        result['matrices'][group_column] = matrix
+        result['group_sizes'][group_column] = sizes
+
+    if 'Contract Region' in result['matrices']:
+        result['region_long'] = missing_data_long(result['matrices']['Contract Region'], group_sizes=result['group_sizes']['Contract Region'])
+    return result
+
+
+# Expiry windows like windows.expiry_windows, from (count, value, not followed up)
+# per time frame
+def expiry_result(labels, windows):
+    return pd.DataFrame({
+        'Time Frame': list(labels),
+        'Total Expiring': [int(count) for count, _, _ in windows],
+        'Not Followed Up': [int(not_notified) for _, _, not_notified in windows],
+        'Total Value': [float(value or 0) for _, value, _ in windows],
+    })
+
+
+# Price increase windows like windows.price_increase_windows, from (count, value) per
+# time frame
+def price_increase_result(labels, windows):
+    return pd.DataFrame({
+        'Time Frame': list(labels),
+        'Total Value': [float(value or 0) for _, value in windows],
+        'Count': [int(count) for count, _ in windows],
+    })
+
+
+# Base of the engines computing engine_sections outside pandas. Subclasses set name
+# and types (column -> engine type of the contracts) and implement data_quality and
+# kpi_analysis, shaping their results with the functions above.
+class SectionEngine:
+
+    name = None
+
+    def _has(self, *columns):
+        return all(column in self.types for column in columns)
+
+    # Compute one of engine_sections for the sidebar filters from its declared inputs
+    def compute_section(self, section, filters=None, **inputs):
+        with stage(f'{section} ({self.name})'):
+            if section == 'Data Quality':
+                return self.data_quality(filters, **declared_inputs(section, inputs))
+            if section == 'KPI Analysis':
+                return self.kpi_analysis(filters, **declared_inputs(section, inputs))
+        raise ValueError(f"Section {section!r} is not computed with {self.name}, expected one of {sorted(engine_sections)}")
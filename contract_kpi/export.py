@@ -0,0 +1,60 @@
+import gzip
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows written at a time
+export_chunksize = 100000
+
+# Export formats: file extension and MIME type. Parquet needs pyarrow.
+export_formats = {
+    'CSV': ('csv', 'text/csv'),
+    'CSV (gzip)': ('csv.gz', 'application/gzip'),
+}
+if pq is not None:
+    export_formats['Parquet'] = ('parquet', 'application/vnd.apache.parquet')
+
+
+# Write df as semicolon separated CSV to a binary file-like, chunksize rows at a time
+# so that the text of the whole export is never built in memory
+def write_csv(df, sink, sep=';', chunksize=export_chunksize):
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='', write_through=True)
+    for start in range(0, max(len(df), 1), chunksize):
+        df.iloc[start:start + chunksize].to_csv(text, index=False, sep=sep, header=start == 0)
+    text.flush()
+    text.detach()
+
+
+# Write df as Parquet to a binary file-like, converting and writing chunksize rows at a
+# time so that an Arrow copy of the whole frame is never built. The schema is taken
+# from the whole frame, so that a chunk where a column is all null keeps its type.
+def write_parquet(df, sink, chunksize=export_chunksize):
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for start in range(0, max(len(df), 1), chunksize):
+            chunk = df.iloc[start:start + chunksize]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+# Export df in one of export_formats to an in-memory binary file, rewound and ready to
+# read, as st.download_button accepts it. Meant to be called only when a download is
+# requested.
+def export_contracts(df, export_format='CSV', chunksize=export_chunksize):
+    if export_format not in export_formats:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {list(export_formats)}")
+
+    sink = io.BytesIO()
+    if export_format == 'CSV':
+        write_csv(df, sink, chunksize=chunksize)
+    elif export_format == 'CSV (gzip)':
+        with gzip.GzipFile(fileobj=sink, mode='wb') as compressed:
+            write_csv(df, compressed, chunksize=chunksize)
+    else:
+        write_parquet(df, sink, chunksize)
+
+    sink.seek(0)
+    return sink
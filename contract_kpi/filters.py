@@ -0,0 +1,77 @@
+import numpy as np
+
+# Sidebar filters and the column each one applies to
+filter_columns = {
+    'contract_types': 'Type of Contract',
+    'bus_included': 'BUs included in Contract',
+    'regions': 'Contract Region',
+    'countries': 'Contract Country',
+    'statuses': 'Status',
+}
+
+# KPI columns shown for volume based agreements
+volume_agreement_kpi_columns = [ 'Annual Sales Value',  'Capital Value', 'Capital Value Description', 'Consignment Value', 'Consignment Value Description'
+        , 'Total Procedure Commitments','Quantity Agreed', 'Hip Procedures Commitment', 'Knee Procedures Commitment']
+
+# Distinct values offered by a filter, or an empty list if the column is missing
+def filter_options(df, column):
+    if column not in df.columns:
+        return []
+    return df[column].dropna().unique()
+
+# Row positions of every value of each filter column, built once per dataset
+def build_filter_index(df):
+    index = {}
+    for column in filter_columns.values():
+        if column in df.columns:
+            index[column] = df.groupby(column, observed=True, sort=False).indices
+    return index
+
+# Row positions matching all selections: values are OR-ed within a column and
+# the columns are AND-ed. Returns None when nothing is selected (all rows match).
+def filter_positions(index, selections):
+    positions = None
+    for column, values in selections.items():
+        if not values:
+            continue
+
+        value_positions = index[column]
+        chosen = [value_positions[value] for value in values if value in value_positions]
+        matches = np.unique(np.concatenate(chosen)) if chosen else np.empty(0, dtype=np.intp)
+
+        positions = matches if positions is None else np.intersect1d(positions, matches, assume_unique=True)
+    return positions
+
+# Row positions selected by the sidebar filters, or None when they select every row.
+# An empty selection leaves that column unfiltered; volume_agreement containing 'Yes'
+# keeps only active usage agreements.
+def selected_positions(index, contract_types=None, bus_included=None, regions=None,
+                       countries=None, statuses=None, volume_agreement=None):
+    selections = {
+        filter_columns['contract_types']: contract_types,
+        filter_columns['bus_included']: bus_included,
+        filter_columns['regions']: regions,
+        filter_columns['countries']: countries,
+        filter_columns['statuses']: statuses,
+    }
+    positions = filter_positions(index, selections)
+
+    if volume_agreement and 'Yes' in volume_agreement:
+        try:
+            volume_positions = filter_positions(index, {'Status': ['Active'], 'Type of Contract': ['Usage agreement']})
+            positions = volume_positions if positions is None else np.intersect1d(positions, volume_positions, assume_unique=True)
+        except KeyError:
+            pass
+    return positions
+
+# Apply the sidebar filters (see selected_positions).
+# Pass the index from build_filter_index to reuse it between calls; the
+# selected rows are taken from df once, and df itself is returned unfiltered.
+def apply_filters(df, contract_types=None, bus_included=None, regions=None,
+                  countries=None, statuses=None, volume_agreement=None, index=None):
+    index = build_filter_index(df) if index is None else index
+    positions = selected_positions(index, contract_types, bus_included, regions, countries, statuses, volume_agreement)
+
+    if positions is None:
+        return df
+    return df.take(positions)
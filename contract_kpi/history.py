@@ -0,0 +1,183 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from .cache import cache_dir
+from .cube import ContractCube, cube_currency_column, cube_null_prefix
+from .currency import exchange_rates
+from .export import write_parquet
+from .filters import filter_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Append-only store of past uploads: the parsed contracts of every snapshot and its
+# cube cells (contracts, value sums and null counts per filter combination), as
+# Parquet files partitioned by export date:
+#   contracts/export_date=2024-05-31/<fingerprint>.parquet
+#   kpis/export_date=2024-05-31/<fingerprint>.parquet
+history_dir = cache_dir / 'history'
+
+# Snapshots read at a time when computing trends
+history_batch_size = 50
+
+
+def _snapshot_path(kind, export_date, fingerprint, directory=None):
+    directory = history_dir if directory is None else directory
+    return directory / kind / f'export_date={export_date.isoformat()}' / f'{fingerprint}.parquet'
+
+
+# Date an export was taken: its latest LastModifiedDate, or today when it has none
+def snapshot_export_date(df):
+    if 'LastModifiedDate' in df.columns:
+        modified = pd.to_datetime(df['LastModifiedDate'], errors='coerce', utc=True, format='ISO8601').max()
+        if pd.notna(modified):
+            return modified.date()
+    return datetime.now().date()
+
+
+# Categorical columns as plain values, so that stored cells do not depend on the
+# categories of the upload they came from
+def _plain_table(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema = pa.schema([
+        field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ])
+    return table.cast(schema)
+
+
+# Write to a temporary file first so readers never see a partial snapshot
+def _write_atomic(path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+# Export date an upload (by fingerprint) was stored under, or None when it is not stored
+def stored_export_date(fingerprint, directory=None):
+    directory = history_dir if directory is None else directory
+    stored = sorted((directory / 'kpis').glob(f'export_date=*/{fingerprint}.parquet'))
+    return date.fromisoformat(stored[0].parent.name.removeprefix('export_date=')) if stored else None
+
+
+# Store a parsed upload and its cube cells under its export date. Snapshots are never
+# replaced, and an upload is stored once: an upload already stored, under this or
+# another export date, is left as it is so that the trends do not count it twice.
+# Returns the path of the stored KPI cells, or None without pyarrow.
+def save_snapshot(df, fingerprint, export_date=None, directory=None):
+    if pq is None:
+        return None
+    stored_date = stored_export_date(fingerprint, directory)
+    if stored_date is not None:
+        return _snapshot_path('kpis', stored_date, fingerprint, directory)
+
+    export_date = export_date or snapshot_export_date(df)
+    contracts_path = _snapshot_path('contracts', export_date, fingerprint, directory)
+    kpis_path = _snapshot_path('kpis', export_date, fingerprint, directory)
+
+    _write_atomic(contracts_path, lambda path: write_parquet(df, path))
+    # The cells are written last: a snapshot counts as stored once they exist
+    cells = _plain_table(ContractCube(df).to_frame())
+    _write_atomic(kpis_path, lambda path: pq.write_table(cells, path))
+    return kpis_path
+
+
+# Paths of the stored KPI cells with their export date and snapshot, oldest export first
+def _kpi_files(directory=None):
+    directory = history_dir if directory is None else directory
+    files = [
+        (date.fromisoformat(path.parent.name.removeprefix('export_date=')), path.stem, path)
+        for path in (directory / 'kpis').glob('export_date=*/*.parquet')
+    ]
+    return sorted(files)
+
+
+# Stored snapshots, oldest export first
+def list_snapshots(directory=None):
+    rows = [
+        (export_date, snapshot, datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec='seconds'))
+        for export_date, snapshot, path in _kpi_files(directory)
+    ]
+    return pd.DataFrame(rows, columns=['Export Date', 'Snapshot', 'Stored At'])
+
+
+# Parsed contracts of one stored snapshot
+def read_snapshot(export_date, fingerprint, directory=None):
+    return pd.read_parquet(_snapshot_path('contracts', export_date, fingerprint, directory))
+
+
+# Cells of a batch of snapshots as one cube, read with only the columns the trends
+# need; the Snapshot column holds the position of the snapshot in files
+def _read_cells(files, kpi_columns):
+    wanted = set(filter_columns.values()) | {cube_currency_column, 'Count', 'Value', 'Notified'} | \
+             {cube_null_prefix + col for col in kpi_columns}
+    dimensions = [*filter_columns.values(), cube_currency_column]
+
+    def read(position, path):
+        source = pq.ParquetFile(path, read_dictionary=dimensions)
+        table = source.read(columns=[name for name in source.schema_arrow.names if name in wanted], use_threads=False)
+        return table.append_column('Snapshot', pa.array(np.full(len(table), position, dtype='int32')))
+
+    # Parquet reads release the GIL, so the files of a batch are read in parallel
+    with ThreadPoolExecutor() as pool:
+        tables = list(pool.map(read, range(len(files)), [path for _, _, path in files]))
+
+    # Columns missing from some snapshots are filled with nulls
+    return ContractCube.from_frame(pa.concat_tables(tables, promote_options='permissive').to_pandas())
+
+
+# KPI values per snapshot of a batch of snapshots for one filter selection
+def _batch_kpis(files, filters, kpi_columns, target_currency):
+    selected = _read_cells(files, kpi_columns).slice(**filters)
+    cells = selected.cells
+    snapshot = cells['Snapshot']
+
+    measures = pd.DataFrame({'Total Contracts': cells['Count']})
+    if 'Status' in cells.columns:
+        is_active = (cells['Status'] == 'Active').to_numpy()
+        measures['Active Contracts'] = cells['Count'].where(is_active, 0)
+        if 'Notified' in cells.columns:
+            measures['Contracts Sent Not Activated'] = cells['Notified'].where(~is_active, 0)
+    if 'Value' in cells.columns:
+        rates = cells[cube_currency_column].astype(object).map(exchange_rates).astype('float64')
+        measures[f'Annual Sales Value ({target_currency})'] = cells['Value'] / rates * exchange_rates[target_currency]
+    kpis = measures.groupby(snapshot).sum().reindex(range(len(files)), fill_value=0)
+
+    # Null counts of columns a snapshot did not have stay NaN
+    columns = [col for col in dict.fromkeys(kpi_columns) if col in selected.nulls.columns]
+    missing = selected.nulls[columns].groupby(snapshot).sum(min_count=1).reindex(range(len(files)))
+    total = kpis['Total Contracts'].where(kpis['Total Contracts'] > 0)
+    kpis = kpis.join((missing.div(total, axis=0) * 100).round(2).add_prefix('Missing % '))
+
+    kpis.insert(0, 'Snapshot', [snapshot for _, snapshot, _ in files])
+    kpis.insert(0, 'Export Date', [export_date for export_date, _, _ in files])
+    return kpis
+
+
+# KPI values of every stored snapshot for one filter selection, from the stored cells
+# only: contracts, active and sent but not activated contracts, annual sales value in
+# target_currency and the missing percentage of each of kpi_columns. One row per
+# snapshot, oldest export first. Snapshots are read batch_size at a time with only
+# the columns needed, so memory does not grow with the number of snapshots.
+def kpi_trends(filters=None, kpi_columns=(), target_currency='USD', directory=None, batch_size=None):
+    files = _kpi_files(directory) if pq is not None else []
+    batch_size = batch_size or history_batch_size
+    if not files:
+        return pd.DataFrame(columns=['Export Date', 'Snapshot', 'Total Contracts'])
+
+    batches = [
+        _batch_kpis(files[start:start + batch_size], filters or {}, kpi_columns, target_currency)
+        for start in range(0, len(files), batch_size)
+    ]
+    return pd.concat(batches, ignore_index=True)
@@ -0,0 +1,326 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime
+
+import pandas as pd
+
+from .currency import convert_sales_values
+from .cache import cache_dir, pa, read_cached, write_cached
+from .loading import file_fingerprint, parse_contracts, read_export, to_categoricals
+from .streaming import StreamingKPIs
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# Where the previous uploads and their aggregates are kept between refreshes, one
+# subdirectory per export (see _snapshot_name)
+snapshot_dir = cache_dir / 'snapshot'
+
+# Raw export columns identifying a contract and its last change
+id_column = 'Id'
+modified_column = 'LastModifiedDate'
+
+
+# Uploads are compared with the previous upload of the same name, by default the
+# file name (or path) of the export, so that different exports and the sessions
+# uploading them do not overwrite each other's baseline
+def _snapshot_name(file):
+    if isinstance(file, (list, tuple)):
+        return '|'.join(_snapshot_name(f) for f in file)
+    if isinstance(file, (str, os.PathLike)):
+        return os.path.abspath(file)
+    return getattr(file, 'name', '')
+
+
+def _snapshot_files(name, directory=None):
+    directory = (snapshot_dir if directory is None else directory) / hashlib.sha1(name.encode()).hexdigest()[:16]
+    return directory / 'snapshot.arrow', directory / 'snapshot.json', directory / 'hashes.arrow', directory / 'aggregates'
+
+
+# Hash of every raw row by contract ID, to tell whether contracts without a
+# LastModifiedDate changed
+def _row_hashes(raw):
+    return pd.Series(
+        pd.util.hash_pandas_object(raw, index=False).to_numpy(),
+        index=pd.Index(raw[id_column].astype(str), name='Contract ID')
+    )
+
+
+# Contract IDs that are new, changed (different LastModifiedDate), removed or
+# unchanged in a raw export compared to the previous parsed snapshot. Contracts
+# without a LastModifiedDate in both are compared by the hashes of their raw rows
+# when previous_hashes is given, and count as changed otherwise.
+def diff_exports(previous, raw, previous_hashes=None):
+    def modified_by_id(ids, modified):
+        return pd.Series(
+            pd.to_datetime(modified, errors='coerce', utc=True).to_numpy(),
+            index=pd.Index(ids.astype(str), name='Contract ID')
+        )
+
+    before = modified_by_id(previous['Contract ID'], previous[modified_column])
+    after = modified_by_id(raw[id_column], raw[modified_column])
+
+    in_both = after.index.intersection(before.index)
+    same = before[in_both].eq(after[in_both])
+    if previous_hashes is not None:
+        undated = before[in_both].isna() & after[in_both].isna()
+        hashes = _row_hashes(raw)[in_both].to_numpy()
+        same |= undated & (previous_hashes.reindex(in_both, fill_value=0).to_numpy() == hashes)
+    return {
+        'new': list(after.index.difference(before.index, sort=False)),
+        'changed': list(in_both[~same.to_numpy()]),
+        'removed': list(before.index.difference(after.index, sort=False)),
+        'unchanged': list(in_both[same.to_numpy()]),
+    }
+
+
+def _raw_dtypes(raw):
+    return {column: str(dtype) for column, dtype in raw.dtypes.items()}
+
+
+# Whether a raw export can be diffed against the previous snapshot by contract ID:
+# same columns with the same inferred types, and unique contract IDs
+def _can_diff(previous, raw, meta):
+    return (
+        previous is not None
+        and meta.get('raw_dtypes') == _raw_dtypes(raw)
+        and id_column in raw.columns and modified_column in raw.columns
+        and raw[id_column].notna().all() and raw[id_column].is_unique
+        and previous['Contract ID'].is_unique
+    )
+
+
+# Load an export by re-parsing only the contracts that are new or changed since the
+# previous upload of the same export; unchanged contracts are taken from its snapshot.
+# Returns the full frame, a report of what changed and the parsed rows that left
+# (removed or old version of changed) and entered (new or new version of changed).
+# When the export is the same as last time the rows that left and entered are no
+# longer known and both are None. name picks the previous upload (see _snapshot_name).
+def load_contracts_delta(file, directory=None, name=None):
+    name = _snapshot_name(file) if name is None else name
+    snapshot_path, meta_path, hashes_path, _ = _snapshot_files(name, directory)
+    fingerprint = file_fingerprint(file)
+
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+    previous = read_cached(snapshot_path) if pa is not None and snapshot_path.exists() else None
+
+    # Same export as last time: nothing to parse, report the previous changes again
+    if previous is not None and meta.get('fingerprint') == fingerprint:
+        return previous, meta['changes'], None, None
+
+    raw = read_export(file)
+    raw_dtypes = _raw_dtypes(raw)
+    hashes = _row_hashes(raw) if id_column in raw.columns else None
+
+    if _can_diff(previous, raw, meta):
+        previous_hashes = read_cached(hashes_path).set_index('Contract ID')['Hash'] if hashes_path.exists() else None
+        diff = diff_exports(previous, raw, previous_hashes)
+        previous_ids = previous['Contract ID'].astype(str)
+        raw_ids = raw[id_column].astype(str)
+
+        parsed = parse_contracts(raw[raw_ids.isin(diff['new'] + diff['changed']).to_numpy()].copy())
+        kept = previous[previous_ids.isin(diff['unchanged']).to_numpy()]
+        left = previous[previous_ids.isin(diff['removed'] + diff['changed']).to_numpy()]
+
+        # Put the contracts back in the order of the new export
+        df = pd.concat([kept, parsed])
+        df = df.set_index(df['Contract ID'].astype(str)).loc[raw_ids].reset_index(drop=True)
+        to_categoricals(df)
+
+        changes = {
+            'mode': 'incremental',
+            'snapshot': name,
+            'fingerprint': fingerprint,
+            'previous_fingerprint': meta.get('fingerprint'),
+            'previous_upload': meta.get('uploaded_at'),
+            'new': diff['new'],
+            'changed': diff['changed'],
+            'removed': diff['removed'],
+            'unchanged': len(diff['unchanged']),
+        }
+    else:
+        df = parse_contracts(raw)
+        parsed = df
+        left = previous.iloc[:0] if previous is not None else df.iloc[:0]
+        changes = {
+            'mode': 'full',
+            'snapshot': name,
+            'fingerprint': fingerprint,
+            'previous_fingerprint': meta.get('fingerprint'),
+            'previous_upload': meta.get('uploaded_at'),
+            'new': [],
+            'changed': [],
+            'removed': [],
+            'unchanged': 0,
+        }
+
+    if pa is not None:
+        try:
+            write_cached(df, snapshot_path)
+            if hashes is not None:
+                write_cached(hashes.rename('Hash').reset_index(), hashes_path)
+            else:
+                hashes_path.unlink(missing_ok=True)
+            meta_path.write_text(json.dumps({
+                'fingerprint': fingerprint,
+                'uploaded_at': datetime.now().isoformat(timespec='seconds'),
+                'raw_dtypes': raw_dtypes,
+                'changes': changes,
+            }))
+        except (OSError, pa.ArrowException):
+            # Without a matching snapshot the next upload is parsed in full
+            meta_path.unlink(missing_ok=True)
+    return df, changes, left, parsed
+
+
+# load_contracts_delta without the rows that left and entered
+def load_contracts_incremental(file, directory=None, name=None):
+    df, changes, _, _ = load_contracts_delta(file, directory, name)
+    return df, changes
+
+
+def _same_settings(aggregates, kpi_columns, target_currency, today, n):
+    return aggregates is not None and (
+        (aggregates.kpi_columns, aggregates.target_currency, aggregates.today, aggregates.n)
+        == (list(dict.fromkeys(kpi_columns)), target_currency, today, n)
+    )
+
+
+# Bring stored aggregates up to date with the rows that left and entered the dataset.
+# Aggregates built for other KPI columns, another currency, another day or another n
+# are rebuilt from the full frame instead.
+def update_aggregates(aggregates, df, left, entered, kpi_columns, target_currency='USD', today=None, n=20):
+    today = today or datetime.now().date()
+    if not _same_settings(aggregates, kpi_columns, target_currency, today, n):
+        return StreamingKPIs(kpi_columns, target_currency, today, n).update(df.copy())
+
+    aggregates.merge(StreamingKPIs(kpi_columns, target_currency, today, n).update(left.copy()), sign=-1)
+    aggregates.merge(StreamingKPIs(kpi_columns, target_currency, today, n).update(entered.copy()))
+
+    df = df.copy()
+    df[aggregates.value_column] = convert_sales_values(df, target_currency)
+    return aggregates.refresh_top(df)
+
+
+# Series and DataFrames of StreamingKPIs by attribute and key
+def _aggregate_frames(aggregates):
+    frames = {
+        ('missing_counts', None): aggregates.missing_counts,
+        ('status_counts', None): aggregates.status_counts,
+        ('activations', None): aggregates.activations,
+        ('expiry', None): aggregates.expiry,
+        ('price_increase', None): aggregates.price_increase,
+    }
+    for attribute in ['group_sizes', 'group_missing', 'sales', 'top']:
+        for key, frame in getattr(aggregates, attribute).items():
+            frames[attribute, key] = frame
+    return frames
+
+
+# Store aggregates as plain data: one Parquet file per Series or DataFrame, listed in
+# a JSON file with the settings, the counters and the fingerprint they were built for.
+# The JSON file is written last, so a partly written directory is never read.
+def _write_aggregates(aggregates, fingerprint, directory):
+    manifest_path = directory / 'aggregates.json'
+    manifest_path.unlink(missing_ok=True)
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.glob('*.parquet'):
+        path.unlink()
+
+    frames = []
+    for number, ((attribute, key), frame) in enumerate(_aggregate_frames(aggregates).items()):
+        if frame is None:
+            continue
+        name = frame.name if isinstance(frame, pd.Series) else None
+        table = frame.to_frame('value') if isinstance(frame, pd.Series) else frame.copy()
+        if attribute == 'activations':
+            table.index = table.index.astype(str)
+        pq.write_table(pa.Table.from_pandas(table), directory / f'{number}.parquet')
+        frames.append({
+            'attribute': attribute,
+            'key': key,
+            'file': f'{number}.parquet',
+            'series': isinstance(frame, pd.Series),
+            'name': name,
+        })
+
+    manifest_path.write_text(json.dumps({
+        'fingerprint': fingerprint,
+        'kpi_columns': aggregates.kpi_columns,
+        'target_currency': aggregates.target_currency,
+        'today': aggregates.today.isoformat(),
+        'n': aggregates.n,
+        'value_column': aggregates.value_column,
+        'columns': aggregates.columns,
+        'date_columns': sorted(aggregates.date_columns),
+        'total': aggregates.total,
+        'active': aggregates.active,
+        'sent_not_activated': aggregates.sent_not_activated,
+        'frames': frames,
+    }))
+
+
+# Aggregates stored by _write_aggregates and the fingerprint they were built for
+def _read_aggregates(directory):
+    manifest_path = directory / 'aggregates.json'
+    if pq is None or not manifest_path.exists():
+        return None, None
+
+    stored = json.loads(manifest_path.read_text())
+    aggregates = StreamingKPIs(
+        stored['kpi_columns'], stored['target_currency'], date.fromisoformat(stored['today']),
+        stored['n'], stored['value_column']
+    )
+    aggregates.columns = stored['columns']
+    aggregates.date_columns = set(stored['date_columns'])
+    aggregates.total = stored['total']
+    aggregates.active = stored['active']
+    aggregates.sent_not_activated = stored['sent_not_activated']
+
+    for entry in stored['frames']:
+        frame = pq.read_table(directory / entry['file']).to_pandas()
+        if entry['series']:
+            frame = frame['value'].rename(entry['name'])
+        if entry['attribute'] == 'activations':
+            frame.index = pd.PeriodIndex(frame.index, freq='M')
+        if entry['key'] is None:
+            setattr(aggregates, entry['attribute'], frame)
+        else:
+            getattr(aggregates, entry['attribute'])[entry['key']] = frame
+    return stored['fingerprint'], aggregates
+
+
+# KPI aggregates of a frame returned by load_contracts_delta, brought up to date
+# from the rows that left and entered when the stored aggregates were built for the
+# previous upload, and rebuilt from the full frame otherwise
+def refresh_aggregates(df, changes, left, entered, kpi_columns, target_currency='USD',
+                       directory=None, today=None, n=20):
+    today = today or datetime.now().date()
+    aggregates_dir = _snapshot_files(changes['snapshot'], directory)[3]
+    fingerprint, aggregates = _read_aggregates(aggregates_dir)
+
+    if fingerprint == changes['fingerprint'] and _same_settings(aggregates, kpi_columns, target_currency, today, n):
+        return aggregates
+    if (left is None or changes['mode'] != 'incremental'
+            or fingerprint != changes.get('previous_fingerprint')):
+        aggregates = None
+
+    aggregates = update_aggregates(aggregates, df, left, entered, kpi_columns, target_currency, today, n)
+    if pq is not None:
+        try:
+            _write_aggregates(aggregates, changes['fingerprint'], aggregates_dir)
+        except (OSError, pa.ArrowException):
+            # The next refresh rebuilds the aggregates from the full frame
+            (aggregates_dir / 'aggregates.json').unlink(missing_ok=True)
+    return aggregates
+
+
+# Incremental refresh for scheduled jobs: delta load of the export plus the stored
+# KPI aggregates updated from the changed rows only
+def incremental_refresh(file, kpi_columns, target_currency='USD', directory=None, today=None, n=20, name=None):
+    df, changes, left, entered = load_contracts_delta(file, directory, name)
+    aggregates = refresh_aggregates(df, changes, left, entered, kpi_columns, target_currency, directory, today, n)
+    return df, changes, aggregates
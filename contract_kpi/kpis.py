@@ -0,0 +1,33 @@
+# Mask of contracts with status Active
+def active_mask(df):
+    return (df['Status'] == 'Active').to_numpy()
+
+# Mask of contracts with a notification date that are not active
+def sent_not_activated_mask(df):
+    return ((df['Notification Date'].notna()) & (df['Status'] != 'Active')).to_numpy()
+
+# Contracts with status Active
+def active_contracts(df):
+    return df[active_mask(df)]
+
+# Contracts with a notification date that are not active
+def sent_not_activated(df):
+    return df[sent_not_activated_mask(df)]
+
+# Share of part in total as a percentage rounded to two decimals
+def percentage(part, total):
+    return round((part / total) * 100, 2) if total > 0 else 0
+
+# Number of contracts activated per month
+def activations_per_month(df):
+    contracts_with_activation = df.dropna(subset=['Activated Date'])
+    activation_month = contracts_with_activation['Activated Date'].dt.to_period('M').rename('ActivationMonth')
+
+    activations = contracts_with_activation.groupby(activation_month).size().reset_index(name='Count')
+    activations['ActivationMonth'] = activations['ActivationMonth'].astype(str)
+    return activations
+
+# Total annual sales value per value of column, largest first
+def sales_by(df, column, value_column='AnnualSalesValue_Converted'):
+    sales = df.groupby(column, observed=True)[value_column].sum().reset_index()
+    return sales.sort_values(value_column, ascending=False)
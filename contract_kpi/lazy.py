@@ -0,0 +1,280 @@
+import io
+import os
+
+import pandas as pd
+
+from .currency import exchange_rates
+from .engines import (
+    SectionEngine, data_quality_result, engine_sections, expiry_result, price_increase_result,
+    timestamp, value_column,
+)
+from .filters import filter_columns
+from .mapping import api_key_to_field_mapping
+from .schema import column_types, date_formats, date_time_suffix, money_columns
+from .streaming import missing_dimensions
+from .topn import row_column
+from .windows import window_bounds
+
+# Polars, imported by _import_polars when a frame is first scanned or built, so that
+# importing contract_kpi does not load it when the pandas engine is used
+pl = None
+
+
+def _import_polars():
+    global pl
+    if pl is None:
+        import polars
+        pl = polars
+
+# Sections KPILazyFrame computes with Polars; the others only run on the pandas frame
+lazy_sections = engine_sections
+
+# Values read as missing, the same ones the pyarrow and pandas CSV readers use
+csv_null_values = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                   '1.#QNAN', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null']
+
+
+# Dates of a text column in the first of date_formats that matches, like loading.read_export
+def _parse_dates(column):
+    text = pl.col(column).str.replace(date_time_suffix, '${1}')
+    return pl.coalesce([
+        text.str.strptime(pl.Datetime('us'), date_format, strict=False) for date_format in date_formats
+    ]).alias(column)
+
+
+# <prefix>_Numeric and <prefix>_Currency of a money column, like loading.parse_money_column
+def _parse_money(column, prefix):
+    text = pl.col(column).cast(pl.String)
+    digits = text.str.replace_all(r'[^0-9.]', '')
+    numeric = pl.when(digits != '').then(digits).cast(pl.Float64, strict=False)
+
+    # Unparseable amounts fall back to USD like empty ones
+    unparseable = (digits != '') & numeric.is_null()
+    currency = pl.when(unparseable).then(None).otherwise(text.str.extract(r'([A-Z]{3})', 1)).fill_null('USD')
+    return [numeric.alias(f'{prefix}_Numeric'), currency.alias(f'{prefix}_Currency')]
+
+
+# Lazy scan of one export with the declared schema (see schema.column_types), renamed
+# to display names, with dates and money columns parsed
+def _scan_export(file):
+    source = file if isinstance(file, (str, os.PathLike)) else io.BytesIO(file.getvalue())
+    polars_types = {'text': pl.String, 'money': pl.String, 'category': pl.String,
+                    'number': pl.Float64, 'date': pl.String}
+    types = column_types()
+
+    frame = pl.scan_csv(
+        source,
+        schema_overrides={column: polars_types[kind] for column, kind in types.items()},
+        null_values=csv_null_values,
+        infer_schema_length=None,
+    ).rename(api_key_to_field_mapping, strict=False)
+
+    names = frame.collect_schema().names()
+    return frame.with_columns(
+        *[_parse_dates(column) for column in names if types.get(column) == 'date'],
+        *[expr for column, prefix in money_columns.items() if column in names for expr in _parse_money(column, prefix)],
+    )
+
+
+# Forms of LastModifiedDate, tried in order
+_modified_formats = ['%Y-%m-%dT%H:%M:%S%.f%#z', '%Y-%m-%dT%H:%M%#z', '%Y-%m-%dT%H:%M:%S%.f', '%Y-%m-%dT%H:%M', '%Y-%m-%d']
+
+
+# Keep one row per Contract ID like loading.deduplicate_contracts
+def _deduplicate(frame):
+    names = frame.collect_schema().names()
+    if 'Contract ID' not in names:
+        return frame
+
+    frame = frame.with_row_index(row_column)
+    if 'LastModifiedDate' in names:
+        # Exports mix date-only and ISO timestamps with or without an offset, so every
+        # form is tried, as pandas does with format='ISO8601'
+        modified = pl.col('LastModifiedDate').cast(pl.String).str.replace(' ', 'T')
+        modified = pl.coalesce(modified.str.to_datetime(form, strict=False, time_zone='UTC') for form in _modified_formats)
+        frame = frame.sort(modified, nulls_last=False, maintain_order=True)
+
+    ids = pl.col('Contract ID')
+    latest = frame.filter(ids.is_not_null()).unique('Contract ID', keep='last', maintain_order=True)
+    return pl.concat([latest, frame.filter(ids.is_null())]).sort(row_column).drop(row_column)
+
+
+# Lazy frame of a contract export (path or uploaded file, or a list of them) with the
+# columns and values of load_contracts: display names, parsed dates and the money
+# columns split into <prefix>_Numeric and <prefix>_Currency. Nothing is read until it
+# is collected. With columns (display names, parsed money columns included), the
+# frame has only those of them the export has, in that order.
+def scan_contracts(file, columns=None):
+    _import_polars()
+    if isinstance(file, (list, tuple)):
+        frame = _deduplicate(pl.concat([_scan_export(f) for f in file], how='diagonal_relaxed'))
+    else:
+        frame = _scan_export(file)
+
+    if columns is not None:
+        names = frame.collect_schema().names()
+        frame = frame.select([column for column in dict.fromkeys(columns) if column in names])
+    return frame
+
+
+# The KPIs of the dashboard sections as Polars lazy queries over the contracts. The
+# contracts are held in memory as a Polars frame, read once when the object is built;
+# the filters, conversion and aggregates of a section are composed as lazy queries
+# over it and collected together, so the work is spread over all cores. Results are
+# pandas frames with the same shape and values as sections.data_quality and
+# sections.kpi_analysis on the filtered frame.
+class KPILazyFrame(SectionEngine):
+
+    name = 'Polars'
+
+    # frame: the contracts as a pandas DataFrame of loaded contracts, or a Polars
+    # LazyFrame, e.g. from scan_contracts, which is collected here
+    def __init__(self, frame):
+        _import_polars()
+        if isinstance(frame, pd.DataFrame):
+            frame = pl.from_pandas(frame)
+        elif isinstance(frame, pl.LazyFrame):
+            frame = frame.collect()
+        self.frame = frame.with_row_index(row_column)
+        self.types = {name: dtype for name, dtype in self.frame.schema.items() if name != row_column}
+        # Columns of the selected contracts, the converted value included
+        self.columns = [name for name in self._selected(None).collect_schema().names() if name != row_column]
+
+    # Queries over an export scanned and parsed from file, see scan_contracts
+    @classmethod
+    def scan(cls, file, columns=None):
+        return cls(scan_contracts(file, columns))
+
+    def _has_dates(self, column):
+        return column in self.types and self.types[column] in (pl.Datetime, pl.Date)
+
+    # Contracts selected by the sidebar filters, with the semantics of filters.selected_positions
+    def _where(self, filters):
+        filters = filters or {}
+        condition = pl.lit(True)
+        for name, column in filter_columns.items():
+            values = filters.get(name)
+            if values and column in self.types:
+                condition &= pl.col(column).cast(pl.String).is_in([str(value) for value in values])
+
+        volume_agreement = filters.get('volume_agreement')
+        if volume_agreement and 'Yes' in volume_agreement and self._has('Status', 'Type of Contract'):
+            condition &= (pl.col('Status') == 'Active') & (pl.col('Type of Contract') == 'Usage agreement')
+        return condition
+
+    # Selected contracts with their annual sales value in target_currency, converted
+    # like currency.convert_sales_values
+    def _selected(self, filters, target_currency='USD'):
+        selected = self.frame.lazy().filter(self._where(filters))
+        if not self._has('AnnualSalesValue_Numeric', 'AnnualSalesValue_Currency'):
+            return selected
+
+        rate = pl.col('AnnualSalesValue_Currency').cast(pl.String).replace_strict(
+            exchange_rates, default=None, return_dtype=pl.Float64)
+        return selected.with_columns((pl.col('AnnualSalesValue_Numeric') / rate * exchange_rates[target_currency]).alias(value_column))
+
+    # Top n selected contracts by value matching condition, largest first, ties in row order
+    def _top_n(self, selected, n, condition=True):
+        return (selected.filter(pl.col(value_column).is_not_null() & condition)
+                .sort([value_column, row_column], descending=[True, False]).head(n).drop(row_column))
+
+    # Per time frame of window_bounds: contracts with column in the frame, their value
+    # and, with extra, the number matching the extra condition
+    def _windows(self, selected, column, today, extra=None):
+        bounds = window_bounds(today)
+        aggregates = []
+        for i, (start, end) in enumerate(bounds.values()):
+            in_window = (pl.col(column) >= timestamp(start)) & (pl.col(column) < timestamp(end))
+            aggregates.append(in_window.sum().alias(f'count {i}'))
+            aggregates.append(pl.col(value_column).filter(in_window).sum().alias(f'value {i}'))
+            if extra is not None:
+                aggregates.append((in_window & extra).sum().alias(f'extra {i}'))
+        return selected.select(aggregates), bounds
+
+    # Collect the lazy queries of a dict together, as one plan with the shared filter
+    # evaluated once
+    def _collect(self, queries):
+        return dict(zip(queries, pl.collect_all(list(queries.values()))))
+
+    # Like sections.kpi_analysis on the filtered frame
+    def kpi_analysis(self, filters, target_currency, n, today):
+        selected = self._selected(filters, target_currency)
+        is_active = pl.col('Status') == 'Active'
+        is_sent_not_activated = pl.col('Notification Date').is_not_null() & is_active.not_().fill_null(True)
+
+        counts = [pl.len().alias('total')]
+        queries = {'top': self._top_n(selected, n)}
+        if self._has('Status'):
+            counts.append(is_active.sum().alias('active'))
+            queries['top_active'] = self._top_n(selected, n, is_active)
+            if self._has('Notification Date'):
+                counts.append(is_sent_not_activated.sum().alias('sent_not_activated'))
+                queries['top_sent_not_activated'] = self._top_n(selected, n, is_sent_not_activated)
+        queries['counts'] = selected.select(counts)
+
+        if self._has_dates('Activated Date'):
+            queries['activations'] = (
+                selected.filter(pl.col('Activated Date').is_not_null())
+                .group_by(pl.col('Activated Date').dt.strftime('%Y-%m').alias('ActivationMonth'))
+                .agg(pl.len().cast(pl.Int64).alias('Count'))
+                .sort('ActivationMonth')
+            )
+
+        windows = {}
+        if self._has_dates('Contract End Date') and self._has('Notification Date'):
+            queries['expiry'], windows['expiry'] = self._windows(
+                selected, 'Contract End Date', today, extra=pl.col('Notification Date').is_null())
+            start, end = windows['expiry']['This Year']
+            queries['top_expiring'] = self._top_n(
+                selected, n, (pl.col('Contract End Date') >= timestamp(start)) & (pl.col('Contract End Date') < timestamp(end)))
+
+        if self._has_dates('Price Increase Opportunity Date'):
+            queries['price_increase'], windows['price_increase'] = self._windows(selected, 'Price Increase Opportunity Date', today)
+            start, end = windows['price_increase']['This Year']
+            column = pl.col('Price Increase Opportunity Date')
+            queries['top_price_increase'] = self._top_n(selected, n, (column >= timestamp(start)) & (column < timestamp(end)))
+
+        for column in ['Contract Region', 'Type of Contract']:
+            if self._has(column):
+                queries[f'sales by {column}'] = (
+                    selected.filter(pl.col(column).is_not_null())
+                    .group_by(column).agg(pl.col(value_column).sum())
+                    .sort(value_column, descending=True)
+                )
+
+        frames = self._collect(queries)
+        counts = frames.pop('counts').row(0, named=True)
+        result = {'target_currency': target_currency, **{key: int(value) for key, value in counts.items()}}
+        for key, frame in frames.items():
+            if key not in windows:
+                result[key] = frame.to_pandas()
+
+        # Window aggregates come as one row: count, value (and extra) per time frame
+        if 'expiry' in windows:
+            values = frames['expiry'].row(0)
+            result['expiry'] = expiry_result(windows['expiry'], [values[i:i + 3] for i in range(0, len(values), 3)])
+        if 'price_increase' in windows:
+            values = frames['price_increase'].row(0)
+            result['price_increase'] = price_increase_result(windows['price_increase'], [values[i:i + 2] for i in range(0, len(values), 2)])
+        return result
+
+    # Like sections.data_quality on the filtered frame
+    def data_quality(self, filters, kpi_columns):
+        selected = self._selected(filters)
+        columns = [column for column in dict.fromkeys(kpi_columns) if column in self.types]
+        groups = [column for column in missing_dimensions if column in self.types]
+
+        queries = {'nulls': selected.select(pl.len().alias(row_column), *[pl.col(column).null_count() for column in self.columns])}
+        for group_column in groups:
+            queries[group_column] = (
+                selected.filter(pl.col(group_column).is_not_null())
+                .group_by(pl.col(group_column).cast(pl.String))
+                .agg(pl.len().alias(row_column), *[pl.col(column).null_count() for column in columns])
+                .sort([row_column, group_column], descending=[True, False])
+            )
+        frames = self._collect(queries)
+
+        nulls = frames['nulls'].row(0)
+        missing_count = pd.Series(nulls[1:], index=self.columns, dtype='int64')
+        return data_quality_result(missing_count, nulls[0], kpi_columns, columns,
+                                   {group_column: frames[group_column].rows() for group_column in groups})
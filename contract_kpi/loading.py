@@ -0,0 +1,267 @@
+import csv
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from .mapping import api_key_to_field_mapping, rename_columns
+from .perf import stage
+from .schema import categorical_columns, column_types, date_columns, date_formats, date_time_suffix, money_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = pc = pa_csv = None
+
+# A column is converted only when its distinct values are at most this share of its rows
+categorical_max_unique_ratio = 0.5
+
+# Columns load_columns reads besides the requested ones, so that several exports are
+# deduplicated into the same rows as by load_contracts
+row_key_columns = ['Contract ID', 'LastModifiedDate']
+
+# Content hash of an uploaded file (or a path, or a list of them), used as cache key for derived data
+def file_fingerprint(file):
+    if isinstance(file, (list, tuple)):
+        return hashlib.sha1(''.join(file_fingerprint(f) for f in file).encode()).hexdigest()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    return hashlib.sha1(file.getvalue()).hexdigest()
+
+# Header of an export as written in the file
+def _raw_header(file):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, newline='', encoding='utf-8-sig') as f:
+            return next(csv.reader(f), [])
+    text = io.TextIOWrapper(io.BytesIO(file.getvalue()), encoding='utf-8-sig', newline='')
+    return next(csv.reader(text), [])
+
+# Display names of the columns of an export (or of a list of them, in first-seen order),
+# read from the header only
+def export_columns(file):
+    if isinstance(file, (list, tuple)):
+        return list(dict.fromkeys(col for f in file for col in export_columns(f)))
+    return [api_key_to_field_mapping.get(col, col) for col in _raw_header(file)]
+
+# Function to clean currency strings and extract numeric values for a whole column
+def parse_money_column(values):
+    # Numbers already typed by read_csv have no currency attached
+    if pd.api.types.is_numeric_dtype(values):
+        numeric = values.astype('float64')
+        currency = pd.Series('USD', index=values.index)
+        return numeric, currency
+
+    text = values.astype('string')
+
+    # Extract currency code, defaulting to USD
+    currency = text.str.extract(r'([A-Z]{3})', expand=False)
+
+    # Extract numeric value, removing commas and other non-numeric characters
+    numeric_str = text.str.replace(r'[^0-9.]', '', regex=True)
+    numeric = pd.to_numeric(numeric_str.mask(numeric_str == ''), errors='coerce').astype('float64')
+
+    # Unparseable amounts fall back to USD like empty ones
+    currency = currency.mask(numeric_str.notna() & (numeric_str != '') & numeric.isna())
+    currency = currency.fillna('USD')
+    return numeric, currency
+
+# Parse every money column into <prefix>_Numeric and <prefix>_Currency in one pass each
+def parse_money_columns(df, columns=None):
+    columns = money_columns if columns is None else columns
+    for col, prefix in columns.items():
+        if col in df.columns:
+            numeric, currency = parse_money_column(df[col])
+            df[f'{prefix}_Numeric'] = numeric
+            df[f'{prefix}_Currency'] = currency
+    return df
+
+# Dates of a text Series in the first of date_formats that matches, null when none
+# does, like _parse_date_array
+def _parse_date_series(values):
+    text = values.astype('string').str.replace(date_time_suffix, r'\1', regex=True)
+    dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[us]')
+    for date_format in date_formats:
+        # Only the values no earlier format matched
+        todo = dates.isna() & text.notna()
+        if not todo.any():
+            break
+        dates[todo] = pd.to_datetime(text[todo], format=date_format, errors='coerce')
+    return dates
+
+# Parse the date columns of a raw export frame in place, under their API or display
+# name; columns already read as dates are left as they are
+def parse_dates(df):
+    for api in date_columns:
+        for col in [api, api_key_to_field_mapping.get(api)]:
+            if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = _parse_date_series(df[col])
+    return df
+
+# Dates of a text column in the first of date_formats that matches, null when none does
+def _parse_date_array(values):
+    text = pc.replace_substring_regex(values, pattern=date_time_suffix, replacement=r'\1')
+    return pc.coalesce(*[pc.strptime(text, format=date_format, unit='us', error_is_null=True)
+                         for date_format in date_formats])
+
+# Read a raw export with the multithreaded pyarrow CSV reader and the declared
+# schema (see column_types): text, money and category columns as strings, numbers as
+# floats and dates parsed during the read. Undeclared columns are inferred like
+# pd.read_csv does. Falls back to pd.read_csv and parse_dates without pyarrow or when
+# the file does not fit the schema. With columns (API or display names), only those
+# columns are read.
+def read_export(file, columns=None):
+    if columns is None:
+        usecols = None
+    else:
+        wanted = set(columns)
+        usecols = [col for col in _raw_header(file) if col in wanted or api_key_to_field_mapping.get(col) in wanted]
+
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    if pa_csv is None:
+        return parse_dates(pd.read_csv(file, usecols=usecols))
+
+    if isinstance(file, (str, os.PathLike)):
+        source = file
+    else:
+        source = pa.BufferReader(file.getvalue() if hasattr(file, 'getvalue') else file.read())
+
+    arrow_types = {'text': pa.string(), 'money': pa.string(), 'category': pa.string(),
+                   'number': pa.float64(), 'date': pa.string()}
+    types = column_types()
+    try:
+        table = pa_csv.read_csv(source, convert_options=pa_csv.ConvertOptions(
+            column_types={column: arrow_types[kind] for column, kind in types.items()},
+            include_columns=usecols,
+            strings_can_be_null=True,
+        ))
+    except pa.ArrowInvalid:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        return parse_dates(pd.read_csv(file, usecols=usecols))
+
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if types.get(field.name) == 'date':
+            column = _parse_date_array(column)
+        elif pa.types.is_date(field.type) or pa.types.is_timestamp(field.type):
+            # Undeclared dates stay text, as pd.read_csv leaves them
+            column = column.cast(pa.string())
+        elif pa.types.is_null(field.type):
+            # Empty columns are float NaN, as pd.read_csv reads them
+            column = column.cast(pa.float64())
+        else:
+            continue
+        table = table.set_column(i, field.name, column)
+    return table.to_pandas()
+
+# Convert low-cardinality string columns to pandas categoricals in place
+def to_categoricals(df, columns=None, max_unique_ratio=None):
+    columns = categorical_columns if columns is None else columns
+    max_unique_ratio = categorical_max_unique_ratio if max_unique_ratio is None else max_unique_ratio
+
+    for col in columns:
+        if col not in df.columns or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if df[col].nunique() <= max_unique_ratio * len(df):
+            df[col] = df[col].astype('category')
+    return df
+
+# Bytes per column as plain Python strings ("before") and in the current representation ("after")
+def memory_report(df):
+    after = df.memory_usage(deep=True, index=False)
+    before = after.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            before[col] = df[col].astype(object).memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        'Column': df.columns,
+        'Dtype': df.dtypes.astype(str).values,
+        'Bytes Before': before.values,
+        'Bytes After': after.values,
+    })
+    report['Reduction'] = (report['Bytes Before'] / report['Bytes After'].where(report['Bytes After'] > 0)).round(1)
+    return report.sort_values('Bytes Before', ascending=False, ignore_index=True)
+
+# Read a contract export (path or file-like) into a typed frame with display column names,
+# optionally only the given columns (display names, e.g. core_columns).
+# A list of exports is parsed in parallel and combined, see load_contracts_many.
+def load_contracts(file, columns=None):
+    if isinstance(file, (list, tuple)):
+        return load_contracts_many(file, columns=columns)
+    with stage('CSV read') as record:
+        df = read_export(file, columns)
+        record['rows'] = len(df)
+    return parse_contracts(df)
+
+# Read more columns (display names) of an export loaded before with other columns: a
+# frame with the rows, in the same order and index, of load_contracts on the same file(s)
+def load_columns(file, columns):
+    df = load_contracts(file, columns=[*columns, *row_key_columns])
+    return df.drop(columns=[col for col in row_key_columns if col not in columns and col in df.columns])
+
+# Worker for load_contracts_many: paths are read by the worker itself, uploaded
+# files from their bytes, so that workers do not share a file position
+def _load_source(source, columns=None):
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return load_contracts(source, columns)
+
+# Keep one row per Contract ID: the most recently modified one when the export has
+# LastModifiedDate, otherwise the one from the last file. Rows without an ID are kept.
+def deduplicate_contracts(df):
+    if 'Contract ID' not in df.columns:
+        return df
+
+    order = df.index
+    if 'LastModifiedDate' in df.columns:
+        modified = pd.to_datetime(df['LastModifiedDate'], errors='coerce', utc=True, format='ISO8601')
+        order = modified.sort_values(kind='stable', na_position='first').index
+
+    ids = df.loc[order, 'Contract ID']
+    keep = ~ids.duplicated(keep='last') | ids.isna()
+    return df.loc[order[keep.to_numpy()].sort_values()].reset_index(drop=True)
+
+# Parse several exports (e.g. one per region), each in its own worker thread, then
+# concatenate them and drop duplicate contracts. Threads rather than processes: the
+# pyarrow CSV reader releases the GIL, the frames need no pickling, and forking the
+# Streamlit server, which runs threads of its own, can deadlock.
+def load_contracts_many(files, max_workers=None, columns=None):
+    sources = [f if isinstance(f, (str, os.PathLike)) else f.getvalue() for f in files]
+    max_workers = min(len(sources), max_workers or os.cpu_count() or 1)
+    load_source = partial(_load_source, columns=columns)
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            frames = list(pool.map(load_source, sources))
+    else:
+        frames = [load_source(source) for source in sources]
+
+    # Categories differ between files, so the combined columns are converted again
+    df = deduplicate_contracts(pd.concat(frames, ignore_index=True))
+    return to_categoricals(df)
+
+# Type a raw export frame in place: dates, display column names, money columns and categoricals
+def parse_contracts(df):
+    # Convert date columns to datetime
+    with stage('Date parsing', rows=len(df)):
+        parse_dates(df)
+
+    # Rename the columns in the DataFrame
+    rename_columns(df, api_key_to_field_mapping)
+
+    # Process the money columns to extract numeric values and currency
+    with stage('Money parsing', rows=len(df)):
+        parse_money_columns(df)
+
+    # Store low-cardinality columns as categoricals
+    with stage('Categoricals', rows=len(df)):
+        to_categoricals(df)
+    return df
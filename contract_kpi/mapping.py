@@ -0,0 +1,91 @@
+api_key_to_field_mapping = {
+"Id": "Contract ID",
+"AccountId": "Account Name",
+"Sold_To_Account_ID__c": "Sold To Account ID",
+"BUs_included_in_Contract_copy__c": "BUs included in Contract copy",
+"Buying_Group__c": "Buying Group",
+"Sold_To_Id__c": "Sold To Id",
+"ContractNumber": "Contract Number",
+"Name": "Contract Name",
+"EMEA_Type_of_contract__c": "Type of Contract",
+"MainBU__c": "MainBU",
+"AdditionalBu__c": "AdditionalBu",
+"BUSinglePicklistValue__c": "BUSinglePicklistValue",
+"BUs_included_in_Contract__c": "BUs included in Contract",
+"Sub_BUs__c": "Sub BUs",
+"ContractRegion__c": "Contract Region",
+"ContractCountry__c": "Contract Country",
+"Old_contract_number__c": "Old contract number",
+"SAP_Deal_Number__c": "SAP Deal Number",
+"Parent_contract__c": "Parent Contract",
+"Contract_Description__c": "Contract Description",
+"Document_Link__c": "Document Link",
+"Billing_City__c": "Billing City",
+"EMEA_Bonus_contract__c": "Bonus Contract",
+"Band__c": "Band",
+"EMEA_Condition_type__c": "Condition Type",
+"Price_Conditions__c": "Price Conditions",
+"Terms_of_Payment__c": "Terms of Payment",
+"CustomerSignedDate": "Customer Signed Date",
+"Status": "Status",
+"Canceled_Date__c": "Canceled Date",
+"EMEA_Notification_Date__c": "Notification Date",
+"StartDate": "Contract Start Date",
+"Contract_End_Date__c": "Contract End Date",
+"Contract_Original_End_Date__c": "Contract Original End Date",
+"Automatic_extension__c": "Automatic Extension",
+"Zeitpunkt_der_Erinnerung__c": "Internal Notice Period",
+"Erinnerung_senden_an__c": "Person in Charge",
+"CustomerSignedId": "Customer Signed By",
+"Price_Increase_Opportunity_Date__c": "Price Increase Opportunity Date",
+"Price_Regulations_Notes__c": "Price Regulations Notes",
+"Notice_Period__c": "Notice Period",
+"EMEA_Bonus_type__c": "Bonus Type",
+"EMEA_Expected_Sales__c": "Expected Sales",
+"ExpectedPayoutPercentage__c": "Expected Payout Percentage",
+"EMEA_Payout_period__c": "Payout Period",
+"EMEA_Bonus_beneficiary__c": "Bonus Beneficiary",
+"EMEA_Bonus_conditions__c": "Bonus Description",
+"EMEA_Booking_Type__c": "Booking Type",
+"Rebate_Conditions__c": "Rebate Conditions",
+"SpecificServiceLevels__c": "Specific Service Levels",
+"CapitalValue__c": "Capital Value",
+"CapitalValueDescription__c": "Capital Value Description",
+"ConsignmentValue__c": "Consignment Value",
+"ConsignmentValueDescription__c": "Consignment Value Description",
+"AnnualSalesValue__c": "Annual Sales Value",
+"MarketShare__c": "Market Share %",
+"TotalProcedureCommitments__c": "Total Procedure Commitments",
+"QuantityAgreed__c": "Quantity Agreed",
+"HipProceduresCommitment__c": "Hip Procedures Commitment",
+"KneeProceduresCommitment__c": "Knee Procedures Commitment",
+"Kits__c": "Kits",
+"Canister__c": "Canister",
+"EMEA_Volume_annually__c": "Volume annually",
+"Inkludierte_Gerte__c": "Inkludierte Geräte",
+"Ambulante_Erstattung__c": "Ambulante Erstattung",
+"Therapy_days__c": "Therapy days",
+"Costs_per_Therapy_day__c": "Costs per Therapy day",
+"Flat_rate_month__c": "Flat rate (month)",
+"More_included_items__c": "More included items",
+# System Information
+"ActivatedById": "Activated By",
+"CreatedById": "Created By",
+"CurrencyIsoCode": "Contract Currency",
+"ActivatedDate": "Activated Date",
+"LastModifiedById": "Last Modified By",
+"OwnerId": "Contract Owner"
+
+}
+
+def rename_columns(df, mapping):
+# Create a new dictionary for renaming columns
+    rename_dict = {col: mapping.get(col, col) for col in df.columns}
+
+# Rename the columns using the dictionary
+    df.rename(columns=rename_dict, inplace=True)
+
+def rename_kpi_columns(kpi_columns, mapping):
+# Rename the KPI columns using the mapping
+    renamed_kpi_columns = [mapping.get(col, col) for col in kpi_columns]
+    return renamed_kpi_columns
@@ -0,0 +1,127 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Default bounds of a MemoCache: number of entries and approximate memory
+memo_max_entries = 128
+memo_max_bytes = 512 * 1024 ** 2
+
+
+# Approximate memory held by a cached value, looking into dicts, lists and tuples
+def value_nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(value_nbytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(value_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# Hashable form of a selection: lists become sorted tuples without duplicates, so the
+# same choices made in another order give the same key
+def _normalize(value):
+    if isinstance(value, (list, tuple, set, np.ndarray, pd.Index)):
+        return tuple(sorted(dict.fromkeys(value), key=str))
+    return value
+
+
+# Normalized filter state: empty selections are dropped (they filter nothing) and
+# volume_agreement only counts as whether 'Yes' is selected
+def normalize_filters(filters):
+    normalized = []
+    for name, values in filters.items():
+        if name == 'volume_agreement':
+            values = bool(values) and 'Yes' in values
+            if values:
+                normalized.append((name, values))
+        elif values is not None and len(values) > 0:
+            normalized.append((name, _normalize(values)))
+    return tuple(sorted(normalized))
+
+
+# Normalized section inputs (see section_inputs)
+def normalize_inputs(inputs):
+    return tuple(sorted((name, _normalize(value)) for name, value in inputs.items()))
+
+
+# Cache key of something derived from a dataset under a filter state and inputs
+def memo_key(fingerprint, name, filters=None, inputs=None):
+    return (fingerprint, name, normalize_filters(filters or {}), normalize_inputs(inputs or {}))
+
+
+# Least recently used cache of filtered row positions and derived aggregates, bounded
+# by its number of entries and by the approximate memory of the values it holds.
+# Values are returned as stored, so callers must not modify them.
+class MemoCache:
+
+    def __init__(self, max_entries=memo_max_entries, max_bytes=memo_max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    # Cached value of key, computing and storing it on a miss
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        self.put(key, value)
+        return value
+
+    # Store a value, then evict the least recently used entries until both bounds hold.
+    # A value larger than max_bytes on its own is not stored.
+    def put(self, key, value):
+        nbytes = value_nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    # Entries, memory and hit/miss counters
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / requests * 100, 2) if requests else 0,
+        }
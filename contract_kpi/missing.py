@@ -0,0 +1,67 @@
+import pandas as pd
+
+# Missing count and percentage per column, flagging the KPI relevant ones
+def missing_values_summary(df, kpi_columns):
+    return missing_counts_summary(df.isna().sum(), len(df), kpi_columns)
+
+# missing_values_summary from null counts per column and the number of rows
+def missing_counts_summary(missing_count, total, kpi_columns):
+    missing_values = pd.DataFrame({
+        'Column': missing_count.index,
+        'Missing Values': missing_count,
+        'Missing Percentage': (missing_count / total * 100).round(2)
+    }).sort_values('Missing Percentage', ascending=False)
+
+    # Highlight KPI relevant columns
+    missing_values['KPI Relevant'] = missing_values['Column'].isin(kpi_columns)
+    return missing_values
+
+# Missing percentage of each KPI column for every value of group_column.
+# A single groupby over the null mask gives the group x column matrix the heatmaps plot.
+def missing_data_matrix(df, group_column, column_list, name=None):
+    columns = [col for col in dict.fromkeys(column_list) if col in df.columns]
+
+    missing = df[columns].isna()
+    missing_pct = (missing.groupby(df[group_column], sort=False, observed=True).mean() * 100).round(2)
+
+    missing_pct = missing_pct.sort_index().sort_index(axis=1)
+    missing_pct.index.name = name or group_column
+    missing_pct.columns.name = 'Column'
+    return missing_pct
+
+# Long format of a missing data matrix with the number of contracts per group,
+# counted in df[group_column] or given as group_sizes
+def missing_data_long(matrix, df=None, group_column=None, group_sizes=None):
+    group_sizes = df[group_column].value_counts() if group_sizes is None else group_sizes
+    long = matrix.stack().rename('Missing Percentage').reset_index()
+    long['Total Contracts'] = long[matrix.index.name].map(group_sizes).astype('int64')
+    return long
+
+# Groups of a missing data matrix ordered worst first (highest mean missing percentage)
+def _worst_first(matrix):
+    return matrix.mean(axis=1).sort_values(ascending=False, kind='stable').index
+
+# Limit a missing data matrix to its k worst groups and fold the remaining groups into
+# one "Other" row, weighted by the number of contracts per group, so the heatmap
+# payload stays the same size however many groups there are
+def worst_groups(matrix, group_sizes, k=30, other_label='Other'):
+    if len(matrix) <= k:
+        return matrix
+
+    order = _worst_first(matrix)
+    top, rest = order[:k], order[k:]
+
+    sizes = group_sizes.reindex(rest).fillna(0).to_numpy(dtype='float64')
+    rest_matrix = matrix.loc[rest]
+    other = (rest_matrix.mul(sizes, axis=0).sum() / sizes.sum()).round(2) if sizes.sum() > 0 else rest_matrix.mean().round(2)
+
+    limited = matrix.loc[top]
+    limited.index = limited.index.astype(object)
+    limited.loc[f'{other_label} ({len(rest)} groups)'] = other
+    limited.index.name = matrix.index.name
+    return limited
+
+# One page of a missing data matrix, groups ordered worst first
+def page_groups(matrix, page=0, page_size=30):
+    order = _worst_first(matrix)
+    return matrix.loc[order[page * page_size:(page + 1) * page_size]]
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# JSON lines log the stage timings of instrumented runs are appended to
+perf_log_path = Path(os.environ.get('CONTRACT_KPI_PERF_LOG', Path.home() / '.cache' / 'contract_kpi' / 'perf.jsonl'))
+
+# Recorder of the run in progress, if instrumentation is on. tracemalloc is process
+# wide, so memory of runs of other sessions at the same time is counted as well.
+_active = ContextVar('contract_kpi_perf_recorder', default=None)
+
+# Recorders tracing memory, by run. tracemalloc is started by the first of them (if
+# nobody else traces already) and stopped when the last one stops, so a recorder
+# stopping does not end the tracing of runs of other sessions.
+_tracing = {'started': False, 'runs': set()}
+_tracing_lock = threading.Lock()
+
+
+def _trace(run):
+    with _tracing_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing['started'] = True
+        _tracing['runs'].add(run)
+
+
+def _untrace(run):
+    with _tracing_lock:
+        if run not in _tracing['runs']:
+            return
+        _tracing['runs'].discard(run)
+        if not _tracing['runs'] and _tracing['started']:
+            tracemalloc.stop()
+            _tracing['started'] = False
+
+
+# Stop the recorder a run interrupted by a rerun left active. Streamlit reruns the
+# script of a session in the same thread, so call this at the start of every run.
+def reset_recorder():
+    recorder = _active.get()
+    if recorder is not None:
+        recorder.stop()
+
+
+# High-water mark of Arrow's memory pool, which tracemalloc does not see, in MB
+def arrow_peak_mb():
+    return round(pa.default_memory_pool().max_memory() / 1024 ** 2, 3) if pa is not None else None
+
+
+# Wall time, rows processed and peak memory growth of the stages of one run.
+# With trace_memory, Python heap memory is traced with tracemalloc while the recorder
+# is active; that slows Python-heavy stages (CSV parsing, money parsing) down several
+# times, so their wall times are only comparable between runs with the same setting.
+# Memory allocated by Arrow (the pyarrow CSV reader, Arrow-backed columns) is not on
+# the Python heap; every stage records the high-water mark of Arrow's memory pool
+# for the process when it ends instead, which needs no tracing.
+class PerfRecorder:
+
+    def __init__(self, trace_memory=True, **context):
+        self.run = uuid.uuid4().hex[:12]
+        self.trace_memory = trace_memory
+        self.context = {'trace_memory': trace_memory, **context}
+        self.records = []
+        self._stack = []
+
+    # Make this the recorder stage() reports to
+    def start(self):
+        if self.trace_memory:
+            _trace(self.run)
+        _active.set(self)
+        return self
+
+    def stop(self):
+        if _active.get() is self:
+            _active.set(None)
+        _untrace(self.run)
+        return self
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = {'stage': name, 'depth': len(self._stack), 'rows': rows}
+        self.records.append(record)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        if tracing:
+            tracemalloc.reset_peak()
+        # Highest traced memory reached inside the stage, including nested stages
+        frame = {'start': current, 'peak': current}
+        self._stack.append(frame)
+
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - started, 6)
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            record['peak_mb'] = round((peak - frame['start']) / 1024 ** 2, 3) if tracing else None
+            record['arrow_peak_mb'] = arrow_peak_mb()
+            self._stack.pop()
+
+            # reset_peak hid this stage's peak from the enclosing stage
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+    # Records as a frame, in the order the stages started
+    def report(self):
+        return pd.DataFrame(self.records, columns=['stage', 'depth', 'seconds', 'rows', 'peak_mb', 'arrow_peak_mb'])
+
+    # Append one JSON line per stage to the log
+    def write(self, path=None):
+        path = Path(path or perf_log_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        logged_at = datetime.now().isoformat(timespec='seconds')
+        with open(path, 'a') as log:
+            for record in self.records:
+                line = {'run': self.run, 'time': logged_at, **self.context, **record}
+                log.write(json.dumps(line, default=str) + '\n')
+        return path
+
+
+# Time a stage on the active recorder; does nothing when instrumentation is off.
+# Yields a dict the caller may set 'rows' on once the stage knows its row count.
+@contextmanager
+def stage(name, rows=None):
+    recorder = _active.get()
+    if recorder is None:
+        yield {}
+        return
+    with recorder.stage(name, rows) as record:
+        yield record
+
+
+# Read the JSON lines log back into a frame
+def read_perf_log(path=None):
+    path = Path(path or perf_log_path)
+    if not path.exists():
+        return pd.DataFrame()
+    return pd.read_json(path, lines=True)
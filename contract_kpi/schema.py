@@ -0,0 +1,69 @@
+from .mapping import api_key_to_field_mapping
+
+# Date fields of the export (API names)
+date_columns = ['CustomerSignedDate', 'Canceled_Date__c', 'EMEA_Notification_Date__c',
+                'StartDate', 'Contract_End_Date__c', 'Contract_Original_End_Date__c',
+                'Price_Increase_Opportunity_Date__c', 'LastEvaluationDate__c',
+                'ActivatedDate']
+
+# Formats date fields are parsed with, tried in order. Fractional seconds and a time
+# zone suffix after the time of a date-time are dropped first (date_time_suffix, group
+# 1 is the time that is kept): date-times keep the wall time written in the export and
+# UTC offsets are not applied.
+date_formats = ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M',
+                '%d.%m.%Y', '%m/%d/%Y', '%Y/%m/%d']
+date_time_suffix = r'(\d\d:\d\d(?::\d\d)?)(?:\.\d+)?(?:Z|[+-]\d\d:?\d\d)?$'
+
+# Money fields in the export (display names) and the prefix used for their parsed columns
+money_columns = {
+    'Annual Sales Value': 'AnnualSalesValue',
+    'Capital Value': 'CapitalValue',
+    'Consignment Value': 'ConsignmentValue',
+    'Expected Sales': 'ExpectedSales',
+}
+
+# Low-cardinality columns stored as categoricals to save memory and speed up filters and groupbys
+categorical_columns = ['Status', 'Contract Region', 'Contract Country', 'Type of Contract',
+                       'BUs included in Contract', 'Contract Currency'] + \
+                      [f'{prefix}_Currency' for prefix in money_columns.values()]
+
+# Identifier and free-text fields (API names), kept as text even when they look like numbers
+text_columns = ['Id', 'ContractNumber', 'Name', 'SAP_Deal_Number__c', 'Old_contract_number__c',
+                'Contract_Description__c', 'Document_Link__c', 'Price_Conditions__c',
+                'Price_Regulations_Notes__c', 'Rebate_Conditions__c', 'EMEA_Bonus_conditions__c',
+                'SpecificServiceLevels__c', 'CapitalValueDescription__c', 'ConsignmentValueDescription__c']
+
+# Numeric fields (API names)
+number_columns = ['TotalProcedureCommitments__c', 'QuantityAgreed__c', 'HipProceduresCommitment__c',
+                  'KneeProceduresCommitment__c']
+
+# Columns read up front (display names): the filter dimensions, identifiers and fields
+# the charts, band audit and deduplication use, the date and the money fields. Other
+# columns are only read when asked for, see loading.load_columns.
+core_columns = ['Contract ID', 'Contract Number', 'Contract Name', 'Contract Description', 'Status',
+                'Type of Contract', 'BUs included in Contract', 'Contract Region', 'Contract Country',
+                'Contract Currency', 'Band', 'LastModifiedDate'] + \
+               [api_key_to_field_mapping.get(api, api) for api in date_columns] + list(money_columns)
+
+
+# Declared type of every export column we know about: 'date', 'money', 'category',
+# 'text' or 'number'. Keys are both the API names and the display names of
+# api_key_to_field_mapping, so exports with either header work. Columns not
+# declared here keep the type inferred by the CSV reader.
+def column_types():
+    display_types = {field: 'money' for field in money_columns}
+    display_types.update({field: 'category' for field in categorical_columns})
+
+    types = {}
+    for api, field in api_key_to_field_mapping.items():
+        if api in date_columns:
+            kind = 'date'
+        elif api in text_columns:
+            kind = 'text'
+        elif api in number_columns:
+            kind = 'number'
+        else:
+            kind = display_types.get(field)
+        if kind is not None:
+            types[api] = types[field] = kind
+    return types
@@ -0,0 +1,117 @@
+from importlib.util import find_spec
+
+import pandas as pd
+
+from .bands import audit_bands, band_currency
+from .currency import convert_sales_values
+from .kpis import active_mask, activations_per_month, sales_by, sent_not_activated_mask
+from .missing import missing_data_long, missing_data_matrix, missing_values_summary
+from .perf import stage
+from .streaming import missing_dimensions
+from .topn import top_n
+from .windows import date_windows, expiry_windows, price_increase_windows
+
+# Dashboard sections and the inputs each one depends on besides the dataset and the
+# filters. A section is only recomputed when one of its own inputs changes, e.g.
+# changing the KPI columns does not recompute the expiry windows.
+section_inputs = {
+    'Data Quality': ['kpi_columns'],
+    'KPI Analysis': ['target_currency', 'n', 'today'],
+    'Band Audit': [],
+}
+
+
+# Engines the Data Quality and KPI Analysis sections can be computed with: pandas,
+# DuckDB (see sql.KPIDatabase) and Polars (see lazy.KPILazyFrame) when installed
+query_engines = ['pandas'] + [engine for engine, package in [('DuckDB', 'duckdb'), ('Polars', 'polars')] if find_spec(package)]
+
+
+# Missing value summary and the group x column missing matrices with group sizes,
+# for the dimensions present in the export. With cube (a CubeSlice of the same
+# filters) everything is read from the cube instead of the rows of df.
+def data_quality(df, kpi_columns, cube=None):
+    summary = missing_values_summary(df, kpi_columns) if cube is None else cube.missing_summary(kpi_columns)
+    result = {'summary': summary, 'matrices': {}, 'group_sizes': {}}
+    for group_column, name in missing_dimensions.items():
+        if group_column not in df.columns:
+            continue
+        if cube is None:
+            result['matrices'][group_column] = missing_data_matrix(df, group_column, kpi_columns, name=name)
+            result['group_sizes'][group_column] = df[group_column].value_counts()
+        else:
+            result['matrices'][group_column] = cube.missing_matrix(group_column, kpi_columns, name=name)
+            result['group_sizes'][group_column] = cube.group_sizes(group_column)
+
+    if 'Contract Region' in result['matrices']:
+        result['region_long'] = missing_data_long(result['matrices']['Contract Region'], group_sizes=result['group_sizes']['Contract Region'])
+    return result
+
+
+# Whether df has column parsed as dates
+def _has_dates(df, column):
+    return column in df.columns and pd.api.types.is_datetime64_any_dtype(df[column])
+
+
+# Counts, top-n lists, windows and sales of the KPI section. df must have the converted
+# value column for target_currency. Parts needing a column the export does not have
+# are left out of the result. With cube (a CubeSlice of the same filters) the counts
+# and sales are read from the cube; top-n lists and date windows still use the rows.
+def kpi_analysis(df, target_currency, n, today, cube=None):
+    result = {'target_currency': target_currency, 'total': len(df) if cube is None else cube.total, 'top': top_n(df, n)}
+
+    if 'Status' in df.columns:
+        is_active = active_mask(df)
+        result['active'] = int(is_active.sum()) if cube is None else cube.active
+        result['top_active'] = top_n(df, n, subset=is_active)
+
+        if 'Notification Date' in df.columns:
+            is_sent_not_activated = sent_not_activated_mask(df)
+            result['sent_not_activated'] = int(is_sent_not_activated.sum()) if cube is None else cube.sent_not_activated
+            result['top_sent_not_activated'] = top_n(df, n, subset=is_sent_not_activated)
+
+    if _has_dates(df, 'Activated Date'):
+        result['activations'] = activations_per_month(df)
+
+    if _has_dates(df, 'Contract End Date') and 'Notification Date' in df.columns:
+        windows = date_windows(df['Contract End Date'], today)
+        result['expiry'] = expiry_windows(df, today, windows=windows)
+        result['top_expiring'] = top_n(df, n, subset=windows['This Year'])
+
+    if _has_dates(df, 'Price Increase Opportunity Date'):
+        windows = date_windows(df['Price Increase Opportunity Date'], today)
+        result['price_increase'] = price_increase_windows(df, today, windows=windows)
+        result['top_price_increase'] = top_n(df, n, subset=windows['This Year'])
+
+    for column in ['Contract Region', 'Type of Contract']:
+        if column in df.columns:
+            result[f'sales by {column}'] = sales_by(df, column) if cube is None else cube.sales_by(column, target_currency)
+    return result
+
+
+# Band audit of the filtered contracts, bands compared in band_currency
+def band_audit(df):
+    return audit_bands(df, convert_sales_values(df, band_currency))
+
+
+# Sections that can be read from a ContractCube slice
+cube_sections = {'Data Quality', 'KPI Analysis'}
+
+section_functions = {
+    'Data Quality': data_quality,
+    'KPI Analysis': kpi_analysis,
+    'Band Audit': band_audit,
+}
+
+
+# The inputs a section declares, out of all dashboard inputs
+def declared_inputs(section, inputs):
+    return {name: inputs[name] for name in section_inputs[section]}
+
+
+# Compute one section from its declared inputs, ignoring the inputs it does not use.
+# cube is a CubeSlice of the filters df was selected with.
+def compute_section(section, df, cube=None, **inputs):
+    with stage(section, rows=len(df)):
+        if cube is not None and section in cube_sections:
+            return section_functions[section](df, cube=cube, **declared_inputs(section, inputs))
+        return section_functions[section](df, **declared_inputs(section, inputs))
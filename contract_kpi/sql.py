@@ -0,0 +1,212 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .currency import exchange_rates
+from .engines import (
+    SectionEngine, data_quality_result, engine_sections, expiry_result, price_increase_result,
+    timestamp, value_column,
+)
+from .filters import filter_columns
+from .streaming import missing_dimensions
+from .topn import row_column
+from .windows import window_bounds
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Sections KPIDatabase computes in SQL; the others only run on the pandas frame
+sql_sections = engine_sections
+
+_value = f'"{value_column}"'
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# The loaded contracts registered with an in-process DuckDB database, and the KPIs of
+# the dashboard sections expressed as SQL over them. Results have the same shape and
+# values as sections.data_quality and sections.kpi_analysis on the filtered frame.
+class KPIDatabase(SectionEngine):
+
+    name = 'SQL'
+
+    # data: the loaded contracts, as a DataFrame or pyarrow Table; they are scanned
+    # in place, not copied into the database
+    def __init__(self, data):
+        import duckdb
+        self.connection = duckdb.connect()
+        # Registered DataFrames are converted on every scan, so they are handed over as
+        # an Arrow table, which DuckDB reads without converting
+        if isinstance(data, pd.DataFrame) and pa is not None:
+            data = pa.Table.from_pandas(data, preserve_index=False)
+        if isinstance(data, pd.DataFrame):
+            data = data.assign(**{row_column: np.arange(len(data))})
+        else:
+            data = data.append_column(row_column, pa.array(np.arange(len(data))))
+        self.connection.register('contracts', data)
+        self._describe()
+
+    # A database over a Parquet file written from loaded contracts, e.g. a snapshot
+    # of the history store, read by DuckDB directly
+    @classmethod
+    def from_parquet(cls, path):
+        import duckdb
+        database = cls.__new__(cls)
+        database.connection = duckdb.connect()
+        database.connection.execute(
+            f"CREATE VIEW contracts AS SELECT * EXCLUDE (file_row_number), file_row_number AS {row_column} "
+            f"FROM read_parquet({_literal(path)}, file_row_number = true)"
+        )
+        database._describe()
+        return database
+
+    def _describe(self):
+        self._lock = threading.RLock()
+        types = self.connection.execute('DESCRIBE contracts').fetchall()
+        self.types = {name: column_type for name, column_type, *_ in types if name != row_column}
+        self.columns = list(self.types)
+
+    def _has_dates(self, column):
+        return column in self.types and (self.types[column].startswith('TIMESTAMP') or self.types[column] == 'DATE')
+
+    # WHERE clause and parameters of the sidebar filters, with the semantics of
+    # filters.selected_positions
+    def _where(self, filters):
+        filters = filters or {}
+        conditions, params = [], []
+        for name, column in filter_columns.items():
+            values = filters.get(name)
+            if values and column in self.types:
+                conditions.append(f'list_contains(?, CAST({_quote(column)} AS VARCHAR))')
+                params.append([str(value) for value in values])
+
+        volume_agreement = filters.get('volume_agreement')
+        if volume_agreement and 'Yes' in volume_agreement and self._has('Status', 'Type of Contract'):
+            conditions.append("\"Status\" = 'Active' AND \"Type of Contract\" = 'Usage agreement'")
+        return ' AND '.join(conditions) or 'TRUE', params
+
+    # Common table expression of the selected contracts with their annual sales value
+    # in target_currency, converted like currency.convert_sales_values
+    def _selected(self, filters, target_currency='USD'):
+        where, params = self._where(filters)
+        if not self._has('AnnualSalesValue_Numeric', 'AnnualSalesValue_Currency'):
+            return f'WITH selected AS (SELECT * FROM contracts WHERE {where})', params
+
+        rates = ' '.join(f"WHEN '{currency}' THEN CAST({rate!r} AS DOUBLE)" for currency, rate in exchange_rates.items())
+        value = (f'"AnnualSalesValue_Numeric" / (CASE CAST("AnnualSalesValue_Currency" AS VARCHAR) {rates} END) '
+                 f'* CAST({exchange_rates[target_currency]!r} AS DOUBLE)')
+        replace = f'REPLACE ({value} AS {_value})' if value_column in self.types else ''
+        added = '' if replace else f', {value} AS {_value}'
+        return f'WITH selected AS (SELECT * {replace}{added} FROM contracts WHERE {where})', params
+
+    # Registered frames are only visible to the connection they were registered with,
+    # so queries of several sessions share it one at a time
+    def _query(self, sql, params, fetch='df'):
+        with self._lock:
+            return getattr(self.connection.execute(sql, params), fetch)()
+
+    # Top n selected contracts by value matching condition, largest first, ties in row order
+    def _top_n(self, selected, params, n, condition='TRUE', condition_params=()):
+        return self._query(
+            f'{selected} SELECT * EXCLUDE ({row_column}) FROM selected '
+            f'WHERE {_value} IS NOT NULL AND ({condition}) ORDER BY {_value} DESC, {row_column} LIMIT {int(n)}',
+            [*params, *condition_params]
+        )
+
+    # Per time frame of window_bounds: contracts with column in the frame, their value
+    # and, with extra, the number matching the extra condition
+    def _windows(self, selected, params, column, today, extra=None):
+        bounds = window_bounds(today)
+        aggregates, window_params = [], []
+        for start, end in bounds.values():
+            in_window = f'{_quote(column)} >= CAST(? AS TIMESTAMP) AND {_quote(column)} < CAST(? AS TIMESTAMP)'
+            aggregates.append(f'count(*) FILTER (WHERE {in_window})')
+            aggregates.append(f'coalesce(sum({_value}) FILTER (WHERE {in_window}), 0)')
+            window_params += [timestamp(start), timestamp(end)] * 2
+            if extra is not None:
+                aggregates.append(f'count(*) FILTER (WHERE {in_window} AND {extra})')
+                window_params += [timestamp(start), timestamp(end)]
+
+        values = self._query(f'{selected} SELECT {", ".join(aggregates)} FROM selected', [*params, *window_params], fetch='fetchone')
+        step = 3 if extra is not None else 2
+        return list(bounds), [values[i:i + step] for i in range(0, len(values), step)], bounds
+
+    # Like sections.kpi_analysis on the filtered frame
+    def kpi_analysis(self, filters, target_currency, n, today):
+        selected, params = self._selected(filters, target_currency)
+
+        counts = ['count(*)']
+        if self._has('Status'):
+            counts.append("count(*) FILTER (WHERE \"Status\" = 'Active')")
+            if self._has('Notification Date'):
+                counts.append("count(*) FILTER (WHERE \"Notification Date\" IS NOT NULL AND \"Status\" IS DISTINCT FROM 'Active')")
+        values = self._query(f'{selected} SELECT {", ".join(counts)} FROM selected', params, fetch='fetchone')
+
+        result = {'target_currency': target_currency, 'total': values[0], 'top': self._top_n(selected, params, n)}
+        if self._has('Status'):
+            result['active'] = values[1]
+            result['top_active'] = self._top_n(selected, params, n, "\"Status\" = 'Active'")
+            if self._has('Notification Date'):
+                result['sent_not_activated'] = values[2]
+                result['top_sent_not_activated'] = self._top_n(
+                    selected, params, n, "\"Notification Date\" IS NOT NULL AND \"Status\" IS DISTINCT FROM 'Active'")
+
+        if self._has_dates('Activated Date'):
+            result['activations'] = self._query(
+                f'{selected} SELECT strftime("Activated Date", \'%Y-%m\') AS "ActivationMonth", count(*) AS "Count" '
+                f'FROM selected WHERE "Activated Date" IS NOT NULL GROUP BY 1 ORDER BY 1', params
+            )
+
+        if self._has_dates('Contract End Date') and self._has('Notification Date'):
+            labels, windows, bounds = self._windows(selected, params, 'Contract End Date', today, extra='"Notification Date" IS NULL')
+            result['expiry'] = expiry_result(labels, windows)
+            start, end = bounds['This Year']
+            result['top_expiring'] = self._top_n(
+                selected, params, n, '"Contract End Date" >= CAST(? AS TIMESTAMP) AND "Contract End Date" < CAST(? AS TIMESTAMP)',
+                [timestamp(start), timestamp(end)])
+
+        if self._has_dates('Price Increase Opportunity Date'):
+            labels, windows, bounds = self._windows(selected, params, 'Price Increase Opportunity Date', today)
+            result['price_increase'] = price_increase_result(labels, windows)
+            start, end = bounds['This Year']
+            result['top_price_increase'] = self._top_n(
+                selected, params, n,
+                '"Price Increase Opportunity Date" >= CAST(? AS TIMESTAMP) AND "Price Increase Opportunity Date" < CAST(? AS TIMESTAMP)',
+                [timestamp(start), timestamp(end)])
+
+        for column in ['Contract Region', 'Type of Contract']:
+            if self._has(column):
+                result[f'sales by {column}'] = self._query(
+                    f'{selected} SELECT {_quote(column)}, coalesce(sum({_value}), 0) AS {_value} FROM selected '
+                    f'WHERE {_quote(column)} IS NOT NULL GROUP BY 1 ORDER BY 2 DESC', params
+                )
+        return result
+
+    # Like sections.data_quality on the filtered frame
+    def data_quality(self, filters, kpi_columns):
+        selected, params = self._selected(filters)
+
+        nulls = ', '.join(f'count(*) - count({_quote(column)})' for column in self.columns)
+        values = self._query(f'{selected} SELECT count(*), {nulls} FROM selected', params, fetch='fetchone')
+        missing_count = pd.Series(values[1:], index=self.columns, dtype='int64')
+
+        columns = [column for column in dict.fromkeys(kpi_columns) if column in self.types]
+        groups = {}
+        for group_column in missing_dimensions:
+            if group_column not in self.types:
+                continue
+            group_nulls = ''.join(f', count(*) - count({_quote(column)})' for column in columns)
+            groups[group_column] = self._query(
+                f'{selected} SELECT CAST({_quote(group_column)} AS VARCHAR), count(*){group_nulls} FROM selected '
+                f'WHERE {_quote(group_column)} IS NOT NULL GROUP BY 1 ORDER BY 2 DESC, 1', params, fetch='fetchall'
+            )
+        return data_quality_result(missing_count, values[0], kpi_columns, columns, groups)
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
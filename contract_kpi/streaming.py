@@ -0,0 +1,317 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .currency import convert_sales_values
+from .filters import apply_filters, filter_columns
+from .kpis import active_mask, sent_not_activated_mask
+from .loading import parse_dates, parse_money_columns
+from .mapping import api_key_to_field_mapping, rename_columns
+from .schema import column_types
+from .missing import missing_data_long
+from .perf import stage
+from .topn import largest_positions, row_column
+from .windows import date_windows, expiry_windows, price_increase_windows
+
+# Rows read from the export at a time in streaming mode
+default_chunksize = 100000
+
+# Sections StreamingKPIs computes; the others need the rows of the whole export
+streaming_sections = {'Data Quality', 'KPI Analysis'}
+
+# Dimensions the missing-data breakdowns are computed for, with their display name
+missing_dimensions = {
+    'Contract Region': 'Region',
+    'Contract Country': 'Country',
+    'BUs included in Contract': 'BU',
+}
+
+
+# Read a contract export in chunks, each parsed like load_contracts
+# (declared column types, dates, display column names, money columns). A list of
+# exports is read one after the other; contracts appearing in several of them are
+# not de-duplicated.
+def read_contract_chunks(file, chunksize=default_chunksize):
+    dtypes = {column: 'float64' if kind == 'number' else str for column, kind in column_types().items()}
+    for source in (file if isinstance(file, (list, tuple)) else [file]):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+
+        for chunk in pd.read_csv(source, chunksize=chunksize, dtype=dtypes):
+            parse_dates(chunk)
+            rename_columns(chunk, api_key_to_field_mapping)
+            parse_money_columns(chunk)
+            yield chunk
+
+
+# Distinct values of every filter column, collected chunk by chunk
+def stream_filter_options(file, chunksize=default_chunksize):
+    options = {column: set() for column in filter_columns.values()}
+    columns = None
+    for chunk in read_contract_chunks(file, chunksize):
+        columns = list(chunk.columns) if columns is None else columns
+        for column, values in options.items():
+            if column in chunk.columns:
+                values.update(chunk[column].dropna().unique())
+    return {column: sorted(values, key=str) for column, values in options.items()}, columns or []
+
+
+# Running KPI aggregates folded chunk by chunk, so that memory stays bounded by the
+# chunk size, the number of groups and n rather than by the size of the export.
+# Every result has the same shape as its counterpart computed on a full frame, and
+# data_quality and kpi_analysis return the results of the sections of that name.
+class StreamingKPIs:
+
+    def __init__(self, kpi_columns, target_currency='USD', today=None, n=20,
+                 value_column='AnnualSalesValue_Converted'):
+        self.kpi_columns = list(dict.fromkeys(kpi_columns))
+        self.target_currency = target_currency
+        self.today = today or datetime.now().date()
+        self.n = n
+        self.value_column = value_column
+
+        self.columns = []
+        self.date_columns = set()
+        self.total = 0
+        self.active = 0
+        self.sent_not_activated = 0
+        self.missing_counts = pd.Series(dtype='int64')
+        self.status_counts = pd.Series(dtype='int64')
+        self.group_sizes = {}
+        self.group_missing = {}
+        self.expiry = None
+        self.price_increase = None
+        self.activations = pd.Series(dtype='int64')
+        self.sales = {}
+        self.top = {}
+
+    # Add the counts of one chunk to a running Series or DataFrame
+    @staticmethod
+    def _add(running, counts):
+        if running is None or len(running) == 0:
+            return counts
+        return running.add(counts, fill_value=0)
+
+    # Keep the n largest of the current top rows and of top, rows with their position
+    # in the streamed rows in row_column: value descending, then position, like top_n
+    def _keep_top(self, key, top):
+        current = self.top.get(key)
+        if current is not None and len(current):
+            top = pd.concat([current, top])
+            values = top[self.value_column].to_numpy(dtype='float64', na_value=np.nan)
+            top = top.iloc[np.lexsort((top[row_column].to_numpy(), -values))[:self.n]]
+        self.top[key] = top
+
+    # Merge the n largest rows of rows (limited to subset, a mask or positions) into the
+    # top rows of key; offset is the position of the first of rows in the streamed rows
+    def _merge_top(self, key, rows, offset, subset=None):
+        chosen = largest_positions(rows[self.value_column].to_numpy(dtype='float64', na_value=np.nan), self.n, subset)
+        self._keep_top(key, rows.iloc[chosen].assign(**{row_column: offset + chosen}))
+
+    def update(self, chunk):
+        offset = self.total
+        chunk[self.value_column] = convert_sales_values(chunk, self.target_currency)
+        self.columns = list(dict.fromkeys([*self.columns, *chunk.columns]))
+
+        # Date KPIs only use columns parsed as dates
+        dates = {col for col in chunk.columns if pd.api.types.is_datetime64_any_dtype(chunk[col])}
+        self.date_columns |= dates
+
+        self.total += len(chunk)
+        self.missing_counts = self._add(self.missing_counts, chunk.isna().sum())
+
+        # Status counts and the active / sent but not activated contracts
+        if 'Status' in chunk.columns:
+            self.status_counts = self._add(self.status_counts, chunk['Status'].value_counts())
+            is_active = active_mask(chunk)
+            self.active += int(is_active.sum())
+            self._merge_top('Active', chunk, offset, is_active)
+
+            if 'Notification Date' in chunk.columns:
+                is_sent_not_activated = sent_not_activated_mask(chunk)
+                self.sent_not_activated += int(is_sent_not_activated.sum())
+                self._merge_top('Sent Not Activated', chunk, offset, is_sent_not_activated)
+        self._merge_top('All', chunk, offset)
+
+        # Group sizes and null counts of the KPI columns per dimension
+        columns = [col for col in self.kpi_columns if col in chunk.columns]
+        for group_column in missing_dimensions:
+            if group_column in chunk.columns:
+                groups = chunk[group_column]
+                self.group_sizes[group_column] = self._add(self.group_sizes.get(group_column), groups.value_counts())
+                missing = chunk[columns].isna().groupby(groups, sort=False, observed=True).sum()
+                self.group_missing[group_column] = self._add(self.group_missing.get(group_column), missing)
+
+        # Expiry and price increase windows
+        if 'Contract End Date' in dates and 'Notification Date' in chunk.columns:
+            windows = date_windows(chunk['Contract End Date'], self.today)
+            counts = expiry_windows(chunk, self.today, self.value_column, windows=windows).set_index('Time Frame')
+            self.expiry = self._add(self.expiry, counts)
+            self._merge_top('Expiring This Year', chunk, offset, windows['This Year'])
+
+        if 'Price Increase Opportunity Date' in dates:
+            windows = date_windows(chunk['Price Increase Opportunity Date'], self.today)
+            counts = price_increase_windows(chunk, self.today, self.value_column, windows=windows).set_index('Time Frame')
+            self.price_increase = self._add(self.price_increase, counts)
+            self._merge_top('Price Increase This Year', chunk, offset, windows['This Year'])
+
+        # Activations per month
+        if 'Activated Date' in dates:
+            months = chunk['Activated Date'].dropna().dt.to_period('M')
+            self.activations = self._add(self.activations, months.value_counts())
+
+        # Sales by region and by contract type
+        for column in ['Contract Region', 'Type of Contract']:
+            if column in chunk.columns:
+                sums = chunk.groupby(column, observed=True)[self.value_column].sum()
+                self.sales[column] = self._add(self.sales.get(column), sums)
+        return self
+
+    # Add (sign=1) or subtract (sign=-1) the counts and sums of another aggregate
+    # built with the same settings; added rows count as following the rows of this one.
+    # Subtracting cannot update the top-n rows, so they are dropped and have to be
+    # rebuilt with refresh_top.
+    def merge(self, other, sign=1):
+        def combine(running, counts):
+            if counts is None:
+                return running
+            if running is None:
+                running = counts * 0
+            combined = running.add(counts * sign, fill_value=0)
+            return combined[combined != 0] if isinstance(combined, pd.Series) else combined
+
+        offset = self.total
+        self.columns = list(dict.fromkeys([*self.columns, *other.columns]))
+        self.date_columns |= other.date_columns
+        self.total += sign * other.total
+        self.active += sign * other.active
+        self.sent_not_activated += sign * other.sent_not_activated
+        self.missing_counts = self.missing_counts.add(other.missing_counts * sign, fill_value=0)
+        self.status_counts = combine(self.status_counts, other.status_counts)
+        self.activations = combine(self.activations, other.activations)
+        self.expiry = combine(self.expiry, other.expiry)
+        self.price_increase = combine(self.price_increase, other.price_increase)
+        for column in set(self.group_sizes) | set(other.group_sizes):
+            self.group_sizes[column] = combine(self.group_sizes.get(column), other.group_sizes.get(column))
+            self.group_missing[column] = combine(self.group_missing.get(column), other.group_missing.get(column))
+        for column in set(self.sales) | set(other.sales):
+            self.sales[column] = combine(self.sales.get(column), other.sales.get(column))
+
+        if sign > 0:
+            for key, rows in other.top.items():
+                self._keep_top(key, rows.assign(**{row_column: rows[row_column] + offset}))
+        else:
+            self.top = {}
+        return self
+
+    # Rebuild the top-n rows from a full frame that already has the converted value column
+    def refresh_top(self, df):
+        self.top = {}
+        self._merge_top('All', df, 0)
+        if 'Status' in df.columns:
+            self._merge_top('Active', df, 0, active_mask(df))
+            if 'Notification Date' in df.columns:
+                self._merge_top('Sent Not Activated', df, 0, sent_not_activated_mask(df))
+        if pd.api.types.is_datetime64_any_dtype(df.get('Contract End Date')):
+            self._merge_top('Expiring This Year', df, 0, date_windows(df['Contract End Date'], self.today)['This Year'])
+        if pd.api.types.is_datetime64_any_dtype(df.get('Price Increase Opportunity Date')):
+            self._merge_top('Price Increase This Year', df, 0, date_windows(df['Price Increase Opportunity Date'], self.today)['This Year'])
+        return self
+
+    # Missing count and percentage per column, like missing_values_summary
+    def missing_summary(self):
+        missing_values = pd.DataFrame({
+            'Column': self.missing_counts.index,
+            'Missing Values': self.missing_counts.astype('int64'),
+            'Missing Percentage': (self.missing_counts / self.total * 100).round(2) if self.total else np.nan,
+        }).sort_values('Missing Percentage', ascending=False)
+        missing_values['KPI Relevant'] = missing_values['Column'].isin(self.kpi_columns)
+        return missing_values
+
+    # Group x column missing percentage matrix, like missing_data_matrix
+    def missing_matrix(self, group_column, name=None):
+        if group_column not in self.group_missing:
+            return pd.DataFrame()
+        sizes = self.group_sizes[group_column]
+        missing_pct = (self.group_missing[group_column].div(sizes[sizes > 0], axis=0) * 100).round(2)
+        missing_pct = missing_pct.dropna(how='all').sort_index().sort_index(axis=1)
+        missing_pct.index.name = name or missing_dimensions.get(group_column, group_column)
+        missing_pct.columns.name = 'Column'
+        return missing_pct
+
+    def expiry_windows(self):
+        return self.expiry.reset_index().astype({'Total Expiring': 'int64', 'Not Followed Up': 'int64'})
+
+    def price_increase_windows(self):
+        return self.price_increase.reset_index().astype({'Count': 'int64'})
+
+    def activations_per_month(self):
+        activations = self.activations.sort_index().astype('int64')
+        return pd.DataFrame({'ActivationMonth': activations.index.astype(str), 'Count': activations.to_numpy()})
+
+    def sales_by(self, column):
+        sales = self.sales[column].rename(self.value_column).reset_index()
+        return sales.sort_values(self.value_column, ascending=False)
+
+    def top_n(self, key='All'):
+        if key not in self.top:
+            return pd.DataFrame()
+        return self.top[key].drop(columns=row_column, errors='ignore')
+
+    # Like sections.data_quality on the streamed rows
+    def data_quality(self):
+        result = {'summary': self.missing_summary(), 'matrices': {}, 'group_sizes': {}}
+        for group_column, name in missing_dimensions.items():
+            if group_column in self.group_missing:
+                result['matrices'][group_column] = self.missing_matrix(group_column, name)
+                sizes = self.group_sizes[group_column]
+                result['group_sizes'][group_column] = sizes[sizes > 0].astype('int64').sort_values(ascending=False, kind='stable')
+
+        if 'Contract Region' in result['matrices']:
+            result['region_long'] = missing_data_long(result['matrices']['Contract Region'], group_sizes=result['group_sizes']['Contract Region'])
+        return result
+
+    # Like sections.kpi_analysis on the streamed rows
+    def kpi_analysis(self):
+        result = {'target_currency': self.target_currency, 'total': self.total, 'top': self.top_n('All')}
+
+        if 'Status' in self.columns:
+            result['active'] = self.active
+            result['top_active'] = self.top_n('Active')
+
+            if 'Notification Date' in self.columns:
+                result['sent_not_activated'] = self.sent_not_activated
+                result['top_sent_not_activated'] = self.top_n('Sent Not Activated')
+
+        if 'Activated Date' in self.date_columns:
+            result['activations'] = self.activations_per_month()
+
+        if self.expiry is not None:
+            result['expiry'] = self.expiry_windows()
+            result['top_expiring'] = self.top_n('Expiring This Year')
+
+        if self.price_increase is not None:
+            result['price_increase'] = self.price_increase_windows()
+            result['top_price_increase'] = self.top_n('Price Increase This Year')
+
+        for column in ['Contract Region', 'Type of Contract']:
+            if column in self.sales:
+                result[f'sales by {column}'] = self.sales_by(column)
+        return result
+
+
+# Fold a whole export into StreamingKPIs chunk by chunk, applying the sidebar
+# filters (see apply_filters) to every chunk
+def stream_kpis(file, kpi_columns, target_currency='USD', filters=None, today=None, n=20,
+                chunksize=default_chunksize):
+    aggregates = StreamingKPIs(kpi_columns, target_currency, today, n)
+    with stage('Stream KPIs') as record:
+        rows = 0
+        for chunk in read_contract_chunks(file, chunksize):
+            rows += len(chunk)
+            if filters:
+                chunk = apply_filters(chunk, **filters)
+            aggregates.update(chunk)
+        record['rows'] = rows
+    return aggregates
@@ -0,0 +1,112 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .mapping import api_key_to_field_mapping
+from .schema import money_columns
+
+# Date fields of the export (API names), plus LastModifiedDate used by incremental refresh
+synthetic_date_columns = [
+    'CustomerSignedDate', 'Canceled_Date__c', 'EMEA_Notification_Date__c', 'StartDate',
+    'Contract_End_Date__c', 'Contract_Original_End_Date__c', 'Price_Increase_Opportunity_Date__c',
+    'ActivatedDate', 'LastModifiedDate',
+]
+
+# Money fields of the export (API names), written like "EUR 12,500.00"
+synthetic_money_columns = [api for api, field in api_key_to_field_mapping.items() if field in money_columns]
+
+# Numeric fields of the export (API names)
+synthetic_numeric_columns = [
+    'TotalProcedureCommitments__c', 'QuantityAgreed__c', 'HipProceduresCommitment__c',
+    'KneeProceduresCommitment__c', 'MarketShare__c', 'ExpectedPayoutPercentage__c',
+    'EMEA_Volume_annually__c', 'Therapy_days__c', 'Costs_per_Therapy_day__c', 'Flat_rate_month__c',
+]
+
+# Values picked from for the low-cardinality fields (API names)
+synthetic_choices = {
+    'EMEA_Type_of_contract__c': ['Usage agreement', 'Tender', 'Price agreement', 'Rebate agreement', 'Consignment agreement'],
+    'BUs_included_in_Contract__c': ['Trauma', 'Sports Med', 'Primary Knees', 'Hips', 'Trauma;Hips', 'ENT', 'Wound Management', 'Orthopaedics'],
+    'ContractRegion__c': ['DACH', 'Nordics', 'UK', 'Iberia', 'France', 'Benelux', 'Italy', 'CEE'],
+    'ContractCountry__c': ['DE', 'AT', 'CH', 'DK', 'NO', 'SE', 'FI', 'GB', 'IE', 'ES', 'PT', 'FR', 'BE', 'NL', 'LU', 'IT', 'PL', 'CZ'],
+    'Status': ['Active', 'Draft', 'Expired', 'In Approval Process', 'Terminated'],
+    'CurrencyIsoCode': ['EUR', 'USD', 'GBP', 'CHF', 'DKK', 'NOK', 'SEK'],
+    'Band__c': ['Band 1', 'Band 2', 'Band 3', 'Band 4', 'Band 5'],
+    'EMEA_Bonus_contract__c': ['Yes', 'No'],
+    'Automatic_extension__c': ['Yes', 'No'],
+    'EMEA_Bonus_type__c': ['Growth bonus', 'Volume bonus', 'Loyalty bonus'],
+    'EMEA_Payout_period__c': ['Monthly', 'Quarterly', 'Yearly'],
+    'EMEA_Booking_Type__c': ['Credit note', 'Free goods'],
+    'EMEA_Condition_type__c': ['Net price', 'Discount'],
+    'Notice_Period__c': ['1 month', '3 months', '6 months'],
+}
+
+# Share of missing values per field (API names); fields not listed get default_null_rate
+synthetic_null_rates = {
+    'Id': 0.0, 'ContractNumber': 0.0, 'Name': 0.0, 'Status': 0.0, 'CurrencyIsoCode': 0.0,
+    'LastModifiedDate': 0.0, 'ContractRegion__c': 0.02, 'ContractCountry__c': 0.03,
+    'EMEA_Type_of_contract__c': 0.05, 'BUs_included_in_Contract__c': 0.08,
+    'StartDate': 0.05, 'Contract_End_Date__c': 0.2, 'EMEA_Notification_Date__c': 0.6,
+    'Price_Increase_Opportunity_Date__c': 0.5, 'ActivatedDate': 0.4, 'CustomerSignedDate': 0.4,
+    'Canceled_Date__c': 0.95, 'AnnualSalesValue__c': 0.2, 'CapitalValue__c': 0.7,
+    'ConsignmentValue__c': 0.75, 'EMEA_Expected_Sales__c': 0.6, 'SAP_Deal_Number__c': 0.5,
+    'Band__c': 0.3, 'TotalProcedureCommitments__c': 0.7,
+}
+default_null_rate = 0.85
+
+# Rows generated at a time by write_contracts
+synthetic_chunksize = 250000
+
+
+def _money(rng, n):
+    currencies = rng.choice(synthetic_choices['CurrencyIsoCode'], n)
+    amounts = pd.Series(rng.integers(100000, 500000000, n) / 100).map('{:,.2f}'.format)
+    return pd.Series(currencies, dtype=object) + ' ' + amounts.astype(object)
+
+
+def _dates(rng, n, today):
+    days = rng.integers(-3 * 365, 3 * 365, n)
+    return pd.Series((np.datetime64(today, 'D') + days).astype('datetime64[D]')).dt.strftime('%Y-%m-%d')
+
+
+# A synthetic contract export with the real API column names: ids, text, picklist
+# values, dates, money amounts as "EUR 12,500.00" strings and numbers, with missing
+# values at the rates of null_rates. start numbers the contracts, so chunks of one
+# export can be generated separately.
+def generate_contracts(n_rows, seed=0, null_rates=None, today=None, start=0):
+    rng = np.random.default_rng(seed)
+    null_rates = {**synthetic_null_rates, **(null_rates or {})}
+    today = today or datetime.now().date()
+    numbers = np.arange(start, start + n_rows)
+
+    columns = list(api_key_to_field_mapping) + ['LastModifiedDate']
+    df = pd.DataFrame(index=pd.RangeIndex(n_rows))
+    for column in columns:
+        if column == 'Id':
+            values = pd.Series(numbers).map('800{:012d}'.format)
+        elif column == 'ContractNumber':
+            values = pd.Series(numbers).map('{:08d}'.format)
+        elif column in synthetic_choices:
+            values = pd.Series(rng.choice(synthetic_choices[column], n_rows), dtype=object)
+        elif column in synthetic_date_columns:
+            values = _dates(rng, n_rows, today)
+        elif column in synthetic_money_columns:
+            values = _money(rng, n_rows)
+        elif column in synthetic_numeric_columns:
+            values = pd.Series(rng.integers(1, 1000, n_rows), dtype='float64')
+        else:
+            labels = np.array([f'{column.removesuffix("__c")} {i}' for i in range(5000)], dtype=object)
+            values = pd.Series(labels[rng.integers(0, len(labels), n_rows)])
+
+        values[rng.random(n_rows) < null_rates.get(column, default_null_rate)] = np.nan
+        df[column] = values
+    return df
+
+
+# Write a synthetic export of n_rows to path in chunks, so that millions of rows
+# never have to be held in memory at once
+def write_contracts(path, n_rows, seed=0, null_rates=None, today=None, chunksize=synthetic_chunksize):
+    for start in range(0, n_rows, chunksize):
+        chunk = generate_contracts(min(chunksize, n_rows - start), seed + start, null_rates, today, start)
+        chunk.to_csv(path, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    return path
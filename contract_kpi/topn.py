@@ -0,0 +1,52 @@
+import numpy as np
+
+# Column holding the position of every contract, so that ties in the top-n lists are
+# broken in row order wherever they are computed
+row_column = '__row'
+
+# Row positions of df ordered by value, largest first, leaving out missing values. A
+# full sort, worth it only when it is kept and reused as the order of top_n.
+def value_order(df, value_column='AnnualSalesValue_Converted'):
+    values = df[value_column].to_numpy(dtype='float64', na_value=np.nan)
+    positions = np.flatnonzero(~np.isnan(values))
+    return positions[np.argsort(-values[positions], kind='stable')]
+
+# Boolean mask of length size from a mask or from positions
+def _as_mask(subset, size):
+    subset = np.asarray(subset)
+    if subset.dtype == bool:
+        return subset
+    mask = np.zeros(size, dtype=bool)
+    mask[subset] = True
+    return mask
+
+# Positions of the n largest values, largest first and ties in position order, leaving
+# out missing values; subset limits them to a boolean mask or to positions. The n
+# values are selected with np.partition in linear time and only they are sorted.
+def largest_positions(values, n, subset=None):
+    keep = ~np.isnan(values)
+    if subset is not None:
+        keep &= _as_mask(subset, len(values))
+    positions = np.flatnonzero(keep)
+
+    if n <= 0:
+        return positions[:0]
+    if n < len(positions):
+        candidates = values[positions]
+        threshold = np.partition(candidates, len(candidates) - n)[len(candidates) - n]
+        above = positions[candidates > threshold]
+        tied = positions[candidates == threshold][:n - len(above)]
+        positions = np.concatenate([above, tied])
+    return positions[np.lexsort((positions, -values[positions]))]
+
+# Top n contracts by value, ignoring contracts without a value. subset limits the
+# candidates to a boolean mask or to row positions of df. order from value_order
+# reuses a full sort of df instead of selecting the n largest.
+def top_n(df, n=20, value_column='AnnualSalesValue_Converted', subset=None, order=None):
+    if order is None:
+        values = df[value_column].to_numpy(dtype='float64', na_value=np.nan)
+        return df.iloc[largest_positions(values, n, subset)]
+
+    if subset is not None:
+        order = order[_as_mask(subset, len(df))[order]]
+    return df.iloc[order[:n]]
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Time frames reported for dated KPIs and their horizon in days (None = rest of this year)
+time_frames = {
+    'This Year': None,
+    'Next 3 Months': 90,
+    'Next 6 Months': 180,
+}
+
+# Time frames as [start, end) datetime64 bounds. A time frame of n days runs from
+# today up to and including today + n days; horizons may be a label -> days dict
+# like time_frames or a plain list of days, e.g. [30, 60, 90, 180, 365].
+def window_bounds(today=None, horizons=None):
+    today = today or datetime.now().date()
+    horizons = time_frames if horizons is None else horizons
+    if not isinstance(horizons, dict):
+        horizons = {f'Next {days} Days': days for days in horizons}
+
+    start = np.datetime64(today, 'D')
+    bounds = {}
+    for label, days in horizons.items():
+        if days is None:
+            end = np.datetime64(f'{today.year + 1}-01-01', 'D')
+        else:
+            end = start + np.timedelta64(days + 1, 'D')
+        bounds[label] = (start.astype('datetime64[ns]'), end.astype('datetime64[ns]'))
+    return bounds
+
+# Sorted datetime64 values of a date column and the row positions in that order,
+# leaving out missing dates
+def sort_dates(dates):
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    values = dates.to_numpy(dtype='datetime64[ns]')
+
+    positions = np.flatnonzero(~np.isnat(values))
+    order = positions[np.argsort(values[positions], kind='stable')]
+    return values[order], order
+
+# Row positions falling in each time frame. The column is sorted once and every
+# time frame is a contiguous slice found by binary search.
+def date_windows(dates, today=None, horizons=None):
+    sorted_values, order = sort_dates(dates)
+    bounds = window_bounds(today, horizons)
+
+    starts = np.searchsorted(sorted_values, [start for start, _ in bounds.values()], side='left')
+    ends = np.searchsorted(sorted_values, [end for _, end in bounds.values()], side='left')
+    return {label: order[lo:hi] for label, lo, hi in zip(bounds, starts, ends)}
+
+# Rows of df in one time frame, in their original order
+def window_rows(df, windows, label):
+    return df.iloc[np.sort(windows[label])]
+
+# Contracts expiring in each time frame, with the ones not followed up
+# (no notification date) and the total annual sales value
+def expiry_windows(df, today=None, value_column='AnnualSalesValue_Converted', horizons=None, windows=None):
+    windows = date_windows(df['Contract End Date'], today, horizons) if windows is None else windows
+    not_notified = df['Notification Date'].isna().to_numpy()
+    values = df[value_column].to_numpy(dtype='float64', na_value=np.nan)
+
+    return pd.DataFrame({
+        'Time Frame': list(windows),
+        'Total Expiring': [len(positions) for positions in windows.values()],
+        'Not Followed Up': [int(not_notified[positions].sum()) for positions in windows.values()],
+        'Total Value': [np.nansum(values[positions]) for positions in windows.values()],
+    })
+
+# Price increase opportunities in each time frame, by total annual sales value and count
+def price_increase_windows(df, today=None, value_column='AnnualSalesValue_Converted', horizons=None, windows=None):
+    windows = date_windows(df['Price Increase Opportunity Date'], today, horizons) if windows is None else windows
+    values = df[value_column].to_numpy(dtype='float64', na_value=np.nan)
+
+    return pd.DataFrame({
+        'Time Frame': list(windows),
+        'Total Value': [np.nansum(values[positions]) for positions in windows.values()],
+        'Count': [len(positions) for positions in windows.values()],
+    })
@@ -0,0 +1,40 @@
+from datetime import date
+
+import pytest
+
+import contract_kpi as kpi
+from contract_kpi.synthetic import write_contracts
+
+today = date(2026, 10, 18)
+
+
+# A synthetic export, written once for the session
+@pytest.fixture(scope='session')
+def export_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('exports') / 'contracts.csv'
+    write_contracts(path, 3000, seed=7, today=today)
+    return path
+
+
+@pytest.fixture(scope='session')
+def _loaded(export_path):
+    df = kpi.load_contracts(export_path)
+    df['AnnualSalesValue_Converted'] = kpi.convert_sales_values(df, 'USD')
+    return df
+
+
+# The loaded contracts with their converted sales values, as the dashboard has them
+@pytest.fixture
+def contracts(_loaded):
+    return _loaded.copy()
+
+
+# Inputs of the Data Quality and KPI Analysis sections
+@pytest.fixture
+def section_inputs():
+    return {
+        'kpi_columns': ['Status', 'Contract Start Date', 'Contract End Date', 'Annual Sales Value',
+                        'Price Increase Opportunity Date', 'Consignment Value', 'Capital Value',
+                        'Total Procedure Commitments', 'SAP Deal Number'],
+        'target_currency': 'USD', 'n': 20, 'today': today,
+    }
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from contract_kpi.bands import assign_bands, audit_bands, band_definitions_path, load_band_definitions
+
+
+# Band of one contract by scanning the rows of band_definitions.csv for its type
+def _band_by_rows(rows, value, band_type):
+    band = np.nan
+    for name, lower_bound, _, row_type in rows:
+        if row_type == band_type and value >= lower_bound:
+            band = name
+    return band
+
+
+def test_assign_bands_matches_row_scan():
+    table = pd.read_csv(band_definitions_path)
+    rng = np.random.default_rng(0)
+    types = rng.choice([*table['type'].unique(), 'Unknown', None], 3000)
+    values = rng.choice([*table['min value'], *table['max value'], *(table['max value'] + 0.5), 0, np.nan], 3000)
+    values = np.where(rng.random(3000) < 0.5, values, rng.uniform(0, 3000000, 3000))
+
+    rows = list(table.sort_values('min value').itertuples(index=False))
+    expected = pd.Series([_band_by_rows(rows, value, band_type) for value, band_type in zip(values, types)], dtype=object)
+    assert pd.Series(assign_bands(values, types)).fillna('').tolist() == expected.fillna('').tolist()
+
+
+# Every whole amount within a band's min and max gets that band
+def test_assign_bands_within_definitions():
+    table = pd.read_csv(band_definitions_path)
+    finite = table[np.isfinite(table['max value'])]
+    for column in ['min value', 'max value']:
+        assert list(assign_bands(finite[column], finite['type'])) == list(finite['Band number'])
+
+
+def test_audit_flags_only_filled_in_disagreeing_bands():
+    band_type = next(iter(load_band_definitions()))
+    df = pd.DataFrame({'Band': ['band 1', 'Band 2', None, 'Band 1'], 'BUs included in Contract': band_type})
+    audit = audit_bands(df, [5000, 5000, 5000, np.nan])
+    assert audit['Band Mismatch'].tolist() == [False, True, False, False]
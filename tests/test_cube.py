@@ -0,0 +1,28 @@
+import pytest
+
+import contract_kpi as kpi
+from benchmark import same_results, sql_filters
+
+cube_filters = {**sql_filters, 'countries and statuses': {'countries': ['GB', 'FR', 'DE'], 'statuses': ['Active', 'Expired']},
+                'nothing selected': {'statuses': ['No such status']}}
+
+
+@pytest.mark.parametrize('target_currency', ['USD', 'EUR'])
+@pytest.mark.parametrize('filters', list(cube_filters.values()), ids=list(cube_filters))
+def test_cube_sections_match_rows(contracts, section_inputs, filters, target_currency):
+    contracts['AnnualSalesValue_Converted'] = kpi.convert_sales_values(contracts, target_currency)
+    inputs = {**section_inputs, 'target_currency': target_currency}
+    cube = kpi.ContractCube(contracts)
+    filtered = kpi.apply_filters(contracts, **filters)
+
+    for section in sorted(kpi.cube_sections):
+        expected = kpi.compute_section(section, filtered, **inputs)
+        assert same_results(expected, kpi.compute_section(section, filtered, cube=cube.slice(**filters), **inputs)), section
+
+
+# A cube stored with to_frame and read back answers the same
+def test_stored_cube_matches_rows(contracts, section_inputs):
+    cube = kpi.ContractCube.from_frame(kpi.ContractCube(contracts).to_frame())
+    for section in sorted(kpi.cube_sections):
+        assert same_results(kpi.compute_section(section, contracts, **section_inputs),
+                            kpi.compute_section(section, contracts, cube=cube.slice(), **section_inputs))
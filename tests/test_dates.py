@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from contract_kpi.loading import parse_dates, read_export
+from contract_kpi.schema import date_formats
+
+moment = datetime(2024, 5, 31, 10, 20, 30)
+
+# Date-times with fractional seconds or a time zone suffix keep their wall time
+suffixed = {
+    '2024-05-31T10:20:30.123Z': datetime(2024, 5, 31, 10, 20, 30),
+    '2024-05-31T10:20:30+02:00': datetime(2024, 5, 31, 10, 20, 30),
+    '2024-05-31 10:20:30-0500': datetime(2024, 5, 31, 10, 20, 30),
+    '2024-05-31T10:20Z': datetime(2024, 5, 31, 10, 20),
+}
+
+
+def _cases():
+    cases = {moment.strftime(date_format): datetime.strptime(moment.strftime(date_format), date_format)
+             for date_format in date_formats}
+    return {**cases, **suffixed, 'not a date': None}
+
+
+def _check(parsed, cases):
+    for text, expected in cases.items():
+        value = parsed[text]
+        if expected is None:
+            assert pd.isna(value), text
+        else:
+            assert value == pd.Timestamp(expected), text
+
+
+@pytest.mark.parametrize('date_format', date_formats)
+def test_read_export_parses_every_date_format(tmp_path, date_format):
+    text = moment.strftime(date_format)
+    path = tmp_path / 'export.csv'
+    pd.DataFrame({'Id': ['1'], 'StartDate': [text]}).to_csv(path, index=False)
+
+    df = read_export(path)
+    assert df['StartDate'].iloc[0] == pd.Timestamp(datetime.strptime(text, date_format))
+
+
+def test_read_export_and_parse_dates_agree(tmp_path):
+    cases = _cases()
+    path = tmp_path / 'export.csv'
+    pd.DataFrame({'Id': [str(i) for i in range(len(cases))], 'StartDate': list(cases)}).to_csv(path, index=False)
+
+    _check(dict(zip(cases, read_export(path)['StartDate'])), cases)
+    _check(dict(zip(cases, parse_dates(pd.read_csv(path))['StartDate'])), cases)
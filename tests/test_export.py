@@ -0,0 +1,39 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from contract_kpi.export import export_contracts, export_formats
+from contract_kpi.synthetic import generate_contracts
+
+
+def _read(data, export_format):
+    if export_format == 'CSV':
+        return pd.read_csv(io.BytesIO(data), sep=';', dtype=str, keep_default_na=False)
+    if export_format == 'CSV (gzip)':
+        return pd.read_csv(io.BytesIO(gzip.decompress(data)), sep=';', dtype=str, keep_default_na=False)
+    import pyarrow.parquet as pq
+    return pq.read_table(io.BytesIO(data)).to_pandas()
+
+
+# The export is handed to st.download_button, which turns it into bytes itself
+@pytest.mark.parametrize('export_format', list(export_formats))
+def test_export_is_a_download_button_payload(export_format):
+    df = generate_contracts(250, seed=3)
+    data, _ = convert_data_to_bytes_and_infer_mime(export_contracts(df, export_format, chunksize=100),
+                                                   RuntimeError('Invalid binary data format'))
+
+    exported = _read(data, export_format)
+    assert list(exported.columns) == list(df.columns)
+    assert len(exported) == len(df)
+    if export_format == 'Parquet':
+        pd.testing.assert_frame_equal(exported, df.reset_index(drop=True), check_dtype=False)
+    else:
+        assert exported['Id'].tolist() == df['Id'].astype(str).tolist()
+
+
+def test_export_rejects_unknown_formats():
+    with pytest.raises(ValueError):
+        export_contracts(pd.DataFrame(), 'Excel')
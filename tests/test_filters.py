@@ -0,0 +1,38 @@
+import pandas as pd
+
+from contract_kpi.filters import apply_filters, build_filter_index, filter_columns
+
+
+# Boolean-mask filtering of the sidebar selections, as the dashboard did before the index
+def _filter_by_masks(df, volume_agreement=None, **selections):
+    for name, values in selections.items():
+        if values:
+            df = df[df[filter_columns[name]].isin(values)]
+    if volume_agreement and 'Yes' in volume_agreement:
+        df = df[df['Status'].isin(['Active']) & df['Type of Contract'].isin(['Usage agreement'])]
+    return df
+
+
+def _selections(df):
+    regions = list(df['Contract Region'].dropna().unique())
+    types = list(df['Type of Contract'].dropna().unique())
+    return [
+        {},
+        {'statuses': ['Active']},
+        {'regions': regions[:2], 'contract_types': types[:3]},
+        {'regions': regions[:1], 'countries': list(df['Contract Country'].dropna().unique()[:5]), 'statuses': ['Active', 'Draft']},
+        {'bus_included': list(df['BUs included in Contract'].dropna().unique()[:2]), 'volume_agreement': ['Yes']},
+        {'volume_agreement': ['No']},
+        {'statuses': ['No such status']},
+    ]
+
+
+def test_filter_index_matches_boolean_masks(contracts):
+    index = build_filter_index(contracts)
+    for selections in _selections(contracts):
+        expected = _filter_by_masks(contracts, **selections)
+        pd.testing.assert_frame_equal(apply_filters(contracts, index=index, **selections), expected)
+
+
+def test_no_selection_returns_the_frame(contracts):
+    assert apply_filters(contracts) is contracts
@@ -0,0 +1,44 @@
+from datetime import date
+
+import pytest
+
+import contract_kpi as kpi
+
+pytest.importorskip('pyarrow')
+
+
+# The trends of one stored upload are its own KPIs
+def test_trends_match_upload(contracts, tmp_path):
+    kpi.save_snapshot(contracts, 'upload', date(2026, 9, 30), directory=tmp_path)
+    trends = kpi.kpi_trends({'statuses': ['Active']}, ['Status', 'Annual Sales Value'], directory=tmp_path)
+
+    active = kpi.apply_filters(contracts, statuses=['Active'])
+    assert len(trends) == 1
+    assert trends['Total Contracts'].iloc[0] == len(active)
+    assert trends['Active Contracts'].iloc[0] == len(active)
+    assert trends['Annual Sales Value (USD)'].iloc[0] == pytest.approx(active['AnnualSalesValue_Converted'].sum())
+    assert trends['Missing % Annual Sales Value'].iloc[0] == \
+           pytest.approx(round(active['Annual Sales Value'].isna().mean() * 100, 2))
+
+
+# An upload saved again under another export date stays stored once, under its first
+# export date, so the trends do not count it twice
+def test_upload_stored_once(contracts, tmp_path):
+    first = kpi.save_snapshot(contracts, 'upload', date(2026, 9, 30), directory=tmp_path)
+    again = kpi.save_snapshot(contracts, 'upload', date(2026, 10, 18), directory=tmp_path)
+
+    assert again == first
+    assert kpi.stored_export_date('upload', tmp_path) == date(2026, 9, 30)
+    assert list(kpi.list_snapshots(tmp_path)['Export Date']) == [date(2026, 9, 30)]
+    assert kpi.kpi_trends(directory=tmp_path)['Total Contracts'].tolist() == [len(contracts)]
+
+
+# Different uploads are each stored under their own export date
+def test_uploads_stored_per_export_date(contracts, tmp_path):
+    kpi.save_snapshot(contracts, 'before', date(2026, 9, 30), directory=tmp_path)
+    kpi.save_snapshot(contracts.head(100), 'after', date(2026, 10, 18), directory=tmp_path)
+
+    assert kpi.stored_export_date('missing', tmp_path) is None
+    trends = kpi.kpi_trends(directory=tmp_path)
+    assert trends['Snapshot'].tolist() == ['before', 'after']
+    assert trends['Total Contracts'].tolist() == [len(contracts), 100]
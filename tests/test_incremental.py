@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import contract_kpi as kpi
+from benchmark import same_results
+from conftest import today
+from contract_kpi.synthetic import generate_contracts
+
+sections = sorted(kpi.streaming_sections)
+
+
+# Two uploads of one export: the second has removed, changed and new contracts, and
+# a changed contract without a LastModifiedDate. Many contracts share a value, so
+# that the top-n lists depend on how ties are broken.
+@pytest.fixture
+def uploads(tmp_path):
+    first = generate_contracts(2000, seed=5, today=today)
+    first['AnnualSalesValue__c'] = np.resize(['EUR 100,000.00', 'EUR 250,000.00', 'USD 250,000.00'], len(first))
+    first.loc[[20, 21, 22], 'LastModifiedDate'] = np.nan
+
+    second = first.drop(index=[3, 4, 5]).copy()
+    second.loc[10, ['Status', 'LastModifiedDate']] = ['Active', f'{today}T09:00:00.000Z']
+    second.loc[11, ['AnnualSalesValue__c', 'LastModifiedDate']] = ['EUR 9,999,999.00', f'{today}T09:00:00.000Z']
+    second.loc[21, 'Name'] = 'Renamed contract'
+    new = first.iloc[[0, 1]].assign(Id=['900000000000001', '900000000000002'])
+    second = pd.concat([second, new], ignore_index=True)
+
+    paths = tmp_path / 'day1.csv', tmp_path / 'day2.csv'
+    first.to_csv(paths[0], index=False)
+    second.to_csv(paths[1], index=False)
+    return paths
+
+
+def _expected(df, section_inputs):
+    df = df.copy()
+    df['AnnualSalesValue_Converted'] = kpi.convert_sales_values(df, 'USD')
+    return {section: kpi.compute_section(section, df, **section_inputs) for section in sections}
+
+
+def _refresh(path, directory, section_inputs):
+    return kpi.incremental_refresh(path, section_inputs['kpi_columns'], 'USD', directory=directory, today=today,
+                                   n=section_inputs['n'], name='daily')
+
+
+# The delta load and the delta-updated aggregates give what a full load and a full
+# recompute of the second upload give, top-n order included
+def test_incremental_refresh_matches_full_recompute(uploads, section_inputs, tmp_path):
+    directory = tmp_path / 'snapshots'
+    _refresh(uploads[0], directory, section_inputs)
+    df, changes, aggregates = _refresh(uploads[1], directory, section_inputs)
+
+    assert changes['mode'] == 'incremental'
+    assert len(changes['removed']) == 3 and len(changes['new']) == 2
+    assert set(changes['changed']) >= {'800000000000010', '800000000000011', '800000000000021'}
+
+    full = kpi.load_contracts(uploads[1])
+    pd.testing.assert_frame_equal(df, full, check_dtype=False, check_categorical=False)
+
+    expected = _expected(full, section_inputs)
+    assert same_results(expected['Data Quality'], aggregates.data_quality())
+    assert same_results(expected['KPI Analysis'], aggregates.kpi_analysis())
+
+    # Uploading the same export again reads the stored aggregates back
+    _, repeated, stored = _refresh(uploads[1], directory, section_inputs)
+    assert repeated == changes
+    assert same_results(expected['KPI Analysis'], stored.kpi_analysis())
+
+
+def test_other_export_names_have_their_own_baseline(uploads, tmp_path):
+    directory = tmp_path / 'snapshots'
+    kpi.load_contracts_delta(uploads[0], directory, name='daily')
+    _, changes, _, _ = kpi.load_contracts_delta(uploads[1], directory, name='weekly')
+    assert changes['mode'] == 'full'
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+import contract_kpi as kpi
+from benchmark import same_results, sql_filters
+from conftest import today
+from contract_kpi.synthetic import generate_contracts
+
+pl = pytest.importorskip('polars')
+
+
+@pytest.mark.parametrize('filters', list(sql_filters.values()), ids=list(sql_filters))
+@pytest.mark.parametrize('section', sorted(kpi.lazy_sections))
+def test_lazy_sections_match_pandas(contracts, section_inputs, section, filters):
+    expected = kpi.compute_section(section, kpi.apply_filters(contracts, **filters), **section_inputs)
+    assert same_results(expected, kpi.KPILazyFrame(contracts).compute_section(section, filters, **section_inputs))
+
+
+# Scanning the export with Polars gives the same results as loading it with pandas
+def test_scanned_export_matches_pandas(contracts, section_inputs, export_path):
+    lazy_frame = kpi.KPILazyFrame.scan(export_path)
+    for section in sorted(kpi.lazy_sections):
+        assert same_results(kpi.compute_section(section, contracts, **section_inputs),
+                            lazy_frame.compute_section(section, **section_inputs))
+
+
+# Several exports scanned together keep the most recently modified version of a
+# contract, as load_contracts_many does, whatever form its LastModifiedDate has
+def test_scanned_exports_deduplicate_like_pandas(section_inputs, tmp_path):
+    raw = generate_contracts(1000, seed=2, today=today)
+    newer = raw.iloc[[10]].assign(Status='Terminated', LastModifiedDate=f'{today}T23:00:00.000Z')
+    paths = [tmp_path / 'a.csv', tmp_path / 'b.csv']
+    raw.iloc[:600].to_csv(paths[0], index=False)
+    pd.concat([raw.iloc[600:], newer]).to_csv(paths[1], index=False)
+
+    df = kpi.load_contracts_many(paths, max_workers=1)
+    df['AnnualSalesValue_Converted'] = kpi.convert_sales_values(df, 'USD')
+    scanned = kpi.scan_contracts(paths).collect()
+    assert len(scanned) == len(df) == 1000
+    assert scanned.filter(pl.col('Contract ID') == raw['Id'].iloc[10])['Status'].to_list() == ['Terminated']
+    lazy_frame = kpi.KPILazyFrame(scanned.lazy())
+    for section in sorted(kpi.lazy_sections):
+        assert same_results(kpi.compute_section(section, df, **section_inputs),
+                            lazy_frame.compute_section(section, **section_inputs))
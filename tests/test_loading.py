@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from benchmark import legacy_parse_annual_sales, make_money_frame
+from conftest import today
+from contract_kpi.loading import load_contracts, load_contracts_many, parse_money_column, parse_money_columns
+from contract_kpi.synthetic import generate_contracts
+
+
+# The vectorized parsing gives the values and currencies of the per-row loop it replaced
+def test_money_parsing_matches_row_loop():
+    df = make_money_frame(2000)
+    edge_cases = ['EUR 1,250.50', 'USD12', '1.2.3', 'abc', '', 'EUR', '  GBP 7 ', '-500', np.nan]
+    df = pd.concat([df, pd.DataFrame({'Annual Sales Value': pd.Series(edge_cases, dtype=object)})], ignore_index=True)
+
+    legacy = legacy_parse_annual_sales(df.copy())
+    vectorized = parse_money_columns(df.copy())
+
+    pd.testing.assert_series_equal(vectorized['AnnualSalesValue_Numeric'], legacy['AnnualSalesValue_Numeric'])
+    assert vectorized['AnnualSalesValue_Currency'].tolist() == legacy['AnnualSalesValue_Currency'].tolist()
+
+
+def test_numeric_money_column_is_usd():
+    numeric, currency = parse_money_column(pd.Series([1.5, np.nan, 3]))
+    assert numeric.tolist()[::2] == [1.5, 3.0] and np.isnan(numeric[1])
+    assert (currency == 'USD').all()
+
+
+# Exports parsed by several workers combine into the rows of one export, keeping the
+# most recently modified version of a contract found in both, where it was found
+def test_several_exports_combine_into_one(tmp_path):
+    raw = generate_contracts(1000, seed=2, today=today)
+    newer = raw.iloc[[10]].assign(Status='Terminated', LastModifiedDate=f'{today}T23:00:00.000Z')
+    paths = [tmp_path / 'a.csv', tmp_path / 'b.csv', tmp_path / 'whole.csv']
+    raw.iloc[:600].to_csv(paths[0], index=False)
+    pd.concat([raw.iloc[600:], newer]).to_csv(paths[1], index=False)
+    pd.concat([raw.drop(index=10), newer]).to_csv(paths[2], index=False)
+
+    combined = load_contracts_many(paths[:2], max_workers=2)
+    pd.testing.assert_frame_equal(combined, load_contracts(paths[2]), check_categorical=False)
@@ -0,0 +1,41 @@
+import numpy as np
+
+from contract_kpi.memo import MemoCache, memo_key
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = MemoCache(max_entries=3)
+    for key in 'abc':
+        cache.put(key, key)
+    assert cache.get('a', lambda: None) == 'a'
+
+    cache.put('d', 'd')
+    assert 'b' not in cache and all(key in cache for key in 'acd')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_bound_evicts_and_skips_oversized_values():
+    array = np.zeros(1000)
+    cache = MemoCache(max_entries=100, max_bytes=2.5 * array.nbytes)
+    for key in range(3):
+        cache.put(key, array)
+    assert list(cache._entries) == [1, 2] and cache.nbytes == 2 * array.nbytes
+
+    cache.put('big', np.zeros(3000))
+    assert 'big' not in cache and len(cache) == 2
+
+
+def test_get_computes_only_on_a_miss():
+    cache = MemoCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get('key', lambda: calls.append(1) or 42) == 42
+    assert len(calls) == 1 and cache.stats()['hits'] == 2
+
+
+# The same selections made in another order, or with empty filters, share an entry
+def test_keys_ignore_selection_order_and_empty_filters():
+    key = memo_key('dataset', 'KPI Analysis', {'regions': ['UK', 'DACH'], 'statuses': []}, {'n': 20})
+    assert key == memo_key('dataset', 'KPI Analysis', {'regions': ['DACH', 'UK', 'UK']}, {'n': 20})
+    assert key != memo_key('dataset', 'KPI Analysis', {'regions': ['UK']}, {'n': 20})
+    assert memo_key('dataset', 'x', {'volume_agreement': ['No']}) == memo_key('dataset', 'x', {})
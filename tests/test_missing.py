@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from contract_kpi.missing import missing_data_long, missing_data_matrix
+
+
+# Per-group loop of calculate_missing_by_reg, which missing_data_matrix replaced
+def _missing_by_loop(df, group_column, column_list):
+    rows = []
+    for group in df[group_column].dropna().unique():
+        group_df = df[df[group_column] == group]
+        for col in column_list:
+            if col in group_df.columns:
+                rows.append({'Group': group, 'Column': col, 'Missing Percentage': (group_df[col].isna().sum() / len(group_df) * 100).round(2),
+                             'Total Contracts': len(group_df)})
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize('group_column', ['Contract Region', 'Contract Country', 'BUs included in Contract'])
+def test_missing_data_matrix_matches_group_loop(contracts, section_inputs, group_column):
+    kpi_columns = section_inputs['kpi_columns']
+    expected = _missing_by_loop(contracts, group_column, kpi_columns)
+
+    matrix = missing_data_matrix(contracts, group_column, kpi_columns)
+    pivot = expected.pivot(index='Group', columns='Column', values='Missing Percentage')
+    assert list(matrix.index) == sorted(pivot.index)
+    pd.testing.assert_frame_equal(pd.DataFrame(matrix.to_numpy(), index=list(matrix.index), columns=list(matrix.columns)),
+                                  pivot.loc[list(matrix.index), list(matrix.columns)], check_names=False)
+
+    long = missing_data_long(matrix, contracts, group_column).set_index([group_column, 'Column'])
+    sizes = expected.set_index(['Group', 'Column'])['Total Contracts']
+    assert long['Total Contracts'].to_dict() == sizes.to_dict()
@@ -0,0 +1,29 @@
+import tracemalloc
+
+import pytest
+
+import contract_kpi as kpi
+
+
+# The CSV read allocates through Arrow, which the Arrow column shows and tracemalloc does not
+def test_stages_record_the_arrow_pool(export_path):
+    pytest.importorskip('pyarrow')
+    recorder = kpi.PerfRecorder(trace_memory=True).start()
+    try:
+        kpi.load_contracts(export_path)
+    finally:
+        recorder.stop()
+
+    report = recorder.report().set_index('stage')
+    assert report.loc['CSV read', 'depth'] == 0 and report.loc['Money parsing', 'depth'] == 0
+    assert report.loc['CSV read', 'arrow_peak_mb'] > 0
+    assert report['peak_mb'].notna().all()
+
+
+def test_stopping_one_recorder_keeps_the_other_tracing():
+    first = kpi.PerfRecorder().start()
+    second = kpi.PerfRecorder().start()
+    first.stop()
+    assert tracemalloc.is_tracing()
+    second.stop()
+    assert not tracemalloc.is_tracing()
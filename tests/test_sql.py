@@ -0,0 +1,22 @@
+import pytest
+
+import contract_kpi as kpi
+from benchmark import same_results, sql_filters
+
+pytest.importorskip('duckdb')
+
+
+@pytest.mark.parametrize('filters', list(sql_filters.values()), ids=list(sql_filters))
+@pytest.mark.parametrize('section', sorted(kpi.sql_sections))
+def test_sql_sections_match_pandas(contracts, section_inputs, section, filters):
+    expected = kpi.compute_section(section, kpi.apply_filters(contracts, **filters), **section_inputs)
+    assert same_results(expected, kpi.KPIDatabase(contracts).compute_section(section, filters, **section_inputs))
+
+
+def test_parquet_database_matches_pandas(contracts, section_inputs, tmp_path):
+    path = tmp_path / 'contracts.parquet'
+    contracts.to_parquet(path, index=False)
+    database = kpi.KPIDatabase.from_parquet(path)
+    for section in sorted(kpi.sql_sections):
+        assert same_results(kpi.compute_section(section, contracts, **section_inputs),
+                            database.compute_section(section, **section_inputs))
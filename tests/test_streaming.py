@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import contract_kpi as kpi
+from benchmark import same_results, sql_filters
+from conftest import today
+from contract_kpi.synthetic import generate_contracts
+
+sections = sorted(kpi.streaming_sections)
+
+
+# A synthetic export where many contracts share the same annual sales value, so
+# that the top-n lists depend on how ties are broken
+@pytest.fixture(scope='module')
+def tied_export(tmp_path_factory):
+    df = generate_contracts(3000, seed=11, today=today)
+    amounts = pd.Series(['EUR 100,000.00', 'EUR 250,000.00', 'USD 250,000.00', 'EUR 1,000,000.00'])
+    df['AnnualSalesValue__c'] = amounts.sample(len(df), replace=True, random_state=0).to_numpy()
+    path = tmp_path_factory.mktemp('exports') / 'tied.csv'
+    df.to_csv(path, index=False)
+    return path
+
+
+def _expected(path, filters, section_inputs):
+    df = kpi.load_contracts(path)
+    df['AnnualSalesValue_Converted'] = kpi.convert_sales_values(df, 'USD')
+    filtered = kpi.apply_filters(df, **filters)
+    return {section: kpi.compute_section(section, filtered, **section_inputs) for section in sections}
+
+
+def _streamed(aggregates):
+    return {'Data Quality': aggregates.data_quality(), 'KPI Analysis': aggregates.kpi_analysis()}
+
+
+@pytest.mark.parametrize('filters', list(sql_filters.values()), ids=list(sql_filters))
+def test_streamed_sections_match_full_frame(tied_export, section_inputs, filters):
+    aggregates = kpi.stream_kpis(tied_export, section_inputs['kpi_columns'], filters=filters, today=today,
+                                 n=section_inputs['n'], chunksize=700)
+    expected = _expected(tied_export, filters, section_inputs)
+    streamed = _streamed(aggregates)
+    for section in sections:
+        assert same_results(expected[section], streamed[section]), section
+
+
+# Merging the aggregates of two parts of an export gives those of the whole export,
+# and subtracting one part again the counts of the other
+def test_merged_aggregates_match_whole_export(tied_export, section_inputs):
+    chunks = list(kpi.read_contract_chunks(tied_export, chunksize=1000))
+    settings = (section_inputs['kpi_columns'], 'USD', today, section_inputs['n'])
+    first = kpi.StreamingKPIs(*settings).update(pd.concat(chunks[:2]))
+    rest = kpi.StreamingKPIs(*settings).update(chunks[2].copy())
+
+    merged = kpi.StreamingKPIs(*settings).update(chunks[0].copy()).update(chunks[1].copy()).merge(rest)
+    whole = kpi.StreamingKPIs(*settings).update(pd.concat(chunks, ignore_index=True))
+    assert same_results(whole.kpi_analysis(), merged.kpi_analysis())
+    _assert_same_counts(whole, merged)
+
+    _assert_same_counts(first, merged.merge(rest, sign=-1))
+
+
+# Same Data Quality results, group sizes compared regardless of the order of ties
+def _assert_same_counts(expected, aggregates):
+    expected, result = expected.data_quality(), aggregates.data_quality()
+    assert same_results(expected['summary'], result['summary'])
+    assert same_results(expected['matrices'], result['matrices'])
+    for column, sizes in expected['group_sizes'].items():
+        assert sizes.sort_index().to_dict() == result['group_sizes'][column].sort_index().to_dict()
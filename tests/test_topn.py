@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from contract_kpi.topn import largest_positions, top_n, value_order
+
+value = 'AnnualSalesValue_Converted'
+
+
+# Top rows by a stable sort of the whole frame, as the dashboard took them before top_n
+def _sorted_head(df, n, mask=None):
+    df = df if mask is None else df[mask]
+    return df.dropna(subset=[value]).sort_values(value, ascending=False, kind='stable').head(n)
+
+
+@pytest.fixture
+def tied(contracts):
+    # Few distinct values, so that the n-th value is tied with many rows
+    contracts[value] = (contracts[value] // 500000) * 500000
+    return contracts
+
+
+@pytest.mark.parametrize('n', [0, 1, 20, 100, 5000])
+def test_top_n_matches_stable_sort(tied, n):
+    is_active = (tied['Status'] == 'Active').to_numpy()
+    order = value_order(tied)
+    for subset in [None, is_active, np.flatnonzero(is_active)[::-1]]:
+        expected = _sorted_head(tied, n, is_active if subset is not None else None)
+        pd.testing.assert_frame_equal(top_n(tied, n, subset=subset), expected)
+        pd.testing.assert_frame_equal(top_n(tied, n, subset=subset, order=order), expected)
+
+
+def test_largest_positions_breaks_ties_in_position_order():
+    values = np.array([1.0, 3.0, np.nan, 3.0, 2.0, 3.0, 3.0])
+    assert largest_positions(values, 3).tolist() == [1, 3, 5]
+    assert largest_positions(values, 6).tolist() == [1, 3, 5, 6, 4, 0]
+    assert largest_positions(values, 2, subset=[0, 4, 5]).tolist() == [5, 4]
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from conftest import today
+from contract_kpi.windows import date_windows, expiry_windows, price_increase_windows, window_bounds
+
+
+# Date masks per time frame, as the dashboard computed them before the sorted windows
+def _masks(dates):
+    day = dates.dt.date
+    upcoming = dates.notna() & (day >= today)
+    return {
+        'This Year': upcoming & (dates.dt.year == today.year),
+        'Next 3 Months': upcoming & (day <= today + timedelta(days=90)),
+        'Next 6 Months': upcoming & (day <= today + timedelta(days=180)),
+    }
+
+
+# Contracts with times of day on the window edges, besides the plain dates of the export
+def _with_times(df):
+    edges = pd.to_datetime([f'{today} 00:00', f'{today} 23:59', f'{today + timedelta(days=90)} 18:30',
+                            f'{today + timedelta(days=91)} 00:00', f'{today.year}-12-31 23:59', f'{today.year + 1}-01-01 00:00'])
+    extra = df.head(len(edges)).copy()
+    extra['Contract End Date'] = edges
+    extra['Price Increase Opportunity Date'] = edges[::-1]
+    return pd.concat([df, extra], ignore_index=True)
+
+
+def test_date_windows_match_date_masks(contracts):
+    df = _with_times(contracts)
+    for column in ['Contract End Date', 'Price Increase Opportunity Date']:
+        windows = date_windows(df[column], today)
+        for label, mask in _masks(df[column]).items():
+            assert np.sort(windows[label]).tolist() == np.flatnonzero(mask).tolist(), (column, label)
+
+
+def test_window_kpis_match_date_masks(contracts):
+    df = _with_times(contracts)
+    value = df['AnnualSalesValue_Converted']
+
+    expiry = expiry_windows(df, today).set_index('Time Frame')
+    for label, mask in _masks(df['Contract End Date']).items():
+        assert expiry.loc[label, 'Total Expiring'] == mask.sum()
+        assert expiry.loc[label, 'Not Followed Up'] == (mask & df['Notification Date'].isna()).sum()
+        assert np.isclose(expiry.loc[label, 'Total Value'], value[mask].sum())
+
+    price_increase = price_increase_windows(df, today).set_index('Time Frame')
+    for label, mask in _masks(df['Price Increase Opportunity Date']).items():
+        assert price_increase.loc[label, 'Count'] == mask.sum()
+        assert np.isclose(price_increase.loc[label, 'Total Value'], value[mask].sum())
+
+
+def test_window_bounds_of_day_horizons():
+    bounds = window_bounds(today, [30])
+    start, end = bounds['Next 30 Days']
+    assert start == np.datetime64(today, 'ns')
+    assert end == np.datetime64(today + timedelta(days=31), 'ns')